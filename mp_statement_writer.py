@@ -1,18 +1,53 @@
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox, filedialog
-import sqlite3
 import os
 import datetime
 import random
 import json
 import configparser
-import threading
 import re
-import csv
 from io import StringIO
-import traceback
 import sys
-from dotenv import load_dotenv
+import time
+
+# Shared modules in seperate/ use flat imports, so put that folder on the path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "seperate"))
+from error_handler import LOG_FILE, log_error, log_unhandled
+from db_pool import get_connection
+from db_writer import get_writer, run_write
+from search_index import find_submissions, find_approved_statements
+from example_sampler import sample_library, sample_submissions
+from example_retriever import retrieve_examples, warm_up
+from job_executor import (DEFAULT_SHUTDOWN_TIMEOUT, PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, JobCancelled,
+                          current_token, get_executor, shutdown_executor, submit_job)
+from token_stream import TokenStream, pump_stream
+from response_cache import cached_completion, get_response_cache
+from paged_tree import get_pager, stop_paging
+from schema import migrate
+from async_client import (DEFAULT_MAX_CONNECTIONS, chat_completion, complete_text, configure_async_backend,
+                          run_coroutine, shutdown_async_backend, stream_text)
+from prompt_budget import DEFAULT_PROMPT_TOKEN_BUDGET, fit_prompt, get_prompt_usage, prompt_token_budget
+from speculative_refresh import SpeculativeRefresh
+from dedupe import collapse_duplicates, content_hash
+from near_duplicates import cluster_statements, diverse, sync_index
+from statement_import import DEFAULT_CHUNK_SIZE, ImportFormatError, import_statements, near_duplicate_report
+from config_manager import (API_SETTINGS, PLACEHOLDER_API_KEYS, ensure_config_exists, get_config, get_config_flag,
+                            get_config_value, reload_config, subscribe_config)
+from prompt_templates import construct_prompt, construct_refresh_prompt, get_tone_instructions, system_message
+from metrics import configure_metrics, get_metrics, histogram_text, record, span, summary_row
+
+# Sampling parameters for every completion; part of the response cache key
+GENERATION_PARAMS = {"temperature": 0.7, "max_tokens": 1500}
+
+# Most drafts that can be generated side by side in one request
+MAX_VARIANTS = 5
+
+# How often an open diagnostics window updates itself
+DIAGNOSTICS_REFRESH_MS = 2000
+
+# Listing columns for the paged history and library views; previews only need the first 51 characters
+SUBMISSION_PAGE_COLUMNS = "id, timestamp, status, target_audience, tone, substr(original_text, 1, 51)"
+APPROVED_PAGE_COLUMNS = "id, timestamp, topic, tone, substr(published_text, 1, 51)"
 
 class MPStatementRewriter:
     def __init__(self, root):
@@ -45,9 +80,26 @@ class MPStatementRewriter:
         self.status_var = tk.StringVar()
         self.status_var.set("Ready")
         
+        # Response cache counters shown in the status bar
+        self.cache_var = tk.StringVar()
+        self.cache_var.set(get_response_cache().status_text())
+        
         # Current submission ID
         self.current_submission_id = None
         
+        # Latency of the most recent streamed generation
+        self.last_time_to_first_token = None
+        
+        # Drafts per generation, and the other drafts of a multi-draft generation
+        self.variant_count = tk.StringVar()
+        self.variant_count.set("1")
+        self.variant_siblings = []
+        
+        # Optional background generation of the next refresh draft
+        self.speculative_refresh = tk.BooleanVar()
+        self.speculative_refresh.set(get_config_flag('GENERATION', 'SPECULATIVE_REFRESH'))
+        self.speculation = SpeculativeRefresh()
+        
         # Word count variables
         self.raw_word_count = tk.StringVar()
         self.raw_word_count.set("Words: 0")
@@ -64,6 +116,9 @@ class MPStatementRewriter:
         # Initialize database
         self.initialize_database()
         
+        # Stage timings are kept in memory, and also written to the metrics table if enabled
+        configure_metrics(self.persist_metrics())
+        
         # Set up style
         self.setup_styles()
         
@@ -72,6 +127,15 @@ class MPStatementRewriter:
         
         # Load sample data if needed - run AFTER database initialization
         self.populate_sample_data()
+        
+        # Collapse library duplicates left by older versions (a no-op once every row is hashed)
+        submit_job(collapse_duplicates, priority=PRIORITY_BACKGROUND, name="dedupe")
+        
+        # Bring the near-duplicate index up to date with statements added since the last run
+        submit_job(sync_index, priority=PRIORITY_BACKGROUND, name="near-duplicates")
+        
+        # Build the example retrieval index in the background
+        submit_job(warm_up, priority=PRIORITY_BACKGROUND, name="warm-up")
 
     def setup_styles(self):
         """Set up ttk styles for better UI appearance"""
@@ -109,95 +173,63 @@ class MPStatementRewriter:
     def initialize_openai(self):
         """Initialize OpenAI API with key from environment variables or config file"""
         try:
-            import openai
-            self.openai = openai
+            import openai  # fails early if the package is missing
             
-            # First try to load from environment variables
-            load_dotenv()
-            api_key = os.getenv("OPENAI_API_KEY")
-            model = os.getenv("OPENAI_MODEL", "gpt-4o")
+            if not self.apply_api_settings():
+                messagebox.showwarning(
+                    "API Key Required", 
+                    "Please add your OpenAI API key in a .env file or edit the config.ini file."
+                )
             
-            # If not found in env, look for config file
-            if not api_key:
-                config = configparser.ConfigParser()
-                
-                # Check if config file exists, if not create it
-                if not os.path.exists('config.ini'):
-                    config['API'] = {
-                        'OPENAI_API_KEY': 'your_api_key_here',
-                        'MODEL': model
-                    }
-                    with open('config.ini', 'w') as f:
-                        config.write(f)
-                    messagebox.showwarning(
-                        "API Key Required", 
-                        "Please add your OpenAI API key in a .env file or edit the config.ini file."
-                    )
-                
-                config.read('config.ini')
-                
-                if 'API' not in config:
-                    config['API'] = {
-                        'OPENAI_API_KEY': 'your_api_key_here',
-                        'MODEL': model
-                    }
-                    with open('config.ini', 'w') as f:
-                        config.write(f)
-                
-                api_key = config['API']['OPENAI_API_KEY']
-                model = config['API'].get('MODEL', 'gpt-4o')
-                
-                if api_key == 'your_api_key_here':
-                    messagebox.showwarning(
-                        "API Key Required", 
-                        "Please add your OpenAI API key in a .env file or edit the config.ini file."
-                    )
-            
-            openai.api_key = api_key
-            self.model = model
+            # Pick up a new key, model or endpoint as soon as config.ini or .env is saved
+            subscribe_config(self.config_changed)
         except ImportError:
             messagebox.showerror("Missing Dependency", 
                                "The openai or dotenv package is not installed. Please run: pip install openai python-dotenv")
         except Exception as e:
             messagebox.showerror("API Error", f"Failed to initialize OpenAI API: {str(e)}")
             log_error("OpenAI initialization error", e)
+    
+    def apply_api_settings(self):
+        """Point the shared client at the configured key, endpoint and model; False if no key is set"""
+        # The environment and .env take precedence over config.ini
+        config = get_config()
+        api_key = config.get('API', 'OPENAI_API_KEY')
+        self.model = config.get('API', 'MODEL', 'gpt-4o')
+        
+        if not api_key or api_key in PLACEHOLDER_API_KEYS:
+            # Create config.ini with a placeholder to fill in, if there is none yet
+            ensure_config_exists()
+            return False
+        
+        # Every request shares one client and its pool of keep-alive connections
+        configure_async_backend(api_key, config.get('API', 'BASE_URL'), self.max_connections())
+        return True
+    
+    def config_changed(self, changed):
+        """Rebuild the client settings when an API setting has changed"""
+        if changed & API_SETTINGS:
+            try:
+                self.apply_api_settings()
+            except Exception as e:
+                log_error("OpenAI settings change", e)
+    
+    def max_connections(self):
+        """HTTP connections kept open to the API: [API] MAX_CONNECTIONS"""
+        try:
+            return max(1, int(get_config_value('API', 'MAX_CONNECTIONS', DEFAULT_MAX_CONNECTIONS)))
+        except ValueError:
+            return DEFAULT_MAX_CONNECTIONS
+
+    def persist_metrics(self):
+        """Whether stage timings are also written to the metrics table: [DIAGNOSTICS] PERSIST_METRICS"""
+        return get_config_flag('DIAGNOSTICS', 'PERSIST_METRICS')
 
     def initialize_database(self):
-        """Create database tables if they don't exist"""
+        """Create or upgrade the database schema"""
         try:
-            conn = sqlite3.connect('mp_rewriter.db')
-            cursor = conn.cursor()
-            
-            # Create submissions table
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS submissions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                original_text TEXT NOT NULL,
-                context TEXT,
-                target_audience TEXT,
-                tone TEXT,
-                generated_text TEXT,
-                status TEXT DEFAULT 'pending',
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                notes TEXT
-            )
-            ''')
-            
-            # Create past_responses table
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS past_responses (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                published_text TEXT NOT NULL,
-                topic TEXT,
-                tone TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                source TEXT,
-                tags TEXT
-            )
-            ''')
-            
-            conn.commit()
-            conn.close()
+            # Versioned schema shared with the modular app: tables, search index, sampler, cache and query indexes
+            run_write(migrate)
         except Exception as e:
             messagebox.showerror("Database Error", f"Failed to initialize database: {str(e)}")
             log_error("Database initialization error", e)
@@ -205,66 +237,65 @@ class MPStatementRewriter:
     def populate_sample_data(self):
         """Populate the database with sample past responses if empty"""
         try:
-            conn = sqlite3.connect('mp_rewriter.db')
-            cursor = conn.cursor()
+            # Runs as one job on the writer thread so the checks and inserts are atomic
+            def seed(conn):
+                cursor = conn.cursor()
             
-            # Check if past_responses table is empty
-            cursor.execute("SELECT COUNT(*) FROM past_responses")
-            count = cursor.fetchone()[0]
+                # Check if past_responses table is empty
+                cursor.execute("SELECT COUNT(*) FROM past_responses")
+                count = cursor.fetchone()[0]
             
-            if count == 0:
-                # Add sample past responses (good examples) with tones
-                sample_responses = [
-                    ("I've heard from many residents across our constituency about the impact of these changes. While the government's policy aims to address national concerns, I want to assure everyone that I'm working tirelessly to ensure our local needs are properly considered and that no one is left behind. Just last week, I met with the Minister to discuss how this will affect our high street businesses and secured a commitment for additional support.", 
-                     "Policy Response", "Empathetic/Caring"),
+                if count == 0:
+                    # Add sample past responses (good examples) with tones
+                    sample_responses = [
+                        ("I've heard from many residents across our constituency about the impact of these changes. While the government's policy aims to address national concerns, I want to assure everyone that I'm working tirelessly to ensure our local needs are properly considered and that no one is left behind. Just last week, I met with the Minister to discuss how this will affect our high street businesses and secured a commitment for additional support.", 
+                         "Policy Response", "Empathetic/Caring"),
                     
-                    ("The recent funding announcement is welcome news for our area. I've been lobbying ministers for months to recognize our community's specific needs, and I'm pleased to see that our voice has been heard. This £2.4 million investment will directly benefit families in Millfield, Westpark and Northside, with particular focus on improving the facilities that residents have repeatedly told me are their top priorities. I'll be holding a series of community meetings next month to ensure these funds deliver maximum impact where they're needed most.", 
-                     "Funding Announcement", "Optimistic/Positive"),
+                        ("The recent funding announcement is welcome news for our area. I've been lobbying ministers for months to recognize our community's specific needs, and I'm pleased to see that our voice has been heard. This £2.4 million investment will directly benefit families in Millfield, Westpark and Northside, with particular focus on improving the facilities that residents have repeatedly told me are their top priorities. I'll be holding a series of community meetings next month to ensure these funds deliver maximum impact where they're needed most.", 
+                         "Funding Announcement", "Optimistic/Positive"),
                     
-                    ("The safety of our community is my top priority. Following the concerning incidents in the town center last month, I've been in regular contact with our local police leadership, and I've secured a commitment for increased patrols in the affected areas. Everyone deserves to feel safe in their neighborhood, and I won't rest until this issue is properly addressed. I've also established a community safety forum that will meet monthly - the first session is on Thursday at the Community Centre, and I encourage anyone concerned to attend and have your voice heard.", 
-                     "Community Safety", "Authoritative/Confident"),
+                        ("The safety of our community is my top priority. Following the concerning incidents in the town center last month, I've been in regular contact with our local police leadership, and I've secured a commitment for increased patrols in the affected areas. Everyone deserves to feel safe in their neighborhood, and I won't rest until this issue is properly addressed. I've also established a community safety forum that will meet monthly - the first session is on Thursday at the Community Centre, and I encourage anyone concerned to attend and have your voice heard.", 
+                         "Community Safety", "Authoritative/Confident"),
                     
-                    ("Our local schools are the backbone of our community, and I'm proud to support the incredible work of our teachers and staff. The challenges they face deserve recognition, which is why I've raised these concerns directly with the Education Secretary and will continue pressing for the resources our children deserve. Having visited all twelve schools in our constituency this term, I've seen firsthand both the remarkable dedication of staff and the urgent need for better funding. This isn't just about buildings or budgets – it's about giving our children the best possible start in life.", 
-                     "Education", "Conversational/Friendly")
-                ]
-                
-                cursor.executemany("""
-                INSERT INTO past_responses (published_text, topic, tone)
-                VALUES (?, ?, ?)
-                """, sample_responses)
-                
-                # Check if submissions table has any rejected examples
-                cursor.execute("SELECT COUNT(*) FROM submissions WHERE status = 'rejected'")
-                rejected_count = cursor.fetchone()[0]
-                
-                if rejected_count == 0:
-                    # Add sample rejected submissions to demonstrate what to avoid
-                    sample_rejected = [
-                        ("The Government has announced a new infrastructure plan that will benefit the entire nation. This is good news for everyone. The plan includes funding for various projects across the country and will create jobs. I support this initiative and look forward to seeing the positive impact it will have on our economy.", 
-                         "The constituency has several infrastructure projects that need funding, including the bypass road and bridge repairs.", 
-                         "Local residents", 
-                         "Neutral/Balanced",
-                         "The Government has announced a new infrastructure plan that will benefit the entire nation. This is good news for everyone. The plan includes funding for various projects across the country and will create jobs. I support this initiative and look forward to seeing the positive impact it will have on our economy.",
-                         "rejected",
-                         "Too generic, doesn't mention local context"),
-                        
-                        ("As your Member of Parliament, I am writing to inform you about the recent announcement regarding education funding. The Department of Education has allocated additional resources to schools across the country. This development aligns with the government's commitment to improving educational standards nationwide. Should you have any queries regarding this matter, please do not hesitate to contact my office.",
-                         "Local schools have been facing budget cuts and three schools need urgent repairs to their buildings.",
-                         "Parents and teachers",
-                         "Formal/Professional",
-                         "As your Member of Parliament, I am writing to inform you about the recent announcement regarding education funding. The Department of Education has allocated additional resources to schools across the country. This development aligns with the government's commitment to improving educational standards nationwide. Should you have any queries regarding this matter, please do not hesitate to contact my office.",
-                         "rejected",
-                         "Too formal and impersonal, doesn't address specific local school issues")
+                        ("Our local schools are the backbone of our community, and I'm proud to support the incredible work of our teachers and staff. The challenges they face deserve recognition, which is why I've raised these concerns directly with the Education Secretary and will continue pressing for the resources our children deserve. Having visited all twelve schools in our constituency this term, I've seen firsthand both the remarkable dedication of staff and the urgent need for better funding. This isn't just about buildings or budgets – it's about giving our children the best possible start in life.", 
+                         "Education", "Conversational/Friendly")
                     ]
                     
                     cursor.executemany("""
-                    INSERT INTO submissions (original_text, context, target_audience, tone, generated_text, status, notes)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                    """, sample_rejected)
-                
-                conn.commit()
-            
-            conn.close()
+                    INSERT INTO past_responses (published_text, topic, tone, content_hash)
+                    VALUES (?, ?, ?, ?)
+                    """, [(text, topic, tone, content_hash(text)) for text, topic, tone in sample_responses])
+                
+                    # Check if submissions table has any rejected examples
+                    cursor.execute("SELECT COUNT(*) FROM submissions WHERE status = 'rejected'")
+                    rejected_count = cursor.fetchone()[0]
+            
+                    if rejected_count == 0:
+                        # Add sample rejected submissions to demonstrate what to avoid
+                        sample_rejected = [
+                            ("The Government has announced a new infrastructure plan that will benefit the entire nation. This is good news for everyone. The plan includes funding for various projects across the country and will create jobs. I support this initiative and look forward to seeing the positive impact it will have on our economy.", 
+                             "The constituency has several infrastructure projects that need funding, including the bypass road and bridge repairs.", 
+                             "Local residents", 
+                             "Neutral/Balanced",
+                             "The Government has announced a new infrastructure plan that will benefit the entire nation. This is good news for everyone. The plan includes funding for various projects across the country and will create jobs. I support this initiative and look forward to seeing the positive impact it will have on our economy.",
+                             "rejected",
+                             "Too generic, doesn't mention local context"),
+                            
+                            ("As your Member of Parliament, I am writing to inform you about the recent announcement regarding education funding. The Department of Education has allocated additional resources to schools across the country. This development aligns with the government's commitment to improving educational standards nationwide. Should you have any queries regarding this matter, please do not hesitate to contact my office.",
+                             "Local schools have been facing budget cuts and three schools need urgent repairs to their buildings.",
+                             "Parents and teachers",
+                             "Formal/Professional",
+                             "As your Member of Parliament, I am writing to inform you about the recent announcement regarding education funding. The Department of Education has allocated additional resources to schools across the country. This development aligns with the government's commitment to improving educational standards nationwide. Should you have any queries regarding this matter, please do not hesitate to contact my office.",
+                             "rejected",
+                             "Too formal and impersonal, doesn't address specific local school issues")
+                        ]
+                        
+                        cursor.executemany("""
+                        INSERT INTO submissions (original_text, context, target_audience, tone, generated_text, status, notes)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                        """, sample_rejected)
+                    
+            run_write(seed)
         except Exception as e:
             log_error("Sample data population error", e)
             print(f"Error populating sample data: {str(e)}")
@@ -303,6 +334,10 @@ class MPStatementRewriter:
             # Version info
             version_label = ttk.Label(status_frame, text="v1.2.0", relief=tk.SUNKEN, anchor=tk.E)
             version_label.pack(side=tk.RIGHT, padx=5)
+            
+            # Response cache hit/miss counters
+            cache_label = ttk.Label(status_frame, textvariable=self.cache_var, relief=tk.SUNKEN, anchor=tk.E)
+            cache_label.pack(side=tk.RIGHT)
         except Exception as e:
             messagebox.showerror("UI Error", f"Failed to create UI: {str(e)}")
             log_error("UI creation error", e)
@@ -329,12 +364,14 @@ class MPStatementRewriter:
             # Tools menu
             tools_menu = tk.Menu(menubar, tearoff=0)
             tools_menu.add_command(label="Import Past Statements", command=self.import_past_statements)
+            tools_menu.add_command(label="Find Near-Duplicates", command=self.find_near_duplicates)
             tools_menu.add_command(label="Settings", command=self.open_settings)
             menubar.add_cascade(label="Tools", menu=tools_menu)
             
             # Help menu
             help_menu = tk.Menu(menubar, tearoff=0)
             help_menu.add_command(label="User Guide", command=self.show_user_guide)
+            help_menu.add_command(label="Diagnostics", command=self.show_diagnostics)
             help_menu.add_command(label="About", command=self.show_about)
             menubar.add_cascade(label="Help", menu=help_menu)
             
@@ -397,6 +434,16 @@ class MPStatementRewriter:
             clear_button = ttk.Button(button_frame, text="Clear Form", command=self.clear_all_fields, style='Secondary.TButton')
             clear_button.pack(side=tk.LEFT, padx=5)
             
+            # Number of drafts to generate and compare
+            ttk.Label(button_frame, text="Drafts:").pack(side=tk.LEFT, padx=(10, 2))
+            variant_spinbox = ttk.Spinbox(button_frame, from_=1, to=MAX_VARIANTS, width=3,
+                                          textvariable=self.variant_count, state="readonly")
+            variant_spinbox.pack(side=tk.LEFT, padx=(0, 10))
+            
+            # Request the next refresh draft in the background after each generation
+            ttk.Checkbutton(button_frame, text="Pre-generate refresh",
+                            variable=self.speculative_refresh).pack(side=tk.LEFT, padx=(0, 10))
+            
             submit_button = ttk.Button(button_frame, text="Generate Rewritten Statement", command=self.submit, style='Primary.TButton')
             submit_button.pack(side=tk.LEFT)
             
@@ -493,6 +540,8 @@ class MPStatementRewriter:
                 self.notes.delete(0, tk.END)
                 self.generated_statement.delete("1.0", tk.END)
                 self.current_submission_id = None
+                self.variant_siblings = []
+                self.speculation.discard()
                 self.accept_button.config(state=tk.DISABLED)
                 self.refresh_button.config(state=tk.DISABLED)
                 self.edit_button.config(state=tk.DISABLED)
@@ -628,40 +677,26 @@ class MPStatementRewriter:
             messagebox.showerror("Error", f"Failed to open history: {str(e)}")
             log_error("Open history error", e)
 
+    def format_submission_row(self, row):
+        """Treeview values for a submissions page row"""
+        id, timestamp, status, audience, tone, original = row
+        
+        # Format the timestamp
+        try:
+            dt = datetime.datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
+            formatted_time = dt.strftime("%d %b %Y, %H:%M")
+        except:
+            formatted_time = timestamp
+        
+        # Preview of original text (first 50 chars)
+        preview = original[:50] + "..." if original and len(original) > 50 else original
+        
+        return (id, formatted_time, status, audience, tone, preview)
+    
     def load_submissions(self, tree):
-        """Load submissions into the treeview"""
+        """Load submissions into the treeview, newest first, a page at a time as it is scrolled"""
         try:
-            # Clear existing items
-            for item in tree.get_children():
-                tree.delete(item)
-                
-            conn = sqlite3.connect('mp_rewriter.db')
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-            SELECT id, timestamp, status, target_audience, tone, original_text, generated_text 
-            FROM submissions
-            ORDER BY timestamp DESC
-            LIMIT 100
-            """)
-            
-            for row in cursor.fetchall():
-                id, timestamp, status, audience, tone, original, generated = row
-                
-                # Format the timestamp
-                try:
-                    dt = datetime.datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
-                    formatted_time = dt.strftime("%d %b %Y, %H:%M")
-                except:
-                    formatted_time = timestamp
-                
-                # Preview of original text (first 30 chars)
-                preview = original[:50] + "..." if original and len(original) > 50 else original
-                
-                tree.insert('', tk.END, values=(id, formatted_time, status, audience, tone, preview))
-                
-            conn.close()
-            
+            get_pager(tree, 'submissions', SUBMISSION_PAGE_COLUMNS, self.format_submission_row).reload()
         except Exception as e:
             messagebox.showerror("Database Error", f"Failed to load submissions: {str(e)}")
             log_error("Load submissions error", e)
@@ -669,6 +704,9 @@ class MPStatementRewriter:
     def search_submissions(self, tree, search_text, search_field):
         """Search submissions based on criteria"""
         try:
+            # Search results replace the paged listing
+            stop_paging(tree)
+            
             # Clear existing items
             for item in tree.get_children():
                 tree.delete(item)
@@ -677,48 +715,10 @@ class MPStatementRewriter:
                 self.load_submissions(tree)
                 return
                 
-            conn = sqlite3.connect('mp_rewriter.db')
-            cursor = conn.cursor()
-            
-            # Build query based on search field
-            if search_field == "All Fields":
-                query = """
-                SELECT id, timestamp, status, target_audience, tone, original_text, generated_text 
-                FROM submissions
-                WHERE original_text LIKE ? OR generated_text LIKE ? OR target_audience LIKE ? OR status LIKE ? OR tone LIKE ?
-                ORDER BY timestamp DESC
-                """
-                params = ('%' + search_text + '%',) * 5
-            elif search_field == "Content":
-                query = """
-                SELECT id, timestamp, status, target_audience, tone, original_text, generated_text 
-                FROM submissions
-                WHERE original_text LIKE ? OR generated_text LIKE ?
-                ORDER BY timestamp DESC
-                """
-                params = ('%' + search_text + '%', '%' + search_text + '%')
-            else:
-                # Map UI fields to database fields
-                field_map = {
-                    "Audience": "target_audience",
-                    "Status": "status",
-                    "Tone": "tone"
-                }
-                db_field = field_map.get(search_field, "target_audience")
-                
-                query = f"""
-                SELECT id, timestamp, status, target_audience, tone, original_text, generated_text 
-                FROM submissions
-                WHERE {db_field} LIKE ?
-                ORDER BY timestamp DESC
-                """
-                params = ('%' + search_text + '%',)
-            
-            cursor.execute(query, params)
+            # Ranked full-text search; the preview shows the matched passage
+            for row in find_submissions(search_text, search_field):
+                id, timestamp, status, audience, tone, original, generated, snippet = row
             
-            for row in cursor.fetchall():
-                id, timestamp, status, audience, tone, original, generated = row
-                
                 # Format the timestamp
                 try:
                     dt = datetime.datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
@@ -726,12 +726,7 @@ class MPStatementRewriter:
                 except:
                     formatted_time = timestamp
                 
-                # Preview of original text (first 30 chars)
-                preview = original[:50] + "..." if original and len(original) > 50 else original
-                
-                tree.insert('', tk.END, values=(id, formatted_time, status, audience, tone, preview))
-                
-            conn.close()
+                tree.insert('', tk.END, values=(id, formatted_time, status, audience, tone, snippet))
             
         except Exception as e:
             messagebox.showerror("Search Error", f"Failed to search submissions: {str(e)}")
@@ -744,17 +739,16 @@ class MPStatementRewriter:
                 messagebox.showwarning("No Selection", "Please select a submission to view.")
                 return
                 
-            conn = sqlite3.connect('mp_rewriter.db')
-            cursor = conn.cursor()
+            with get_connection() as conn:
+                cursor = conn.cursor()
             
-            cursor.execute("""
-            SELECT original_text, context, target_audience, tone, generated_text, status, timestamp, notes
-            FROM submissions
-            WHERE id = ?
-            """, (submission_id,))
+                cursor.execute("""
+                SELECT original_text, context, target_audience, tone, generated_text, status, timestamp, notes
+                FROM submissions
+                WHERE id = ?
+                """, (submission_id,))
             
-            result = cursor.fetchone()
-            conn.close()
+                result = cursor.fetchone()
             
             if not result:
                 messagebox.showwarning("Not Found", f"Submission #{submission_id} not found.")
@@ -850,17 +844,16 @@ class MPStatementRewriter:
                 messagebox.showwarning("No Selection", "Please select a submission to load.")
                 return
                 
-            conn = sqlite3.connect('mp_rewriter.db')
-            cursor = conn.cursor()
+            with get_connection() as conn:
+                cursor = conn.cursor()
             
-            cursor.execute("""
-            SELECT original_text, context, target_audience, tone, generated_text, notes
-            FROM submissions
-            WHERE id = ?
-            """, (submission_id,))
+                cursor.execute("""
+                SELECT original_text, context, target_audience, tone, generated_text, notes
+                FROM submissions
+                WHERE id = ?
+                """, (submission_id,))
             
-            result = cursor.fetchone()
-            conn.close()
+                result = cursor.fetchone()
             
             if not result:
                 messagebox.showwarning("Not Found", f"Submission #{submission_id} not found.")
@@ -902,6 +895,7 @@ class MPStatementRewriter:
             
             # Set current submission ID
             self.current_submission_id = submission_id
+            self.speculation.discard()
             
             # Close history window if it exists
             if self.history_window and self.history_window.winfo_exists():
@@ -953,31 +947,7 @@ class MPStatementRewriter:
             tree.pack(fill=tk.BOTH, expand=True)
             
             # Load data
-            conn = sqlite3.connect('mp_rewriter.db')
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-            SELECT id, timestamp, topic, tone, published_text 
-            FROM past_responses
-            ORDER BY timestamp DESC
-            """)
-            
-            for row in cursor.fetchall():
-                id, timestamp, topic, tone, text = row
-                
-                # Format the timestamp
-                try:
-                    dt = datetime.datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
-                    formatted_time = dt.strftime("%d %b %Y")
-                except:
-                    formatted_time = timestamp
-                
-                # Preview of text
-                preview = text[:50] + "..." if text and len(text) > 50 else text
-                
-                tree.insert('', tk.END, values=(id, formatted_time, topic or "General", tone or "Not specified", preview))
-                
-            conn.close()
+            self.load_approved_statements(tree)
             
             # Add search frame
             search_frame = ttk.Frame(frame)
@@ -1009,82 +979,48 @@ class MPStatementRewriter:
             messagebox.showerror("Error", f"Failed to load approved statements: {str(e)}")
             log_error("View approved statements error", e)
 
+    def format_approved_row(self, row):
+        """Treeview values for a past_responses page row"""
+        id, timestamp, topic, tone, text = row
+        
+        # Format the timestamp
+        try:
+            dt = datetime.datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
+            formatted_time = dt.strftime("%d %b %Y")
+        except:
+            formatted_time = timestamp
+        
+        # Preview of text
+        preview = text[:50] + "..." if text and len(text) > 50 else text
+        
+        return (id, formatted_time, topic or "General", tone or "Not specified", preview)
+    
+    def load_approved_statements(self, tree):
+        """Load approved statements into the treeview, newest first, a page at a time as it is scrolled"""
+        try:
+            get_pager(tree, 'past_responses', APPROVED_PAGE_COLUMNS, self.format_approved_row).reload()
+        except Exception as e:
+            messagebox.showerror("Database Error", f"Failed to load approved statements: {str(e)}")
+            log_error("Load approved statements error", e)
+    
     def search_approved(self, tree, search_text, search_field):
         """Search approved statements based on criteria"""
         try:
+            # Search results replace the paged listing
+            stop_paging(tree)
+            
             # Clear existing items
             for item in tree.get_children():
                 tree.delete(item)
                 
             if not search_text:
                 # Reload all
-                conn = sqlite3.connect('mp_rewriter.db')
-                cursor = conn.cursor()
-                
-                cursor.execute("""
-                SELECT id, timestamp, topic, tone, published_text 
-                FROM past_responses
-                ORDER BY timestamp DESC
-                """)
-                
-                for row in cursor.fetchall():
-                    id, timestamp, topic, tone, text = row
-                    
-                    # Format the timestamp
-                    try:
-                        dt = datetime.datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
-                        formatted_time = dt.strftime("%d %b %Y")
-                    except:
-                        formatted_time = timestamp
-                    
-                    # Preview of text
-                    preview = text[:50] + "..." if text and len(text) > 50 else text
-                    
-                    tree.insert('', tk.END, values=(id, formatted_time, topic or "General", tone or "Not specified", preview))
-                    
-                conn.close()
+                self.load_approved_statements(tree)
                 return
-                
-            conn = sqlite3.connect('mp_rewriter.db')
-            cursor = conn.cursor()
-            
-            # Build query based on search field
-            if search_field == "All Fields":
-                query = """
-                SELECT id, timestamp, topic, tone, published_text 
-                FROM past_responses
-                WHERE published_text LIKE ? OR topic LIKE ? OR tone LIKE ?
-                ORDER BY timestamp DESC
-                """
-                params = ('%' + search_text + '%',) * 3
-            elif search_field == "Content":
-                query = """
-                SELECT id, timestamp, topic, tone, published_text 
-                FROM past_responses
-                WHERE published_text LIKE ?
-                ORDER BY timestamp DESC
-                """
-                params = ('%' + search_text + '%',)
-            else:
-                # Map UI fields to database fields
-                field_map = {
-                    "Topic": "topic",
-                    "Tone": "tone"
-                }
-                db_field = field_map.get(search_field, "topic")
-                
-                query = f"""
-                SELECT id, timestamp, topic, tone, published_text 
-                FROM past_responses
-                WHERE {db_field} LIKE ?
-                ORDER BY timestamp DESC
-                """
-                params = ('%' + search_text + '%',)
-            
-            cursor.execute(query, params)
             
-            for row in cursor.fetchall():
-                id, timestamp, topic, tone, text = row
+            # Ranked full-text search; the preview shows the matched passage
+            for row in find_approved_statements(search_text, search_field):
+                id, timestamp, topic, tone, text, snippet = row
                 
                 # Format the timestamp
                 try:
@@ -1092,13 +1028,8 @@ class MPStatementRewriter:
                     formatted_time = dt.strftime("%d %b %Y")
                 except:
                     formatted_time = timestamp
-                
-                # Preview of text
-                preview = text[:50] + "..." if text and len(text) > 50 else text
-                
-                tree.insert('', tk.END, values=(id, formatted_time, topic or "General", tone or "Not specified", preview))
-                
-            conn.close()
+                    
+                tree.insert('', tk.END, values=(id, formatted_time, topic or "General", tone or "Not specified", snippet))
             
         except Exception as e:
             messagebox.showerror("Search Error", f"Failed to search statements: {str(e)}")
@@ -1111,17 +1042,16 @@ class MPStatementRewriter:
                 messagebox.showwarning("No Selection", "Please select a statement to view.")
                 return
                 
-            conn = sqlite3.connect('mp_rewriter.db')
-            cursor = conn.cursor()
+            with get_connection() as conn:
+                cursor = conn.cursor()
             
-            cursor.execute("""
-            SELECT published_text, topic, tone, timestamp, source, tags
-            FROM past_responses
-            WHERE id = ?
-            """, (statement_id,))
+                cursor.execute("""
+                SELECT published_text, topic, tone, timestamp, source, tags
+                FROM past_responses
+                WHERE id = ?
+                """, (statement_id,))
             
-            result = cursor.fetchone()
-            conn.close()
+                result = cursor.fetchone()
             
             if not result:
                 messagebox.showwarning("Not Found", f"Statement #{statement_id} not found.")
@@ -1250,9 +1180,10 @@ class MPStatementRewriter:
             # Update GUI
             import_window.update()
             
-            # Run import in thread
-            threading.Thread(target=self.perform_import, 
-                           args=(file_path, progress_text, progress_bar, status_label, close_button, import_window)).start()
+            # Run import on the background pool; closing the window cancels it
+            job = submit_job(self.perform_import, file_path, progress_text, progress_bar, status_label, close_button,
+                             import_window, priority=PRIORITY_BACKGROUND, name="import")
+            import_window.protocol("WM_DELETE_WINDOW", lambda: [job.cancel(), import_window.destroy()])
             
         except Exception as e:
             messagebox.showerror("Import Error", f"Failed to import statements: {str(e)}")
@@ -1260,127 +1191,84 @@ class MPStatementRewriter:
 
     def perform_import(self, file_path, progress_text, progress_bar, status_label, close_button, window):
         """Perform the actual import operation"""
+        def show_progress(progress):
+            # Runs on the import thread at most every PROGRESS_INTERVAL; hand the Tk work to the main loop
+            if progress.cancelled:
+                # The import window has been closed
+                return
+            messages = progress.take_messages()
+            if progress.finished:
+                messages.append(f"\nImport completed in {progress.elapsed:.1f}s ({progress.rows_per_second:.0f} rows/sec):\n"
+                                f"- {progress.imported} statements imported successfully\n"
+                                f"- {progress.duplicates} duplicates of statements already in the library skipped\n"
+                                f"- {progress.skipped} empty rows skipped\n- {progress.errors} errors encountered")
+                status = f"Import completed: {progress.imported} statements imported"
+            else:
+                messages.append(f"Read {progress.rows_read} rows, {progress.imported} imported, "
+                                f"{progress.duplicates} duplicates "
+                                f"({progress.rows_per_second:.0f} rows/sec)")
+                status = f"Importing... {progress.fraction:.0%} ({progress.rows_read} rows)"
+            fraction, finished = progress.fraction, progress.finished
+            window.after(0, lambda: [
+                progress_text.insert(tk.END, '\n'.join(messages) + '\n'),
+                progress_text.see(tk.END),
+                progress_bar.config(value=fraction * 100),
+                status_label.config(text=status),
+                close_button.config(state=tk.NORMAL if finished else tk.DISABLED)
+            ])
+        
         try:
-            # Read CSV file
-            with open(file_path, 'r', encoding='utf-8') as file:
-                reader = csv.reader(file)
-                
-                # Get header row
-                headers = next(reader)
-                
-                # Try to map columns
-                col_map = {}
-                required_cols = ['text', 'topic']
-                
-                for i, header in enumerate(headers):
-                    header_lower = header.lower().strip()
-                    
-                    if 'text' in header_lower or 'statement' in header_lower or 'content' in header_lower:
-                        col_map['text'] = i
-                    elif 'topic' in header_lower or 'subject' in header_lower or 'category' in header_lower:
-                        col_map['topic'] = i
-                    elif 'tone' in header_lower:
-                        col_map['tone'] = i
-                    elif 'date' in header_lower or 'time' in header_lower:
-                        col_map['timestamp'] = i
-                    elif 'source' in header_lower:
-                        col_map['source'] = i
-                    elif 'tag' in header_lower:
-                        col_map['tags'] = i
-                
-                # Validate required columns
-                missing = [col for col in required_cols if col not in col_map]
-                if missing:
-                    window.after(0, lambda: [
-                        progress_text.insert(tk.END, f"Error: Missing required columns: {', '.join(missing)}\n"),
-                        progress_text.see(tk.END),
-                        status_label.config(text="Import failed: Missing required columns"),
-                        close_button.config(state=tk.NORMAL)
-                    ])
-                    return
-                
-                # Read all rows to get count
-                all_rows = list(reader)
-                total_rows = len(all_rows)
-                
-                window.after(0, lambda: [
-                    progress_text.insert(tk.END, f"Found {total_rows} statements to import\n"),
-                    progress_text.see(tk.END),
-                    progress_bar.config(maximum=total_rows)
-                ])
-                
-                # Connect to database
-                conn = sqlite3.connect('mp_rewriter.db')
-                cursor = conn.cursor()
-                
-                # Process each row
-                success_count = 0
-                error_count = 0
-                
-                for i, row in enumerate(all_rows):
-                    try:
-                        # Extract data using column mapping
-                        text = row[col_map['text']] if 'text' in col_map and len(row) > col_map['text'] else None
-                        topic = row[col_map['topic']] if 'topic' in col_map and len(row) > col_map['topic'] else None
-                        tone = row[col_map['tone']] if 'tone' in col_map and len(row) > col_map['tone'] else None
-                        timestamp = row[col_map['timestamp']] if 'timestamp' in col_map and len(row) > col_map['timestamp'] else None
-                        source = row[col_map['source']] if 'source' in col_map and len(row) > col_map['source'] else "Imported"
-                        tags = row[col_map['tags']] if 'tags' in col_map and len(row) > col_map['tags'] else None
-                        
-                        # Skip empty rows
-                        if not text or not text.strip():
-                            window.after(0, lambda i=i: [
-                                progress_text.insert(tk.END, f"Skipping row {i+1}: Empty text\n"),
-                                progress_text.see(tk.END),
-                                progress_bar.step(1)
-                            ])
-                            continue
-                        
-                        # Insert into database
-                        cursor.execute("""
-                        INSERT INTO past_responses (published_text, topic, tone, timestamp, source, tags)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                        """, (text, topic, tone, timestamp, source, tags))
-                        
-                        success_count += 1
-                        
-                        # Update progress every 10 rows
-                        if i % 10 == 0 or i == total_rows - 1:
-                            window.after(0, lambda i=i, sc=success_count: [
-                                progress_text.insert(tk.END, f"Imported {sc} statements so far... ({i+1}/{total_rows})\n"),
-                                progress_text.see(tk.END),
-                                progress_bar.step(10 if i % 10 == 0 else i % 10),
-                                status_label.config(text=f"Importing... ({i+1}/{total_rows})")
-                            ])
-                            
-                    except Exception as e:
-                        error_count += 1
-                        window.after(0, lambda i=i, e=str(e): [
-                            progress_text.insert(tk.END, f"Error in row {i+1}: {e}\n"),
-                            progress_text.see(tk.END),
-                            progress_bar.step(1)
-                        ])
-                
-                # Commit changes
-                conn.commit()
-                conn.close()
-                
-                # Final update
+            chunk_size = int(get_config_value('IMPORT', 'CHUNK_SIZE', DEFAULT_CHUNK_SIZE))
+            progress = import_statements(file_path, chunk_size, show_progress)
+            if progress.cancelled or not progress.imported:
+                return
+            
+            # The rows are in; flag any that are lightly edited copies of statements already held
+            window.after(0, lambda: [
+                progress_text.insert(tk.END, "\nChecking the imported statements for near-duplicates...\n"),
+                progress_text.see(tk.END)
+            ])
+            lines = near_duplicate_report(progress)
+            if not current_token().cancelled:
                 window.after(0, lambda: [
-                    progress_text.insert(tk.END, f"\nImport completed:\n- {success_count} statements imported successfully\n- {error_count} errors encountered\n"),
-                    progress_text.see(tk.END),
-                    status_label.config(text=f"Import completed: {success_count} statements imported"),
-                    close_button.config(state=tk.NORMAL)
+                    progress_text.insert(tk.END, '\n'.join(lines) + '\n'),
+                    progress_text.see(tk.END)
                 ])
-                
+        except ImportFormatError as e:
+            window.after(0, lambda message=str(e): [
+                progress_text.insert(tk.END, f"Error: {message}\n"),
+                progress_text.see(tk.END),
+                status_label.config(text="Import failed: Missing required columns"),
+                close_button.config(state=tk.NORMAL)
+            ])
         except Exception as e:
-            window.after(0, lambda: [
-                progress_text.insert(tk.END, f"Import failed: {str(e)}\n"),
+            window.after(0, lambda message=str(e): [
+                progress_text.insert(tk.END, f"Import failed: {message}\n"),
                 progress_text.see(tk.END),
                 status_label.config(text="Import failed"),
                 close_button.config(state=tk.NORMAL)
             ])
             log_error("Import execution error", e)
+    
+    def find_near_duplicates(self):
+        """Group near-duplicate statements in the background and report how many were found"""
+        self.status_var.set("Looking for near-duplicate statements...")
+        
+        def run():
+            try:
+                clusters, statements = cluster_statements()
+            except Exception as e:
+                log_error("Near-duplicate clustering error", e)
+                self.root.after(0, lambda: self.status_var.set("Near-duplicate check failed."))
+                return
+            message = (f"Found {clusters} groups of near-duplicate statements ({statements} statements in all)."
+                       if clusters else "No near-duplicate statements found.")
+            self.root.after(0, lambda: [
+                self.status_var.set(message),
+                messagebox.showinfo("Near-Duplicates", message)
+            ])
+        
+        submit_job(run, priority=PRIORITY_BACKGROUND, name="cluster")
 
     def open_settings(self):
         """Open settings dialog"""
@@ -1403,10 +1291,8 @@ class MPStatementRewriter:
             
             ttk.Label(api_frame, text="OpenAI API Key:", style='Header.TLabel').grid(row=0, column=0, sticky=tk.W, pady=(10, 5))
             
-            # Load current API key
-            config = configparser.ConfigParser()
-            config.read('config.ini')
-            current_key = config['API']['OPENAI_API_KEY'] if 'API' in config and 'OPENAI_API_KEY' in config['API'] else ''
+            # Load current API key (from the environment or .env if set there)
+            current_key = get_config_value('API', 'OPENAI_API_KEY', '')
             
             # If it's the actual key, mask it
             masked_key = "•" * 20 + current_key[-5:] if current_key and current_key != 'your_api_key_here' else ''
@@ -1469,8 +1355,8 @@ class MPStatementRewriter:
             
             # Only update the key if it's not masked
             if api_key and not api_key.startswith('•'):
-                # Instead of saving in config, create or update .env file
-                env_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
+                # Instead of saving in config, create or update the .env file settings are read from
+                env_path = get_config().env_path
                 
                 if os.path.exists(env_path):
                     # Update existing .env file
@@ -1501,10 +1387,8 @@ class MPStatementRewriter:
             with open('config.ini', 'w') as f:
                 config.write(f)
             
-            # Update the current instance
-            self.model = model
-            if api_key and not api_key.startswith('•'):
-                self.openai.api_key = api_key
+            # Apply the new settings now (see config_changed) rather than at the next check
+            reload_config()
             
             # Close the settings window
             if window:
@@ -1584,6 +1468,83 @@ For more detailed information, refer to the full documentation provided with the
             messagebox.showerror("Error", f"Failed to show user guide: {str(e)}")
             log_error("Show user guide error", e)
 
+    def show_diagnostics(self):
+        """Show recent stage latencies, token counts, cache hit rates and database write times"""
+        try:
+            metrics = get_metrics()
+            window = tk.Toplevel(self.root)
+            window.title("Diagnostics")
+            window.geometry("900x600")
+            
+            frame = ttk.Frame(window, padding=10)
+            frame.pack(fill=tk.BOTH, expand=True)
+            
+            ttk.Label(frame, text="Recent Latencies (ms) and Token Counts", style='Header.TLabel').pack(anchor=tk.W)
+            ttk.Label(frame, text=f"Percentiles over the last {metrics.window} samples of each stage",
+                      style='Subheader.TLabel').pack(anchor=tk.W, pady=(0, 5))
+            
+            columns = ('metric', 'samples', 'p50', 'p95', 'p99', 'mean', 'max')
+            tree = ttk.Treeview(frame, columns=columns, show='headings', height=14)
+            for column in columns:
+                tree.heading(column, text=column if column[0] == 'p' else column.title())
+                tree.column(column, width=220 if column == 'metric' else 80,
+                            anchor=tk.W if column == 'metric' else tk.E)
+            tree.pack(fill=tk.BOTH, expand=True)
+            
+            # Latency distribution of the selected stage
+            histogram_var = tk.StringVar(value="Select a stage to see its latency histogram")
+            ttk.Label(frame, textvariable=histogram_var, wraplength=860).pack(anchor=tk.W, pady=5)
+            
+            lines_var = tk.StringVar()
+            ttk.Label(frame, textvariable=lines_var, justify=tk.LEFT).pack(anchor=tk.W, pady=(5, 10))
+            
+            def show_histogram(event=None):
+                selection = tree.selection()
+                if selection:
+                    name = tree.item(selection[0], 'values')[0]
+                    histogram_var.set(f"{name}: {histogram_text(name, metrics.samples(name)) or 'no histogram'}")
+            
+            def refresh():
+                selected = tree.item(tree.selection()[0], 'values')[0] if tree.selection() else None
+                tree.delete(*tree.get_children())
+                for name, stats in metrics.summary().items():
+                    item = tree.insert('', tk.END, values=summary_row(name, stats))
+                    if name == selected:
+                        tree.selection_set(item)
+                lines_var.set("\n".join(line for line in self.diagnostics_lines() if line))
+                show_histogram()
+            
+            def auto_refresh():
+                if window.winfo_exists():
+                    refresh()
+                    window.after(DIAGNOSTICS_REFRESH_MS, auto_refresh)
+            
+            tree.bind('<<TreeviewSelect>>', show_histogram)
+            
+            button_frame = ttk.Frame(frame)
+            button_frame.pack(fill=tk.X)
+            ttk.Button(button_frame, text="Reset", command=lambda: [metrics.reset(), refresh()],
+                       style='Secondary.TButton').pack(side=tk.LEFT)
+            ttk.Button(button_frame, text="Close", command=window.destroy).pack(side=tk.RIGHT)
+            
+            auto_refresh()
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to show diagnostics: {str(e)}")
+            log_error("Show diagnostics error", e)
+    
+    def diagnostics_lines(self):
+        """Cache and database counters shown under the diagnostics table"""
+        cache = get_response_cache()
+        usage = get_prompt_usage()
+        writer = get_writer()
+        return [
+            f"Response cache: {cache.hit_rate:.0%} hit rate ({cache.hits} hits / {cache.misses} misses)",
+            f"Prompt cache: {usage.hit_rate:.0%} of {usage.prompt_tokens} prompt tokens over {usage.requests} requests",
+            self.speculation.status_text(),
+            f"Database writer: {writer.jobs_written} writes in {writer.commits} commits "
+            "(db.write_batch is one commit, db.write_wait the time a write was queued)"
+        ]
+
     def show_about(self):
         """Show the about dialog"""
         try:
@@ -1634,8 +1595,13 @@ For more detailed information, refer to the full documentation provided with the
             self.edit_button.config(state=tk.DISABLED)
             self.copy_button.config(state=tk.DISABLED)
             
-            # Use threading to prevent UI freeze
-            threading.Thread(target=self.process_submission, args=(raw_text, context, audience, tone, notes)).start()
+            # Drafts from an earlier multi-draft generation no longer apply
+            self.variant_siblings = []
+            self.speculation.discard()
+            
+            # Generate on the background pool, ahead of any queued imports
+            submit_job(self.process_submission, raw_text, context, audience, tone, notes, self.get_variant_count(),
+                       priority=PRIORITY_INTERACTIVE, name="generate")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to submit: {str(e)}")
             log_error("Submit error", e)
@@ -1643,28 +1609,158 @@ For more detailed information, refer to the full documentation provided with the
             self.progress.grid_remove()
             self.status_var.set("Error during submission.")
 
-    def process_submission(self, raw_text, context, audience, tone, notes):
-        """Process the submission in a separate thread"""
+    def process_submission(self, raw_text, context, audience, tone, notes, variants=1):
+        """Process the submission in a separate thread, streaming tokens to the UI"""
+        if variants > 1:
+            return self.process_variants(raw_text, context, audience, tone, notes, variants)
+        
+        # Tokens are shown as they arrive; timings run from the submit click
+        stream = TokenStream()
+        self.root.after(0, self.start_stream_display, stream)
         try:
-            # Retrieve past statements
-            accepted_responses = self.get_past_responses(status="accepted", limit=3)
-            rejected_responses = self.get_past_responses(status="rejected", limit=2)
+            # Retrieve the past statements most similar to this one
+            with span('generation.retrieval'):
+                accepted_responses, rejected_responses = retrieve_examples(raw_text, context, audience, tone,
+                                                                           accepted_limit=3, rejected_limit=2)
+            
+            # Construct prompt, fitting the examples into the token budget
+            with span('generation.prompt_build'):
+                prompt, prompt_tokens = self.fit_generation_prompt(raw_text, context, audience, tone,
+                                                                   accepted_responses, rejected_responses)
+            record('generation.prompt_tokens', prompt_tokens)
+            
+            # Call the LLM API in streaming mode
+            with span('generation.api'):
+                success, generated_text = self.stream_llm_api(prompt, stream)
+            if not success:
+                raise Exception(generated_text)
+            
+            # Log the full statement once the stream has completed
+            with span('generation.db'):
+                self.current_submission_id = self.log_submission(raw_text, context, audience, tone, generated_text,
+                                                                 notes, prompt_tokens)
+            stream.finish(generated_text)
             
-            # Construct prompt
-            prompt = self.construct_prompt(raw_text, context, audience, tone, accepted_responses, rejected_responses)
-            
-            # Call the LLM API
-            generated_text = self.call_llm_api(prompt)
+        except Exception as e:
+            stream.fail(f"Error during generation: {str(e)}")
+            log_error("Process submission error", e)
+    
+    def prompt_budget(self):
+        """Token budget for one request: [PROMPT] TOKEN_BUDGET, leaving room for the completion"""
+        try:
+            budget = int(get_config_value('PROMPT', 'TOKEN_BUDGET', DEFAULT_PROMPT_TOKEN_BUDGET))
+        except ValueError:
+            budget = DEFAULT_PROMPT_TOKEN_BUDGET
+        return prompt_token_budget(getattr(self, 'model', None), GENERATION_PARAMS["max_tokens"], budget)
+    
+    def fit_generation_prompt(self, raw_text, context, audience, tone, accepted_responses, rejected_responses):
+        """Generation prompt with the best-ranked examples that fit the budget; returns (prompt, prompt tokens)"""
+        return fit_prompt(
+            lambda accepted, rejected: self.construct_prompt(raw_text, context, audience, tone, accepted, rejected),
+            accepted_responses, rejected_responses, system_message(), self.prompt_budget())
+    
+    def start_stream_display(self, stream):
+        """Clear the output box and start draining streamed tokens into it"""
+        try:
+            self.generated_statement.delete("1.0", tk.END)
+            pump_stream(self.root, self.generated_statement, stream, self.finish_stream_display)
+        except Exception as e:
+            log_error("Start stream display error", e)
+    
+    def finish_stream_display(self, stream):
+        """Show the completed statement, or the error that ended the stream"""
+        if stream.error:
+            self.handle_error(stream.error)
+            return
+        
+        self.last_time_to_first_token = stream.time_to_first_token
+        with span('generation.render'):
+            self.update_ui_with_generation(stream.text)
+        record('generation.end_to_end', (time.perf_counter() - stream.started) * 1000)
+        if stream.time_to_first_token is not None:
+            record('generation.first_token', stream.time_to_first_token * 1000)
+            self.status_var.set(f"Statement generated in {stream.total_time:.1f}s "
+                                f"(first words after {stream.time_to_first_token:.1f}s). "
+                                "Please review and accept or regenerate.")
+    
+    def get_variant_count(self):
+        """Number of drafts requested in the input panel"""
+        try:
+            return max(1, min(MAX_VARIANTS, int(self.variant_count.get())))
+        except (TypeError, ValueError):
+            return 1
+    
+    def process_variants(self, raw_text, context, audience, tone, notes, count):
+        """Generate several drafts in one request and log them together"""
+        try:
+            # Retrieve the past statements most similar to this one
+            with span('variants.retrieval'):
+                accepted_responses, rejected_responses = retrieve_examples(raw_text, context, audience, tone,
+                                                                           accepted_limit=3, rejected_limit=2)
+            
+            # Construct prompt, fitting the examples into the token budget
+            with span('variants.prompt_build'):
+                prompt, prompt_tokens = self.fit_generation_prompt(raw_text, context, audience, tone,
+                                                                   accepted_responses, rejected_responses)
+            record('variants.prompt_tokens', prompt_tokens)
+            
+            # One request returns every draft, so N drafts cost a single round trip
+            with span('variants.api'):
+                generated_texts = self.call_llm_api_variants(prompt, count)
+            
+            # All drafts are logged in one transaction
+            with span('variants.db'):
+                submission_ids = self.log_submission_variants(raw_text, context, audience, tone, generated_texts,
+                                                              notes, prompt_tokens)
+            if len(submission_ids) != len(generated_texts):
+                raise Exception("Failed to log the generated drafts")
+            
+            self.root.after(0, self.show_variants, list(zip(submission_ids, generated_texts)))
+        
+        except Exception as e:
+            self.root.after(0, self.handle_error, f"Error during generation: {str(e)}")
+            log_error("Process variants error", e)
+    
+    def show_variants(self, candidates):
+        """Load the first draft and open the side-by-side comparison"""
+        self.choose_variant(candidates, 0)
+        try:
+            window = tk.Toplevel(self.root)
+            window.title("Compare Drafts")
+            window.geometry(f"{min(1400, 380 * len(candidates))}x600")
             
-            # Log the submission
-            self.current_submission_id = self.log_submission(raw_text, context, audience, tone, generated_text, notes)
+            frame = ttk.Frame(window, padding=10)
+            frame.pack(fill=tk.BOTH, expand=True)
             
-            # Update UI
-            self.root.after(0, self.update_ui_with_generation, generated_text)
+            ttk.Label(frame, text="Choose the draft to continue with", style='Header.TLabel').grid(
+                row=0, column=0, columnspan=len(candidates), sticky=tk.W, pady=(0, 10))
             
+            for column, (submission_id, text) in enumerate(candidates):
+                ttk.Label(frame, text=f"Draft {column + 1} ({len(text.split())} words)", style='Subheader.TLabel').grid(
+                    row=1, column=column, sticky=tk.W, padx=5)
+                
+                draft_text = scrolledtext.ScrolledText(frame, wrap=tk.WORD, width=40)
+                draft_text.insert(tk.END, text)
+                draft_text.config(state=tk.DISABLED)
+                draft_text.grid(row=2, column=column, sticky=(tk.W, tk.E, tk.N, tk.S), padx=5)
+                
+                ttk.Button(frame, text="Use This Draft", style='Primary.TButton',
+                           command=lambda index=column: [self.choose_variant(candidates, index), window.destroy()]).grid(
+                    row=3, column=column, pady=10)
+                
+                frame.grid_columnconfigure(column, weight=1)
+            frame.grid_rowconfigure(2, weight=1)
         except Exception as e:
-            self.root.after(0, lambda: self.handle_error(f"Error during generation: {str(e)}"))
-            log_error("Process submission error", e)
+            log_error("Variants window error", e)
+    
+    def choose_variant(self, candidates, index):
+        """Continue with one draft; the others are rejected once it is accepted"""
+        submission_id, text = candidates[index]
+        self.current_submission_id = submission_id
+        self.variant_siblings = [other_id for other_id, _ in candidates if other_id != submission_id]
+        self.update_ui_with_generation(text)
+        self.status_var.set(f"Showing draft {index + 1} of {len(candidates)}. "
+                            "Accepting it marks the other drafts rejected.")
 
     def update_ui_with_generation(self, generated_text):
         """Update the UI with the generated text"""
@@ -1688,9 +1784,43 @@ For more detailed information, refer to the full documentation provided with the
             
             # Update status
             self.status_var.set("Statement generated. Please review and accept or regenerate.")
+            
+            # Update cache hit/miss counters
+            self.update_usage_status()
+            
+            # Start on the likely next refresh while the user reviews this draft
+            self.start_speculative_refresh()
         except Exception as e:
             self.handle_error(f"Error updating UI: {str(e)}")
             log_error("Update UI error", e)
+    
+    def finish_refresh_display(self, generated_text, started):
+        """Show a refreshed statement and record the refresh's time from start to screen"""
+        with span('refresh.render'):
+            self.update_ui_with_generation(generated_text)
+        record('refresh.end_to_end', (time.perf_counter() - started) * 1000)
+    
+    def update_usage_status(self):
+        """Show response cache, prompt cache and speculative refresh counters in the status bar"""
+        texts = [get_response_cache().status_text(), get_prompt_usage().status_text(), self.speculation.status_text()]
+        self.cache_var.set("  |  ".join(text for text in texts if text))
+    
+    def refresh_key(self, raw_text, context, audience, tone):
+        """Inputs a refresh draft depends on; a speculation is only used if they are unchanged"""
+        return (self.current_submission_id, raw_text, context, audience, tone)
+    
+    def start_speculative_refresh(self):
+        """Request the refresh draft for the statement on screen at the lowest priority, if enabled"""
+        if not self.speculative_refresh.get() or not self.current_submission_id:
+            self.speculation.discard()
+            return
+        
+        raw_text = self.raw_statement.get("1.0", tk.END).strip()
+        context = self.context.get().strip()
+        audience = self.target_audience.get().strip()
+        tone = self.tone_var.get()
+        self.speculation.start(self.refresh_key(raw_text, context, audience, tone), self.generate_refresh,
+                               self.current_submission_id, raw_text, context, audience, tone)
 
     def handle_error(self, error_message):
         """Handle errors and update UI accordingly"""
@@ -1707,61 +1837,24 @@ For more detailed information, refer to the full documentation provided with the
     def get_past_responses(self, status=None, limit=3):
         """Retrieve past responses from the database"""
         try:
-            conn = sqlite3.connect('mp_rewriter.db')
-            cursor = conn.cursor()
-            
-            if status == "accepted":
-                # Get random past approved responses
-                cursor.execute("""
-                SELECT published_text, topic, tone FROM past_responses
-                ORDER BY RANDOM()
-                LIMIT ?
-                """, (limit,))
+            with get_connection() as conn:
+                # Sample spares where possible so near-duplicates can be dropped
+                if status == "accepted":
+                    # Get random past approved responses
+                    results = diverse(sample_library(conn, limit * 2), limit)
                 
-                results = cursor.fetchall()
+                    # If we don't have enough from past_responses, get from accepted submissions
+                    if len(results) < limit:
+                        results = diverse(results + sample_submissions(conn, 'accepted', (limit - len(results)) * 2), limit)
                 
-                # If we don't have enough from past_responses, get from accepted submissions
-                if len(results) < limit:
-                    cursor.execute("""
-                    SELECT generated_text, target_audience, tone FROM submissions
-                    WHERE status = 'accepted'
-                    ORDER BY RANDOM()
-                    LIMIT ?
-                    """, (limit - len(results),))
-                    
-                    results.extend(cursor.fetchall())
-                
-            elif status == "rejected":
-                # Get random rejected submissions
-                cursor.execute("""
-                SELECT generated_text, target_audience, tone FROM submissions
-                WHERE status = 'rejected'
-                ORDER BY RANDOM()
-                LIMIT ?
-                """, (limit,))
-                
-                results = cursor.fetchall()
+                elif status == "rejected":
+                    # Get random rejected submissions
+                    results = diverse(sample_submissions(conn, 'rejected', limit * 2), limit)
                 
-            else:
-                # Get mix of both
-                cursor.execute("""
-                SELECT published_text, topic, tone FROM past_responses
-                ORDER BY RANDOM()
-                LIMIT ?
-                """, (limit // 2 + 1,))
-                
-                results = cursor.fetchall()
-                
-                cursor.execute("""
-                SELECT generated_text, target_audience, tone FROM submissions
-                WHERE status = 'accepted'
-                ORDER BY RANDOM()
-                LIMIT ?
-                """, (limit // 2,))
-                
-                results.extend(cursor.fetchall())
-            
-            conn.close()
+                else:
+                    # Get mix of both
+                    results = diverse(sample_library(conn, limit // 2 + 1) + sample_submissions(conn, 'accepted', limit // 2),
+                                      limit // 2 + 1 + limit // 2)
             
             # Return list of tuples (text, context/topic, tone)
             return results
@@ -1771,84 +1864,9 @@ For more detailed information, refer to the full documentation provided with the
             return []
     
     def construct_prompt(self, raw_text, context, audience, tone, accepted_responses, rejected_responses=None):
-        """Construct a prompt for the LLM that includes all necessary context"""
+        """Construct the user message for a generation from the templates in seperate/system_prompt.py"""
         try:
-            # Get tone instructions
-            tone_instructions = self.get_tone_instructions(tone)
-            
-            # Format accepted examples
-            accepted_examples = ""
-            if accepted_responses:
-                accepted_examples = "## EXAMPLES TO EMULATE (these showcase the MP's voice and style):\n\n"
-                for i, (response, topic, resp_tone) in enumerate(accepted_responses, 1):
-                    accepted_examples += f"### Example {i} "
-                    if resp_tone and resp_tone != "None":
-                        accepted_examples += f"(Tone: {resp_tone})"
-                    accepted_examples += f":\n\"{response}\"\n\n"
-            
-            # Format rejected examples
-            rejected_examples = ""
-            if rejected_responses and len(rejected_responses) > 0:
-                rejected_examples = "## EXAMPLES TO AVOID (these were rejected or don't reflect the MP's voice well):\n\n"
-                for i, (response, topic, resp_tone) in enumerate(rejected_responses, 1):
-                    rejected_examples += f"### Bad Example {i}:\n\"{response}\"\n\n"
-                    rejected_examples += f"Problem: This example doesn't fully capture the MP's voice, uses generic language, or lacks personal connection.\n\n"
-            
-            # Create the complete prompt
-            prompt = f"""# MP STATEMENT REWRITING TASK
-
-## OBJECTIVE:
-Transform the government statement below into a personalized communication from the MP that feels authentic, locally relevant, and engaging to the specified audience. The rewritten statement should sound like it comes directly from the MP, incorporating their voice and style while addressing the specific context and audience needs.
-
-## RAW GOVERNMENT STATEMENT: {raw_text} ## LOCAL CONTEXT:
-{context}
-
-## TARGET AUDIENCE:
-{audience}
-
-## REQUIRED TONE: {tone}
-{tone_instructions}
-
-{accepted_examples}
-
-{rejected_examples}
-
-## TRANSFORMATION GUIDELINES:
-
-1. **Authentic Voice**: 
-   - Use first-person perspective ("I", "my", "our constituency")
-   - Maintain the MP's conversational style shown in the examples
-   - Avoid bureaucratic language and generic political phrases
-
-2. **Local Relevance**:
-   - Incorporate specific local context provided
-   - Reference constituency concerns where appropriate
-   - Make national announcements feel relevant to local constituents
-
-3. **Audience Awareness**:
-   - Tailor vocabulary and examples to resonate with the target audience
-   - Address specific concerns this audience might have
-   - Use appropriate level of detail and explanation
-
-4. **Personal Connection**:
-   - Include the MP's personal commitment to the issue
-   - Reference relevant past work on similar issues when appropriate
-   - Show understanding of constituent needs
-
-5. **Clear Communication**:
-   - Maintain clarity on key facts and figures from the original statement
-   - Structure with clear paragraphs and logical flow
-   - Avoid overly complex sentences or jargon
-
-## OUTPUT REQUIREMENTS:
-- Produce a complete, polished statement ready for publication
-- Length should be appropriate to the complexity of the topic (typically 150-300 words)
-- Balance faithfulness to the original information with personalization
-- Do not include any explanatory notes, only provide the rewritten statement
-
-## REWRITTEN STATEMENT:
-"""
-            return prompt
+            return construct_prompt(raw_text, context, audience, tone, accepted_responses, rejected_responses)
         except Exception as e:
             log_error("Prompt construction error", e)
             raise Exception(f"Failed to construct prompt: {str(e)}")
@@ -1856,120 +1874,104 @@ Transform the government statement below into a personalized communication from
     def get_tone_instructions(self, tone):
         """Get specific instructions for the selected tone"""
         try:
-            tone_map = {
-                "Neutral/Balanced": """
-Strike a moderate, even-handed tone that acknowledges different perspectives. 
-- Use measured language that avoids strong emotional appeals
-- Present information in a fair and objective manner
-- Acknowledge complexity without taking strong positions
-- Use balanced phrasing like "on one hand... on the other hand"
-- Convey thoughtfulness and consideration of multiple viewpoints
-""",
-                "Empathetic/Caring": """
-Express genuine concern and understanding for constituents' feelings and experiences.
-- Use warm, compassionate language that validates emotions
-- Acknowledge difficulties people may be experiencing
-- Include phrases like "I understand that..." or "I know many of you are feeling..."
-- Demonstrate that you're listening and that constituent concerns matter
-- Balance empathy with hope and solutions
-""",
-                "Authoritative/Confident": """
-Project strength, expertise and decisiveness.
-- Use clear, direct statements without hedging language
-- Emphasize concrete actions and solutions
-- Include phrases that demonstrate leadership and conviction
-- Maintain a formal, professional tone
-- Reference expertise, experience, or past achievements where relevant
-""",
-                "Optimistic/Positive": """
-Focus on opportunities, solutions and positive outcomes.
-- Emphasize progress, improvements, and future benefits
-- Use uplifting language and hopeful framing
-- Highlight what's working well and potential for positive change
-- Include forward-looking statements and vision
-- Balance optimism with realism to maintain credibility
-""",
-                "Concerned/Serious": """
-Convey appropriate gravity for serious issues while maintaining constructive engagement.
-- Use language that acknowledges the seriousness of challenges
-- Express appropriate concern without alarming unnecessarily
-- Demonstrate that you're taking the issue seriously
-- Balance concern with determination to address problems
-- Avoid minimizing genuine problems
-""",
-                "Conversational/Friendly": """
-Adopt an approachable, personal tone as if speaking directly to constituents.
-- Use relaxed, everyday language rather than formal political speech
-- Include occasional contractions and more casual phrasing
-- Write as if having a one-to-one conversation
-- Create a sense of personal connection and accessibility
-- Maintain professionalism while being personable
-""",
-                "Formal/Professional": """
-Maintain a dignified, traditional political communication style.
-- Use more formal language and structured sentences
-- Maintain appropriate distance and decorum
-- Avoid colloquialisms and overly casual expressions
-- Project statesmanship and institutional respect
-- Focus on precision of language and clarity of message
-""",
-                "Urgent/Call to Action": """
-Convey immediacy and encourage specific responses or engagement.
-- Use language that emphasizes timeliness and importance
-- Include clear calls to action where appropriate
-- Create a sense of momentum and necessary response
-- Use slightly more dynamic and energetic language
-- Balance urgency with reassurance to avoid causing anxiety
-"""
-            }
-            
-            return tone_map.get(tone, "Use a natural, conversational tone that feels personal and authentic.")
+            return get_tone_instructions(tone)
         except Exception as e:
             log_error("Get tone instructions error", e)
             return "Use a natural, conversational tone that feels personal and authentic."
 
-    def call_llm_api(self, prompt):
+    def call_llm_api(self, prompt, use_cache=True):
         """Call the OpenAI API to generate statement"""
         try:
-            response = self.openai.ChatCompletion.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are an expert political communications specialist who rewrites official government statements into personalized MP communications that sound authentic, engaging, and locally relevant."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=1500
-            )
-            return response.choices[0].message.content.strip()
+            system_prompt = system_message()
+            
+            def create():
+                return run_coroutine(complete_text(self.model, system_prompt, prompt, GENERATION_PARAMS))
+            
+            text, _ = cached_completion(self.model, system_prompt, prompt, GENERATION_PARAMS, create, use_cache)
+            return text
         except Exception as e:
             error_message = f"API call failed: {str(e)}"
             log_error("OpenAI API call error", e)
             raise Exception(error_message)
-
-    def log_submission(self, raw_text, context, audience, tone, generated_text, notes=None):
-        """Log the submission to the database"""
+    
+    def call_llm_api_variants(self, prompt, count):
+        """Call the OpenAI API once for several alternative drafts (n=count); never cached"""
         try:
-            conn = sqlite3.connect('mp_rewriter.db')
-            cursor = conn.cursor()
+            system_prompt = system_message()
             
-            # Insert submission
-            cursor.execute("""
-            INSERT INTO submissions (original_text, context, target_audience, tone, generated_text, status, notes)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (raw_text, context, audience, tone, generated_text, "pending", notes))
+            response = run_coroutine(chat_completion(self.model, system_prompt, prompt, GENERATION_PARAMS, n=count))
+            return [choice.message.content.strip() for choice in response.choices]
+        except Exception as e:
+            error_message = f"API call failed: {str(e)}"
+            log_error("OpenAI variants API call error", e)
+            raise Exception(error_message)
+    
+    def stream_llm_api(self, prompt, stream, use_cache=True):
+        """Call the OpenAI API in streaming mode, pushing token deltas into a TokenStream"""
+        try:
+            system_prompt = system_message()
+            
+            def create():
+                # Cancelling the job (e.g. the app is shutting down) cancels the stream
+                return run_coroutine(stream_text(self.model, system_prompt, prompt, GENERATION_PARAMS, stream.put))
+            
+            text, from_cache = cached_completion(self.model, system_prompt, prompt, GENERATION_PARAMS, create, use_cache)
+            if from_cache:
+                stream.put(text)
+            return True, text
+        except JobCancelled:
+            return False, "Generation cancelled"
+        except Exception as e:
+            error_message = f"API call failed: {str(e)}"
+            log_error("OpenAI streaming API call error", e)
+            return False, error_message
+
+    def log_submission(self, raw_text, context, audience, tone, generated_text, notes=None, prompt_tokens=None):
+        """Log the submission to the database, with the prompt's token count if known"""
+        try:
+            def insert_submission(conn):
+                cursor = conn.cursor()
             
-            # Get the inserted row ID
-            submission_id = cursor.lastrowid
+                # Insert submission
+                cursor.execute("""
+                INSERT INTO submissions (original_text, context, target_audience, tone, generated_text, status, notes,
+                                         prompt_tokens)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, (raw_text, context, audience, tone, generated_text, "pending", notes, prompt_tokens))
             
-            conn.commit()
-            conn.close()
+                # Get the inserted row ID
+                return cursor.lastrowid
             
+            submission_id = run_write(insert_submission)
             return submission_id
         except Exception as e:
             messagebox.showerror("Database Error", f"Failed to log submission: {str(e)}")
             log_error("Log submission error", e)
             return None
 
+    def log_submission_variants(self, raw_text, context, audience, tone, generated_texts, notes=None,
+                                prompt_tokens=None):
+        """Log alternative drafts of one statement in a single transaction, returning their IDs
+
+        The drafts come from one request, so each records the same prompt token count.
+        """
+        try:
+            def insert_submissions(conn):
+                submission_ids = []
+                for generated_text in generated_texts:
+                    cursor = conn.execute("""
+                    INSERT INTO submissions (original_text, context, target_audience, tone, generated_text, status,
+                                             notes, prompt_tokens)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    """, (raw_text, context, audience, tone, generated_text, "pending", notes, prompt_tokens))
+                    submission_ids.append(cursor.lastrowid)
+                return submission_ids
+            
+            return run_write(insert_submissions)
+        except Exception as e:
+            log_error("Log submission variants error", e)
+            return []
+    
     def accept_statement(self):
         """Handle the accept button click event"""
         if not self.current_submission_id:
@@ -1977,37 +1979,54 @@ Convey immediacy and encourage specific responses or engagement.
             return
         
         try:
-            conn = sqlite3.connect('mp_rewriter.db')
-            cursor = conn.cursor()
+            # A refresh is no longer coming
+            self.speculation.discard()
             
-            # Update submission status to 'accepted'
-            cursor.execute("""
-            UPDATE submissions SET status = 'accepted' WHERE id = ?
-            """, (self.current_submission_id,))
+            submission_id = self.current_submission_id
+            reject_ids = list(self.variant_siblings)
             
-            # Get the accepted text and metadata to add to past_responses
-            cursor.execute("""
-            SELECT generated_text, target_audience, tone, context 
-            FROM submissions 
-            WHERE id = ?
-            """, (self.current_submission_id,))
+            # Status change, library insert and rejecting the other drafts are one transaction
+            def accept(conn):
+                cursor = conn.cursor()
             
-            result = cursor.fetchone()
+                # Update submission status to 'accepted'
+                cursor.execute("""
+                UPDATE submissions SET status = 'accepted' WHERE id = ?
+                """, (submission_id,))
             
-            if result:
-                generated_text, audience, tone, context = result
-                
-                # Determine topic from context/audience
-                topic = context if context else audience
-                
-                # Add to past_responses
+                # Get the accepted text and metadata to add to past_responses
                 cursor.execute("""
-                INSERT INTO past_responses (published_text, topic, tone, source)
-                VALUES (?, ?, ?, ?)
-                """, (generated_text, topic, tone, f"Generated from submission #{self.current_submission_id}"))
+                SELECT generated_text, target_audience, tone, context 
+                FROM submissions 
+                WHERE id = ?
+                """, (submission_id,))
+            
+                result = cursor.fetchone()
             
-            conn.commit()
-            conn.close()
+                if result:
+                    generated_text, audience, tone, context = result
+                
+                    # Determine topic from context/audience
+                    topic = context if context else audience
+                
+                    # Add to past_responses; accepting the same text again refreshes the existing entry
+                    cursor.execute("""
+                    INSERT INTO past_responses (published_text, topic, tone, source, content_hash)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(content_hash) DO UPDATE SET
+                        topic = excluded.topic, tone = excluded.tone, source = excluded.source, timestamp = CURRENT_TIMESTAMP
+                    """, (generated_text, topic, tone, f"Generated from submission #{submission_id}",
+                          content_hash(generated_text)))
+            
+                # Other drafts from the same generation are no longer candidates
+                if reject_ids:
+                    placeholders = ','.join('?' * len(reject_ids))
+                    cursor.execute(f"""
+                    UPDATE submissions SET status = 'rejected' WHERE id IN ({placeholders}) AND status = 'pending'
+                    """, reject_ids)
+            
+            run_write(accept)
+            self.variant_siblings = []
             
             # Update status
             self.status_var.set("Statement accepted and saved to your library.")
@@ -2044,15 +2063,10 @@ Convey immediacy and encourage specific responses or engagement.
         
         try:
             # Mark current submission as rejected
-            conn = sqlite3.connect('mp_rewriter.db')
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-            UPDATE submissions SET status = 'rejected' WHERE id = ?
-            """, (self.current_submission_id,))
-            
-            conn.commit()
-            conn.close()
+            submission_id = self.current_submission_id
+            run_write(lambda conn: conn.execute("""
+                UPDATE submissions SET status = 'rejected' WHERE id = ?
+                """, (submission_id,)))
             
             # Get original inputs for regeneration
             raw_text = self.raw_statement.get("1.0", tk.END).strip()
@@ -2061,6 +2075,9 @@ Convey immediacy and encourage specific responses or engagement.
             tone = self.tone_var.get()
             notes = self.notes.get().strip()
             
+            # A draft pre-generated for these same inputs is shown instead of a new request
+            speculation = self.speculation.claim(self.refresh_key(raw_text, context, audience, tone))
+            
             # Update status and show progress
             self.status_var.set("Regenerating statement with new approach...")
             self.progress.grid()
@@ -2073,226 +2090,127 @@ Convey immediacy and encourage specific responses or engagement.
             self.copy_button.config(state=tk.DISABLED)
             
             # Regenerate with slightly higher temperature for diversity
-            threading.Thread(target=self.process_refresh, args=(raw_text, context, audience, tone, notes)).start()
+            submit_job(self.process_refresh, raw_text, context, audience, tone, notes, speculation,
+                       priority=PRIORITY_INTERACTIVE, name="refresh")
             
         except Exception as e:
             messagebox.showerror("Database Error", f"Failed to refresh statement: {str(e)}")
             log_error("Refresh statement error", e)
 
-    def process_refresh(self, raw_text, context, audience, tone, notes):
-        """Process the refresh in a separate thread"""
-        try:
-            # Get the most recently rejected statement to explicitly avoid
-            conn = sqlite3.connect('mp_rewriter.db')
+    def build_refresh_prompt(self, submission_id, raw_text, context, audience, tone):
+        """Refresh prompt steering away from the given submission's draft; returns (prompt, prompt tokens)"""
+        # Get the most recently rejected statement to explicitly avoid
+        with get_connection() as conn:
             cursor = conn.cursor()
             
             cursor.execute("""
             SELECT generated_text FROM submissions 
             WHERE id = ? 
             LIMIT 1
-            """, (self.current_submission_id,))
+            """, (submission_id,))
             
             rejected_text = cursor.fetchone()
             
             # Get examples of good statements
-            cursor.execute("""
-            SELECT published_text, topic, tone FROM past_responses 
-            ORDER BY RANDOM() 
-            LIMIT 3
-            """)
-            
-            good_examples = cursor.fetchall()
+            good_examples = sample_library(conn, 3)
             
             # Get another rejected statement
-            cursor.execute("""
-            SELECT generated_text, target_audience, tone FROM submissions 
-            WHERE status = 'rejected' AND id != ? 
-            ORDER BY RANDOM() 
-            LIMIT 1
-            """, (self.current_submission_id,))
-            
-            other_rejected = cursor.fetchall()
-            
-            conn.close()
-            
-            # Create an explicit rejection example
-            rejected_examples = []
-            if rejected_text:
-                rejected_examples.append((rejected_text[0], f"Previous attempt for {audience}", tone))
-            
-            # Add other rejected examples
-            rejected_examples.extend(other_rejected)
-            
-            # Construct a refresh prompt
-            prompt = self.construct_refresh_prompt(raw_text, context, audience, tone, good_examples, rejected_examples)
+            other_rejected = sample_submissions(conn, 'rejected', 1, exclude_id=submission_id)
+        
+        # Create an explicit rejection example
+        rejected_examples = []
+        if rejected_text:
+            rejected_examples.append((rejected_text[0], f"Previous attempt for {audience}", tone))
+        
+        # Add other rejected examples
+        rejected_examples.extend(other_rejected)
+        
+        # Construct a refresh prompt; the previous attempt ranks first among the examples to avoid
+        return fit_prompt(
+            lambda accepted, rejected: self.construct_refresh_prompt(raw_text, context, audience, tone, accepted,
+                                                                     rejected),
+            good_examples, rejected_examples, system_message(refresh=True), self.prompt_budget())
+    
+    def generate_refresh(self, submission_id, raw_text, context, audience, tone):
+        """Generate a refresh draft; returns (generated_text, estimated tokens spent)"""
+        with span('refresh.prompt_build'):
+            prompt, prompt_tokens = self.build_refresh_prompt(submission_id, raw_text, context, audience, tone)
+        record('refresh.prompt_tokens', prompt_tokens)
+        
+        # Call the LLM API, bypassing the response cache so each refresh differs
+        with span('refresh.api'):
+            generated_text = self.call_refresh_llm_api(prompt, use_cache=False)
+        return generated_text, prompt_tokens + GENERATION_PARAMS["max_tokens"]
+    
+    def process_refresh(self, raw_text, context, audience, tone, notes, speculation=None):
+        """Process the refresh in a separate thread"""
+        started = time.perf_counter()
+        try:
+            # Use the pre-generated draft if there is one, waiting for it if still in flight
+            generated_text = None
+            if speculation is not None:
+                try:
+                    with span('refresh.speculation_wait'):
+                        generated_text, spent = speculation.result()
+                except Exception as e:
+                    log_error("Speculative refresh error", e)
+            pre_generated = generated_text is not None
             
-            # Call the LLM API with higher temperature
-            generated_text = self.call_refresh_llm_api(prompt)
+            if not pre_generated:
+                generated_text, spent = self.generate_refresh(self.current_submission_id, raw_text, context, audience,
+                                                              tone)
             
-            # Log as a new submission
-            self.current_submission_id = self.log_submission(raw_text, context, audience, tone, generated_text, notes)
+            # Log as a new submission; the estimate spent is the prompt plus the completion budget
+            with span('refresh.db'):
+                self.current_submission_id = self.log_submission(raw_text, context, audience, tone, generated_text,
+                                                                 notes, spent - GENERATION_PARAMS["max_tokens"])
             
             # Update UI
-            self.root.after(0, self.update_ui_with_generation, generated_text)
+            self.root.after(0, self.finish_refresh_display, generated_text, started)
+            if pre_generated:
+                self.speculation.record_used()
+                self.root.after(0, self.status_var.set, "Statement regenerated from the pre-generated draft. "
+                                "Please review and accept or regenerate.")
             
         except Exception as e:
-            self.root.after(0, lambda: self.handle_error(f"Error during regeneration: {str(e)}"))
+            self.root.after(0, self.handle_error, f"Error during regeneration: {str(e)}")
             log_error("Process refresh error", e)
 
     def construct_refresh_prompt(self, raw_text, context, audience, tone, accepted_examples, rejected_examples):
-        """Construct a prompt for refreshing with emphasis on diversity"""
+        """Construct the user message for a refresh, which asks for a markedly different draft"""
         try:
-            # Get tone instructions
-            tone_instructions = self.get_tone_instructions(tone)
-            
-            # Format accepted examples
-            accepted_content = ""
-            if accepted_examples:
-                accepted_content = "## EXAMPLES TO EMULATE (these showcase the MP's voice and style):\n\n"
-                for i, (response, topic, resp_tone) in enumerate(accepted_examples, 1):
-                    accepted_content += f"### Example {i} "
-                    if resp_tone and resp_tone != "None":
-                        accepted_content += f"(Tone: {resp_tone})"
-                    accepted_content += f":\n\"{response}\"\n\n"
-            
-            # Format rejected examples
-            rejected_content = ""
-            if rejected_examples and len(rejected_examples) > 0:
-                rejected_content = "## EXAMPLES TO AVOID (especially the first one which was your previous attempt):\n\n"
-                for i, (response, topic, resp_tone) in enumerate(rejected_examples, 1):
-                    label = "Your Previous Attempt" if i == 1 else f"Bad Example {i}"
-                    rejected_content += f"### {label}:\n\"{response}\"\n\n"
-                    
-                    if i == 1:
-                        rejected_content += "Problems with this version:\n"
-                        rejected_content += "- It didn't fully capture the MP's personal voice\n"
-                        rejected_content += "- The local context wasn't sufficiently incorporated\n"
-                        rejected_content += "- It may have used generic political language\n"
-                        rejected_content += "- The tone wasn't quite right for the audience\n\n"
-                    else:
-                        rejected_content += "Problem: This example doesn't effectively represent the MP's voice or connect with constituents.\n\n"
-            
-            # Create the complete prompt with emphasis on diversity
-            prompt = f"""# MP STATEMENT REWRITING TASK (SECOND ATTEMPT)
-
-## OBJECTIVE:
-Transform the government statement below into a personalized communication from the MP. Your previous attempt was not approved, so this version needs to take a SIGNIFICANTLY DIFFERENT APPROACH while still maintaining the MP's authentic voice.
-
-## RAW GOVERNMENT STATEMENT: {raw_text} 
-## LOCAL CONTEXT:
-{context}
-
-## TARGET AUDIENCE:
-{audience}
-
-## REQUIRED TONE: {tone}
-{tone_instructions}
-
-{accepted_content}
-
-{rejected_content}
-
-## TRANSFORMATION REQUIREMENTS:
-
-1. **TAKE A COMPLETELY DIFFERENT APPROACH** from your previous attempt:
-   - Use a different structure and opening
-   - Emphasize different aspects of the information
-   - Find a fresh angle or framing for the message
-   - Avoid repeating phrases, examples, or analogies from the rejected version
-
-2. **Stronger Local Connection**:
-   - More explicitly incorporate the local context provided
-   - Make stronger connections to constituency-specific issues
-   - Add more geographical or community-specific references
-   - Show how national policies directly impact this specific constituency
-
-3. **More Authentic Voice**:
-   - Use more natural, conversational language
-   - Include more personal commitment ("I am committed to..." "I've been working on...")
-   - Avoid political clichés and generic phrases
-   - Make it sound like a real person speaking, not a press release
-
-4. **Better Audience Targeting**:
-   - Address the specific needs and concerns of this audience more directly
-   - Use language, examples, and references that will resonate with them
-   - Adjust complexity and detail level to match audience expectations
-   - Include specific benefits or impacts relevant to this audience
-
-5. **More Compelling Structure**:
-   - Create a stronger opening that immediately engages
-   - Ensure a logical flow with clear transitions
-   - Include a more memorable conclusion with clear next steps
-   - Break up dense information into more digestible parts
-
-## OUTPUT REQUIREMENTS:
-- Produce a complete, polished statement ready for publication
-- Length should be appropriate to the complexity of the topic (typically 150-300 words)
-- Ensure this version is distinctly different from your previous attempt
-- Do not include any explanatory notes, only provide the rewritten statement
-
-## REWRITTEN STATEMENT:"""
-            return prompt
+            return construct_refresh_prompt(raw_text, context, audience, tone, accepted_examples, rejected_examples)
         except Exception as e:
             log_error("Refresh prompt construction error", e)
             raise Exception(f"Failed to construct refresh prompt: {str(e)}")
 
-    def call_refresh_llm_api(self, prompt):
-        """Call the OpenAI API to regenerate statement with feedback"""
+    def call_refresh_llm_api(self, prompt, use_cache=False):
+        """Call the OpenAI API to regenerate statement with feedback (uncached by default, for variety)"""
         try:
-            response = self.openai.ChatCompletion.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are an expert political communications specialist who rewrites statements to sound authentic, engaging, and locally relevant."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=1500
-            )
-            return response.choices[0].message.content.strip()
+            system_prompt = system_message(refresh=True)
+            
+            def create():
+                return run_coroutine(complete_text(self.model, system_prompt, prompt, GENERATION_PARAMS))
+            
+            text, _ = cached_completion(self.model, system_prompt, prompt, GENERATION_PARAMS, create, use_cache)
+            return text
         except Exception as e:
             error_message = f"API call failed: {str(e)}"
             log_error("OpenAI refresh API call error", e)
             raise Exception(error_message)
 
 
-def log_error(error_context, exception):
-    """Log errors to a file with context information"""
-    try:
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        # Format the error message
-        error_message = f"[{timestamp}] ERROR in {error_context}: {str(exception)}\n"
-        error_message += "".join(traceback.format_exception(type(exception), exception, exception.__traceback__))
-        error_message += "\n" + "-"*80 + "\n"
-        
-        # Write to error log file
-        with open("error_log.txt", "a") as log_file:
-            log_file.write(error_message)
-    except:
-        # If we can't even log the error, just print it
-        print(f"ERROR in {error_context}: {str(exception)}")
-        traceback.print_exc()
-
-
 def main():
     """Main function to start the application"""
     # Set up exception handler to catch unhandled exceptions
     def handle_exception(exc_type, exc_value, exc_traceback):
         """Handle uncaught exceptions"""
-        # Log the error
-        error_details = "".join(traceback.format_exception(exc_type, exc_value, exc_traceback))
-        
-        try:
-            # Write to error log
-            with open("error_log.txt", "a") as log_file:
-                log_file.write(f"\n\n--- Unhandled Error {datetime.datetime.now()} ---\n")
-                log_file.write(error_details)
-        except:
-            pass
+        # Log the error (queued; written by the error log's background thread)
+        log_unhandled(exc_type, exc_value, exc_traceback)
         
         # Show error dialog
         messagebox.showerror("Application Error", 
-                           "An unexpected error occurred. Please check error_log.txt for details.\n\n" + 
+                           f"An unexpected error occurred. Please check {LOG_FILE} for details.\n\n" + 
                            str(exc_value))
     
     # Set up exception hook
@@ -2317,13 +2235,28 @@ def main():
         position_down = int(root.winfo_screenheight()/2 - window_height/2)
         root.geometry(f"+{position_right}+{position_down}")
         
+        # Stop background jobs before closing, keeping the event loop running
+        # so jobs that are finishing can still post their UI updates
+        def close_when_idle(deadline):
+            if get_executor().running() and time.monotonic() < deadline:
+                root.after(100, close_when_idle, deadline)
+            else:
+                shutdown_async_backend(timeout=1.0)
+                root.destroy()
+        
+        def shut_down():
+            root.protocol("WM_DELETE_WINDOW", lambda: None)
+            app.status_var.set("Finishing background work...")
+            shutdown_executor(timeout=0)
+            close_when_idle(time.monotonic() + DEFAULT_SHUTDOWN_TIMEOUT)
+        
         # Add window close confirmation if there are unsaved changes
         def on_closing():
             if app.current_submission_id and messagebox.askyesno("Confirm Exit", 
                                                             "You have unsaved changes. Are you sure you want to exit?"):
-                root.destroy()
+                shut_down()
             elif not app.current_submission_id:
-                root.destroy()
+                shut_down()
         
         root.protocol("WM_DELETE_WINDOW", on_closing)
         
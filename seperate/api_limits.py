@@ -0,0 +1,293 @@
+import asyncio
+import email.utils
+import random
+import threading
+import time
+from job_executor import JobCancelled, current_token
+from prompt_budget import count_tokens, record_usage
+from config_manager import get_env_value
+
+# Shared by every caller in the process (UI, refresh, batch). Override with
+# OPENAI_RPM / OPENAI_TPM to match the account's tier; 0 disables a limit.
+DEFAULT_REQUESTS_PER_MINUTE = 500
+DEFAULT_TOKENS_PER_MINUTE = 30000
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+
+# Consecutive provider failures that open the circuit, and how long it stays open
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 30.0
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+RETRYABLE_NAMES = ('RateLimit', 'Timeout', 'APIConnection', 'ServiceUnavailable', 'InternalServer')
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the API while the circuit breaker is open"""
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at a per-minute rate"""
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0 if per_minute else 0.0
+        self.capacity = capacity or per_minute or 0
+        self.level = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        """Add the tokens accrued since the last update"""
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount):
+        """Take amount and return 0 if the bucket holds it, else the seconds until it will"""
+        if not self.rate:
+            return 0
+
+        # Requests bigger than the whole bucket go through once it is full
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill(time.monotonic())
+            if self.level >= amount:
+                self.level -= amount
+                return 0
+            return (amount - self.level) / self.rate
+
+    def acquire(self, amount=1, token=None):
+        """Take amount from the bucket, waiting for it to refill if needed"""
+        token = token or current_token()
+        while True:
+            delay = self.reserve(amount)
+            if not delay:
+                return
+            if token.wait(delay):
+                raise JobCancelled()
+
+    async def acquire_async(self, amount=1):
+        """Take amount from the bucket, sleeping on the event loop until it refills if needed"""
+        while True:
+            delay = self.reserve(amount)
+            if not delay:
+                return
+            await asyncio.sleep(delay)
+
+    def adjust(self, amount):
+        """Give back (positive) or charge (negative) tokens after the real cost is known"""
+        if not self.rate:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            self.level = min(self.capacity, self.level + amount)
+
+class CircuitBreaker:
+    """Fails fast after repeated provider failures, then lets one trial call through"""
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """'closed', 'open' or 'half-open'"""
+        with self._lock:
+            if self.opened_at is None:
+                return 'closed'
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return 'open'
+            return 'half-open'
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go ahead"""
+        with self._lock:
+            if self.opened_at is None:
+                return
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0 or self._trial_in_flight:
+                raise CircuitOpenError(
+                    f"The OpenAI API is failing repeatedly; requests are paused for {max(remaining, 1):.0f}s")
+            self._trial_in_flight = True
+
+    def release_trial(self):
+        """A call ended without an answer or a failure (it was cancelled): let the next call be the trial"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        """The provider answered: close the circuit"""
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        """The provider failed: open the circuit at the threshold, or if the trial call failed"""
+        with self._lock:
+            self.failures += 1
+            if self._trial_in_flight or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+def _status(error):
+    """HTTP status carried by an OpenAI exception (legacy or v1 client), if any"""
+    return getattr(error, 'http_status', None) or getattr(error, 'status_code', None)
+
+def is_retryable(error):
+    """Whether an API error is worth retrying: rate limits, timeouts, connection and server errors"""
+    status = _status(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return any(name in type(error).__name__ for name in RETRYABLE_NAMES)
+
+def retry_after(error):
+    """Seconds the provider asked us to wait, from Retry-After headers, or None"""
+    headers = getattr(error, 'headers', None) or getattr(getattr(error, 'response', None), 'headers', None)
+    if not headers:
+        return None
+    try:
+        value = headers.get('retry-after-ms')
+        if value is not None:
+            return float(value) / 1000.0
+        value = headers.get('retry-after')
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            when = email.utils.parsedate_to_datetime(value)
+            return max(0.0, when.timestamp() - time.time())
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+def backoff_delay(attempt, requested=None):
+    """Full-jitter exponential backoff, never shorter than a provider's Retry-After (up to BACKOFF_CAP)"""
+    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+    if requested is not None:
+        # A malformed or hostile Retry-After must not park the caller indefinitely
+        delay = min(BACKOFF_CAP, requested + random.uniform(0, BACKOFF_BASE))
+    return delay
+
+def estimate_tokens(text, max_tokens):
+    """Token cost of a request: the locally counted prompt plus the completion budget"""
+    return count_tokens(text) + max_tokens
+
+class ApiLimiter:
+    """Rate limits, retries and circuit breaking shared by every API call"""
+
+    def __init__(self, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE,
+                 max_attempts=MAX_ATTEMPTS):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.breaker = CircuitBreaker()
+        self.max_attempts = max_attempts
+        self.retries = 0
+
+    def call(self, request, estimated_tokens=0):
+        """Run request() within the rate limits, retrying transient failures"""
+        token = current_token()
+        for attempt in range(self.max_attempts):
+            self.requests.acquire(1, token)
+            self.tokens.acquire(estimated_tokens, token)
+            self.breaker.before_call()
+            try:
+                result = request()
+            except JobCancelled:
+                self.breaker.release_trial()
+                raise
+            except Exception as e:
+                if token.wait(self._failed(e, attempt)):
+                    raise JobCancelled()
+                continue
+            except BaseException:
+                self.breaker.release_trial()
+                raise
+            return self._succeeded(result, estimated_tokens)
+
+    async def call_async(self, request, estimated_tokens=0):
+        """Await request() within the rate limits, retrying transient failures (event loop version of call)"""
+        for attempt in range(self.max_attempts):
+            await self.requests.acquire_async(1)
+            await self.tokens.acquire_async(estimated_tokens)
+            self.breaker.before_call()
+            try:
+                result = await request()
+            except JobCancelled:
+                self.breaker.release_trial()
+                raise
+            except Exception as e:
+                await asyncio.sleep(self._failed(e, attempt))
+                continue
+            except BaseException:
+                # Cancelled on the event loop (asyncio.CancelledError): a half-open trial must not stay claimed
+                self.breaker.release_trial()
+                raise
+            return self._succeeded(result, estimated_tokens)
+
+    def _failed(self, error, attempt):
+        """Record a failed attempt; re-raises unless it should be retried, else returns the backoff delay"""
+        if not is_retryable(error):
+            # The provider is up; the request itself was rejected
+            self.breaker.record_success()
+            raise error
+        self.breaker.record_failure()
+        if attempt == self.max_attempts - 1:
+            raise error
+        self.retries += 1
+        return backoff_delay(attempt, retry_after(error))
+
+    def _succeeded(self, result, estimated_tokens):
+        """Record a successful attempt and return its result"""
+        self.breaker.record_success()
+
+        # Streams carry their usage in the last chunk, which the caller passes to settle
+        self.settle(estimated_tokens, getattr(result, 'usage', None))
+        return result
+
+    def settle(self, estimated_tokens, usage):
+        """Record a response's usage and charge the token budget what it actually cost"""
+        record_usage(usage)
+        total = getattr(usage, 'total_tokens', None)
+        if total:
+            self.tokens.adjust(estimated_tokens - total)
+
+def _env_limit(name, default):
+    """Numeric limit from the environment or .env, falling back to the default"""
+    try:
+        return float(get_env_value(name, default))
+    except ValueError:
+        return default
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+def get_api_limiter():
+    """Get the process-wide API limiter"""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = ApiLimiter(_env_limit('OPENAI_RPM', DEFAULT_REQUESTS_PER_MINUTE),
+                                      _env_limit('OPENAI_TPM', DEFAULT_TOKENS_PER_MINUTE))
+    return _limiter
+
+def configure_api_limits(requests_per_minute=None, tokens_per_minute=None):
+    """Replace the process-wide limits (None keeps the environment/default value)"""
+    global _limiter
+    with _limiter_lock:
+        _limiter = ApiLimiter(
+            _env_limit('OPENAI_RPM', DEFAULT_REQUESTS_PER_MINUTE) if requests_per_minute is None else requests_per_minute,
+            _env_limit('OPENAI_TPM', DEFAULT_TOKENS_PER_MINUTE) if tokens_per_minute is None else tokens_per_minute)
+    return _limiter
+
+def limited_call(request, prompt_text='', max_tokens=0):
+    """Run an API request through the shared limiter"""
+    return get_api_limiter().call(request, estimate_tokens(prompt_text, max_tokens))
+
+async def limited_call_async(request, prompt_text='', max_tokens=0):
+    """Await an API request (a function returning an awaitable) through the shared limiter"""
+    return await get_api_limiter().call_async(request, estimate_tokens(prompt_text, max_tokens))
@@ -1,10 +1,15 @@
-import configparser
-import os
 import importlib.util
 from error_handler import log_error
-from system_prompt import SYSTEM_PROMPT, REFRESH_SYSTEM_PROMPT
+from config_manager import API_SETTINGS, PLACEHOLDER_API_KEYS, ensure_config_exists, get_config, subscribe_config
+from prompt_templates import system_message
+from response_cache import cached_completion
+from job_executor import JobCancelled
+from async_client import (DEFAULT_MAX_CONNECTIONS, chat_completion, complete_text, configure_async_backend,
+                          run_coroutine, stream_text, submit_coroutine)
 from tkinter import messagebox
-from dotenv import load_dotenv
+
+# Sampling parameters for every completion; part of the response cache key
+GENERATION_PARAMS = {"temperature": 0.7, "max_tokens": 1500}
 
 class ApiManager:
     """Manager for OpenAI API integration"""
@@ -12,6 +17,16 @@ class ApiManager:
     def __init__(self):
         self.initialize_openai()
         
+        # Pick up a new key, model or endpoint as soon as config.ini or .env is saved
+        subscribe_config(self.config_changed)
+    
+    def config_changed(self, changed):
+        """Rebuild the client settings when an API setting has changed"""
+        if changed & API_SETTINGS:
+            success, message = self.initialize_openai()
+            if not success:
+                log_error("OpenAI settings change", Exception(message))
+        
     def initialize_openai(self):
         """Initialize OpenAI API with key from environment variables or config file"""
         try:
@@ -19,45 +34,19 @@ class ApiManager:
             if importlib.util.find_spec("openai") is None:
                 raise ImportError("The openai package is not installed")
             
-            import openai
-            self.openai = openai
+            # The environment and .env take precedence over config.ini
+            config = get_config()
+            api_key = config.get('API', 'OPENAI_API_KEY')
+            model = config.get('API', 'MODEL', 'gpt-4o')
             
-            # First try to load from environment variables
-            load_dotenv()
-            api_key = os.getenv("OPENAI_API_KEY")
-            model = os.getenv("OPENAI_MODEL", "gpt-4o")
+            if not api_key or api_key in PLACEHOLDER_API_KEYS:
+                # Create config.ini with a placeholder to fill in, if there is none yet
+                ensure_config_exists()
+                return False, "Please add your OpenAI API key in a .env file or edit the config.ini file."
             
-            # If not found in env, look for config file
-            if not api_key:
-                config = configparser.ConfigParser()
-                
-                # Check if config file exists, if not create it
-                if not os.path.exists('config.ini'):
-                    config['API'] = {
-                        'OPENAI_API_KEY': 'your_api_key_here',
-                        'MODEL': model
-                    }
-                    with open('config.ini', 'w') as f:
-                        config.write(f)
-                    return False, "Please add your OpenAI API key in a .env file or edit the config.ini file."
-                
-                config.read('config.ini')
-                
-                if 'API' not in config:
-                    config['API'] = {
-                        'OPENAI_API_KEY': 'your_api_key_here',
-                        'MODEL': model
-                    }
-                    with open('config.ini', 'w') as f:
-                        config.write(f)
-                
-                api_key = config['API']['OPENAI_API_KEY']
-                model = config['API'].get('MODEL', 'gpt-4o')
-                
-                if api_key == 'your_api_key_here':
-                    return False, "Please add your OpenAI API key in a .env file or edit the config.ini file."
-            
-            openai.api_key = api_key
+            # Every request shares one client and its pool of keep-alive connections
+            configure_async_backend(api_key, config.get('API', 'BASE_URL'),
+                                    int(config.get('API', 'MAX_CONNECTIONS', DEFAULT_MAX_CONNECTIONS)))
             self.model = model
             return True, "OpenAI API initialized successfully."
         except ImportError as e:
@@ -67,44 +56,74 @@ class ApiManager:
             log_error("OpenAI initialization error", e)
             return False, f"Failed to initialize OpenAI API: {str(e)}"
             
-    def call_llm_api(self, prompt, system_prompt=None):
+    def call_llm_api(self, prompt, system_prompt=None, use_cache=True):
         """Call the OpenAI API to generate statement"""
         try:
             if system_prompt is None:
-                system_prompt = "You are an expert political communications specialist who rewrites official government statements into personalized MP communications that sound authentic, engaging, and locally relevant."
+                system_prompt = system_message()
+            
+            def create():
+                return run_coroutine(complete_text(self.model, system_prompt, prompt, GENERATION_PARAMS))
             
-            response = self.openai.ChatCompletion.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=1500
-            )
-            return True, response.choices[0].message.content.strip()
+            text, _ = cached_completion(self.model, system_prompt, prompt, GENERATION_PARAMS, create, use_cache)
+            return True, text
         except Exception as e:
             error_message = f"API call failed: {str(e)}"
             log_error("OpenAI API call error", e)
             return False, error_message
             
-    def call_refresh_llm_api(self, prompt, system_prompt=None):
-        """Call the OpenAI API to regenerate statement with feedback"""
+    def call_llm_api_variants(self, prompt, count, system_prompt=None):
+        """Call the OpenAI API once for several alternative drafts (n=count); never cached"""
         try:
             if system_prompt is None:
-                system_prompt = "You are an expert political communications specialist who rewrites statements to sound authentic, engaging, and locally relevant."
+                system_prompt = system_message()
             
-            response = self.openai.ChatCompletion.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=1500
-            )
-            return True, response.choices[0].message.content.strip()
+            response = run_coroutine(chat_completion(self.model, system_prompt, prompt, GENERATION_PARAMS, n=count))
+            return True, [choice.message.content.strip() for choice in response.choices]
+        except Exception as e:
+            error_message = f"API call failed: {str(e)}"
+            log_error("OpenAI variants API call error", e)
+            return False, error_message
+    
+    def stream_llm_api(self, prompt, stream, system_prompt=None, use_cache=True):
+        """Call the OpenAI API in streaming mode, pushing token deltas into a TokenStream"""
+        try:
+            if system_prompt is None:
+                system_prompt = system_message()
+            
+            def create():
+                # Cancelling the job (e.g. the app is shutting down) cancels the stream
+                return run_coroutine(stream_text(self.model, system_prompt, prompt, GENERATION_PARAMS, stream.put))
+            
+            text, from_cache = cached_completion(self.model, system_prompt, prompt, GENERATION_PARAMS, create, use_cache)
+            if from_cache:
+                stream.put(text)
+            return True, text
+        except JobCancelled:
+            return False, "Generation cancelled"
+        except Exception as e:
+            error_message = f"API call failed: {str(e)}"
+            log_error("OpenAI streaming API call error", e)
+            return False, error_message
+    
+    def call_refresh_llm_api(self, prompt, system_prompt=None, use_cache=False):
+        """Call the OpenAI API to regenerate statement with feedback (uncached by default, for variety)"""
+        try:
+            if system_prompt is None:
+                system_prompt = system_message(refresh=True)
+            
+            def create():
+                return run_coroutine(complete_text(self.model, system_prompt, prompt, GENERATION_PARAMS))
+            
+            text, _ = cached_completion(self.model, system_prompt, prompt, GENERATION_PARAMS, create, use_cache)
+            return True, text
         except Exception as e:
             error_message = f"API call failed: {str(e)}"
             log_error("OpenAI refresh API call error", e)
-            return False, error_message
\ No newline at end of file
+            return False, error_message
+    
+    def submit_generation(self, prompt, system_prompt=None):
+        """Start a generation on the API event loop and return a future for its text (any thread)"""
+        if system_prompt is None:
+            system_prompt = system_message()
+        return submit_coroutine(complete_text(self.model, system_prompt, prompt, GENERATION_PARAMS))
\ No newline at end of file
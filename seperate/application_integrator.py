@@ -2,9 +2,9 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 import re
 import os
-import threading
-import sqlite3
 import difflib
+from db_writer import run_write
+from job_executor import PRIORITY_INTERACTIVE, submit_job
 
 class EnhancedUI:
     """Class to integrate enhanced UI features into the main application"""
@@ -175,8 +175,13 @@ class EnhancedUI:
             # Show and animate progress bar
             self.animate_progress(self.app.progress, 3.0)
             
-            # Use threading to prevent UI freeze
-            threading.Thread(target=self.app.process_submission, args=(raw_text, context, audience, tone, notes)).start()
+            # Drafts from an earlier multi-draft generation no longer apply
+            self.app.variant_siblings = []
+            self.app.speculation.discard()
+            
+            # Generate on the background pool, ahead of any queued imports
+            submit_job(self.app.process_submission, raw_text, context, audience, tone, notes,
+                       self.app.get_variant_count(), priority=PRIORITY_INTERACTIVE, name="generate")
         
         self.app.submit = enhanced_submit
         
@@ -190,15 +195,9 @@ class EnhancedUI:
             
             try:
                 # Mark current submission as rejected
-                conn = sqlite3.connect('mp_rewriter.db')
-                cursor = conn.cursor()
-                
-                cursor.execute("""
-                UPDATE submissions SET status = 'rejected' WHERE id = ?
-                """, (self.app.current_submission_id,))
-                
-                conn.commit()
-                conn.close()
+                run_write(lambda conn: conn.execute("""
+                    UPDATE submissions SET status = 'rejected' WHERE id = ?
+                    """, (self.app.current_submission_id,)))
                 
                 # Get original inputs for regeneration
                 raw_text = self.app.raw_statement.get("1.0", tk.END).strip()
@@ -207,6 +206,9 @@ class EnhancedUI:
                 tone = self.app.tone_var.get()
                 notes = self.app.notes.get().strip()
                 
+                # A draft pre-generated for these same inputs is shown instead of a new request
+                speculation = self.app.speculation.claim(self.app.refresh_key(raw_text, context, audience, tone))
+                
                 # Update status
                 self.app.status_var.set("Regenerating statement with new approach...")
                 
@@ -220,7 +222,8 @@ class EnhancedUI:
                 self.app.copy_button.config(state=tk.DISABLED)
                 
                 # Regenerate with slightly higher temperature for diversity
-                threading.Thread(target=self.app.process_refresh, args=(raw_text, context, audience, tone, notes)).start()
+                submit_job(self.app.process_refresh, raw_text, context, audience, tone, notes, speculation,
+                           priority=PRIORITY_INTERACTIVE, name="refresh")
                 
             except Exception as e:
                 messagebox.showerror("Database Error", f"Failed to refresh statement: {str(e)}")
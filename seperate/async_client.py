@@ -0,0 +1,205 @@
+import asyncio
+import concurrent.futures
+import threading
+from error_handler import log_error
+from job_executor import JobCancelled, current_token
+from api_limits import estimate_tokens, get_api_limiter, limited_call_async
+from token_stream import chunk_text
+
+# HTTP connections kept open to the API, shared by every request in the process; override
+# with MAX_CONNECTIONS in the [API] section of config.ini
+DEFAULT_MAX_CONNECTIONS = 10
+
+# Seconds an idle connection is kept for reuse before it is closed
+KEEPALIVE_EXPIRY = 60.0
+
+# Seconds to wait for a response before the request fails (and may be retried)
+REQUEST_TIMEOUT = 120.0
+CONNECT_TIMEOUT = 10.0
+
+# How often a job thread waiting on the event loop checks for cancellation
+CANCEL_POLL_INTERVAL = 0.1
+
+# How long closing waits for the client's connections to shut down
+CLOSE_TIMEOUT = 5.0
+
+class AsyncBackend:
+    """One long-lived AsyncOpenAI client on an event loop running in a background thread
+
+    Every request in the process goes through the client's connection pool,
+    so concurrent generations reuse a few keep-alive connections instead of
+    each opening (and TLS-handshaking) its own. Callers on other threads
+    submit coroutines and get concurrent.futures.Future objects back.
+    """
+    
+    def __init__(self):
+        self.loop = None
+        self._thread = None
+        self._client = None
+        self._settings = None
+        self._client_settings = None
+        self._lock = threading.Lock()
+    
+    def configure(self, api_key, base_url=None, max_connections=DEFAULT_MAX_CONNECTIONS):
+        """Set the client's credentials and pool size; a changed setting replaces the client on next use"""
+        with self._lock:
+            self._settings = (api_key, base_url, max(1, int(max_connections)))
+    
+    def _start(self):
+        """Start the event loop thread, once"""
+        with self._lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self.loop.run_forever, name="openai-event-loop", daemon=True)
+                self._thread.start()
+            return self.loop
+    
+    async def client(self):
+        """The shared AsyncOpenAI client, created on first use (event loop only)"""
+        with self._lock:
+            settings = self._settings
+        if settings is None:
+            raise RuntimeError("The OpenAI API has not been initialized")
+        
+        if self._client is None or settings != self._client_settings:
+            import httpx
+            import openai
+            
+            api_key, base_url, max_connections = settings
+            old_client, self._client_settings = self._client, settings
+            
+            # The limiter does the retrying, so the client's own retries are turned off
+            self._client = openai.AsyncOpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                max_retries=0,
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections,
+                                        keepalive_expiry=KEEPALIVE_EXPIRY),
+                    timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT)))
+            if old_client is not None:
+                # Requests already using the old client finish on it before it closes
+                asyncio.get_running_loop().call_later(REQUEST_TIMEOUT, lambda: asyncio.ensure_future(old_client.close()))
+        return self._client
+    
+    def submit(self, coroutine):
+        """Schedule a coroutine on the event loop; returns a concurrent.futures.Future (any thread)"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._start())
+    
+    def run(self, coroutine):
+        """Run a coroutine on the event loop and wait for its result (job threads)
+
+        Cancelling the calling job cancels the coroutine and raises JobCancelled.
+        """
+        future = self.submit(coroutine)
+        token = current_token()
+        while True:
+            try:
+                return future.result(timeout=CANCEL_POLL_INTERVAL)
+            except concurrent.futures.TimeoutError:
+                if token.cancelled:
+                    future.cancel()
+                    raise JobCancelled()
+            except concurrent.futures.CancelledError:
+                raise JobCancelled()
+    
+    def close(self, timeout=CLOSE_TIMEOUT):
+        """Close the client's connections and stop the event loop"""
+        with self._lock:
+            loop, self.loop = self.loop, None
+        if loop is None:
+            return
+        
+        try:
+            if self._client is not None:
+                asyncio.run_coroutine_threadsafe(self._client.close(), loop).result(timeout)
+        except Exception as e:
+            log_error("OpenAI client close error", e)
+        finally:
+            self._client = None
+            loop.call_soon_threadsafe(loop.stop)
+            self._thread.join(timeout)
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_async_backend():
+    """Get the process-wide async API backend"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = AsyncBackend()
+    return _backend
+
+def configure_async_backend(api_key, base_url=None, max_connections=DEFAULT_MAX_CONNECTIONS):
+    """Set the API key, endpoint and pool size used by every request"""
+    get_async_backend().configure(api_key, base_url, max_connections)
+
+def submit_coroutine(coroutine):
+    """Schedule a coroutine on the API event loop and return its future"""
+    return get_async_backend().submit(coroutine)
+
+def run_coroutine(coroutine):
+    """Run a coroutine on the API event loop from a job thread and return its result"""
+    return get_async_backend().run(coroutine)
+
+def shutdown_async_backend(timeout=CLOSE_TIMEOUT):
+    """Close the shared client and stop its event loop"""
+    global _backend
+    with _backend_lock:
+        backend, _backend = _backend, None
+    if backend is not None:
+        backend.close(timeout)
+
+def _messages(system_prompt, prompt):
+    """Chat messages for one system and one user message"""
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": prompt}
+    ]
+
+async def chat_completion(model, system_prompt, prompt, params, n=1):
+    """Request a chat completion with n choices through the shared limiter"""
+    client = await get_async_backend().client()
+    extra = {"n": n} if n > 1 else {}
+    return await limited_call_async(lambda: client.chat.completions.create(
+        model=model,
+        messages=_messages(system_prompt, prompt),
+        **extra,
+        **params
+    ), system_prompt + prompt, params["max_tokens"] * n)
+
+async def complete_text(model, system_prompt, prompt, params):
+    """Text of a single chat completion"""
+    response = await chat_completion(model, system_prompt, prompt, params)
+    return response.choices[0].message.content.strip()
+
+async def stream_text(model, system_prompt, prompt, params, on_delta):
+    """Stream a chat completion, calling on_delta(text) for each delta; returns the full text"""
+    client = await get_async_backend().client()
+    limiter = get_api_limiter()
+    estimated = estimate_tokens(system_prompt + prompt, params["max_tokens"])
+    response = await limiter.call_async(lambda: client.chat.completions.create(
+        model=model,
+        messages=_messages(system_prompt, prompt),
+        stream=True,
+        stream_options={"include_usage": True},
+        **params
+    ), estimated)
+    
+    parts = []
+    try:
+        async for chunk in response:
+            # The last chunk carries the request's token usage and no text; settle the reservation with it
+            usage = getattr(chunk, 'usage', None)
+            if usage is not None:
+                limiter.settle(estimated, usage)
+            delta = chunk_text(chunk)
+            if delta:
+                parts.append(delta)
+                on_delta(delta)
+    finally:
+        # Release the connection back to the pool, also when the stream is cancelled
+        await response.close()
+    return "".join(parts).strip()
@@ -0,0 +1,239 @@
+"""
+Headless batch rewriting: python -m batch_rewrite statements.csv rewritten.jsonl
+
+Each input row (CSV with a header, or JSON Lines) holds a raw statement plus
+optional context, audience, tone and notes. Rows are rewritten concurrently
+with the same prompts, examples and model settings as the desktop app, logged
+as submissions, and appended to the output file as they complete. Re-running
+with the same output file skips rows that already succeeded.
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import as_completed
+from error_handler import log_error
+from database_manager import insert_submission
+from db_writer import run_write
+from schema import migrate
+from example_retriever import retrieve_examples
+from prompt_templates import construct_prompt, get_templates, system_message
+from api_manager import GENERATION_PARAMS, ApiManager
+from job_executor import JobExecutor
+from api_limits import configure_api_limits
+from async_client import shutdown_async_backend
+from prompt_budget import DEFAULT_PROMPT_TOKEN_BUDGET, fit_prompt, prompt_token_budget
+from config_manager import get_config_value
+
+DEFAULT_WORKERS = 4
+
+# Accepted input column names for each field, first match wins
+FIELD_ALIASES = {
+    'raw_text': ['raw_text', 'text', 'statement', 'original_text', 'content'],
+    'context': ['context'],
+    'audience': ['audience', 'target_audience'],
+    'tone': ['tone'],
+    'notes': ['notes']
+}
+
+class BatchRowError(Exception):
+    """A row that could not be rewritten"""
+
+def _field(record, name):
+    """Value of a field from a row dict, trying each accepted column name"""
+    for alias in FIELD_ALIASES[name]:
+        value = record.get(alias)
+        if value is not None and str(value).strip():
+            return str(value).strip()
+    return ''
+
+def read_rows(path):
+    """Yield (row_number, fields) from a CSV or JSON Lines file"""
+    if path.lower().endswith(('.jsonl', '.ndjson')):
+        with open(path, 'r', encoding='utf-8') as file:
+            for row_number, line in enumerate(file, 1):
+                if line.strip():
+                    record = {key.lower(): value for key, value in json.loads(line).items()}
+                    yield row_number, {name: _field(record, name) for name in FIELD_ALIASES}
+    else:
+        with open(path, 'r', encoding='utf-8', newline='') as file:
+            for row_number, record in enumerate(csv.DictReader(file), 1):
+                record = {(key or '').lower().strip(): value for key, value in record.items()}
+                yield row_number, {name: _field(record, name) for name in FIELD_ALIASES}
+
+def row_key(row_number, fields):
+    """Identity of an input row; changes if the row is edited between runs"""
+    digest = hashlib.sha1(json.dumps(fields, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    return f"{row_number}:{digest}"
+
+def completed_keys(output_path):
+    """Keys of rows already rewritten successfully in an earlier run"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                # A run that crashed mid-write can leave a partial last line
+                continue
+            if result.get('status') == 'ok':
+                done.add(result.get('key'))
+    return done
+
+class ResultWriter:
+    """Appends one JSON line per finished row, flushed so a crash loses nothing written"""
+    
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        
+        # Start on a fresh line if the previous run stopped mid-line
+        partial = False
+        if os.path.exists(path) and os.path.getsize(path):
+            with open(path, 'rb') as existing:
+                existing.seek(-1, os.SEEK_END)
+                partial = existing.read(1) != b'\n'
+        
+        self._file = open(path, 'a', encoding='utf-8')
+        if partial:
+            self._file.write('\n')
+    
+    def write(self, result):
+        """Append a result record"""
+        with self._lock:
+            self._file.write(json.dumps(result, ensure_ascii=False) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+    
+    def close(self):
+        """Close the output file"""
+        self._file.close()
+
+def rewrite_row(api_manager, fields, budget):
+    """Rewrite one statement and log it; returns (submission_id, generated_text, prompt_tokens)"""
+    # Retrieve the past statements most similar to this one
+    accepted_responses, rejected_responses = retrieve_examples(fields['raw_text'], fields['context'],
+                                                               fields['audience'], fields['tone'],
+                                                               accepted_limit=3, rejected_limit=2)
+    prompt, prompt_tokens = fit_prompt(
+        lambda accepted, rejected: construct_prompt(fields['raw_text'], fields['context'], fields['audience'],
+                                                    fields['tone'], accepted, rejected),
+        accepted_responses, rejected_responses, system_message(), budget)
+    
+    success, generated_text = api_manager.call_llm_api(prompt)
+    if not success:
+        raise BatchRowError(generated_text)
+    
+    # Written directly rather than through log_submission, whose error dialog needs a display
+    try:
+        submission_id = run_write(insert_submission, fields['raw_text'], fields['context'], fields['audience'],
+                                  fields['tone'], generated_text, fields['notes'] or None, prompt_tokens)
+    except Exception as e:
+        log_error("Batch log submission error", e)
+        raise BatchRowError(f"Failed to log submission: {str(e)}")
+    return submission_id, generated_text, prompt_tokens
+
+def run_batch(input_path, output_path, workers=DEFAULT_WORKERS, requests_per_minute=None, tokens_per_minute=None,
+              token_budget=None):
+    """Rewrite every pending row of input_path into output_path; returns (succeeded, failed, skipped)"""
+    # Every call in this process shares the API rate limits
+    if requests_per_minute is not None or tokens_per_minute is not None:
+        configure_api_limits(requests_per_minute, tokens_per_minute)
+    
+    api_manager = ApiManager()
+    success, message = api_manager.initialize_openai()
+    if not success:
+        raise BatchRowError(message)
+    try:
+        run_write(migrate)
+    except Exception as e:
+        log_error("Batch database initialization error", e)
+        raise BatchRowError(f"Failed to initialize database: {str(e)}")
+    
+    # Prompt size per request, as in the app: [PROMPT] TOKEN_BUDGET unless given on the command line
+    if token_budget is None:
+        token_budget = int(get_config_value('PROMPT', 'TOKEN_BUDGET', DEFAULT_PROMPT_TOKEN_BUDGET))
+    budget = prompt_token_budget(api_manager.model, GENERATION_PARAMS["max_tokens"], token_budget)
+    
+    done = completed_keys(output_path)
+    rows = []
+    skipped = 0
+    for row_number, fields in read_rows(input_path):
+        key = row_key(row_number, fields)
+        if key in done:
+            skipped += 1
+        elif not fields['raw_text']:
+            print(f"Row {row_number}: no statement text, skipped", file=sys.stderr)
+            skipped += 1
+        else:
+            if fields['tone'] and fields['tone'] not in get_templates().tone_instructions:
+                print(f"Row {row_number}: unknown tone '{fields['tone']}', using the default tone",
+                      file=sys.stderr)
+            rows.append((row_number, key, fields))
+    
+    print(f"{len(rows)} rows to rewrite, {skipped} skipped", file=sys.stderr)
+    
+    executor = JobExecutor(max_workers=workers)
+    writer = ResultWriter(output_path)
+    succeeded = failed = 0
+    try:
+        jobs = {}
+        for row_number, key, fields in rows:
+            job = executor.submit(rewrite_row, api_manager, fields, budget, name=f"row {row_number}")
+            jobs[job.future] = (row_number, key, fields, time.monotonic())
+        
+        # Results are written in completion order, not input order
+        for future in as_completed(jobs):
+            row_number, key, fields, started = jobs[future]
+            result = {'key': key, 'row': row_number, **fields}
+            try:
+                submission_id, generated_text, prompt_tokens = future.result()
+                result.update(status='ok', submission_id=submission_id, generated_text=generated_text,
+                              prompt_tokens=prompt_tokens)
+                succeeded += 1
+            except Exception as e:
+                result.update(status='error', error=str(e))
+                failed += 1
+            writer.write(result)
+            print(f"[{succeeded + failed}/{len(rows)}] row {row_number}: {result['status']} "
+                  f"({time.monotonic() - started:.1f}s)", file=sys.stderr)
+    finally:
+        executor.shutdown()
+        shutdown_async_backend()
+        writer.close()
+    
+    return succeeded, failed, skipped
+
+def main():
+    """Rewrite a file of statements from the command line"""
+    parser = argparse.ArgumentParser(description="Rewrite a CSV or JSONL file of government statements")
+    parser.add_argument('input', help="CSV (with header) or .jsonl file of statements")
+    parser.add_argument('output', help="JSONL file results are appended to; re-use it to resume")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="concurrent API calls")
+    parser.add_argument('--rpm', type=float, help="API requests per minute (default OPENAI_RPM or 500; 0 for no limit)")
+    parser.add_argument('--tpm', type=float, help="API tokens per minute (default OPENAI_TPM or 30000; 0 for no limit)")
+    parser.add_argument('--token-budget', type=int,
+                        help="prompt tokens per request (default [PROMPT] TOKEN_BUDGET in config.ini, or 6000)")
+    args = parser.parse_args()
+    
+    try:
+        succeeded, failed, skipped = run_batch(args.input, args.output, max(1, args.workers), args.rpm, args.tpm,
+                                               args.token_budget)
+    except KeyboardInterrupt:
+        print("Interrupted; run the same command again to resume", file=sys.stderr)
+        sys.exit(130)
+    except Exception as e:
+        log_error("Batch rewrite error", e)
+        print(f"Batch rewrite failed: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+    
+    print(f"Done: {succeeded} rewritten, {failed} failed, {skipped} skipped", file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,707 @@
+import argparse
+import csv
+import datetime
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from db_pool import ConnectionPool, configure_connection, configure_pool, get_connection
+from db_writer import DatabaseWriter, close_writer, run_write
+from search_index import create_search_index, build_match_query
+from example_sampler import create_sampler_tables, sample_library, sample_submissions
+from example_retriever import ExampleRetriever, create_change_log, retrieve_examples, warm_up
+from schema import HOT_QUERIES, PAST_RESPONSES_DDL, SUBMISSIONS_DDL, check_query_plans, explain, migrate
+from statement_import import INSERT_SQL, import_statements
+from dedupe import content_hash
+from near_duplicates import find_near_duplicates, sync_index
+from system_prompt import GENERATION_INSTRUCTIONS, SYSTEM_PROMPT, TONE_INSTRUCTIONS
+from prompt_templates import construct_prompt, get_templates, get_tone_instructions, system_message
+from prompt_budget import count_tokens, fit_prompt, prompt_token_budget
+from database_manager import insert_submission
+from api_manager import GENERATION_PARAMS, ApiManager
+from api_limits import configure_api_limits, get_api_limiter
+from async_client import shutdown_async_backend
+from job_executor import JobExecutor
+from token_stream import TokenStream
+from fake_llm_server import FakeLLMProcess
+from metrics import latency_summary
+
+def create_bench_database(directory):
+    """Create an empty database with the application schema"""
+    db_path = os.path.join(directory, 'bench.db')
+    conn = sqlite3.connect(db_path)
+    conn.execute(SUBMISSIONS_DDL)
+    conn.execute(PAST_RESPONSES_DDL)
+    conn.commit()
+    conn.close()
+    return db_path
+
+def accept_cycle(conn):
+    """The statements run by one accept: log, mark accepted, read back, save to library"""
+    cursor = conn.cursor()
+    cursor.execute("""
+    INSERT INTO submissions (original_text, context, target_audience, tone, generated_text, status)
+    VALUES (?, ?, ?, ?, ?, ?)
+    """, ("Raw statement", "Local context", "Local residents", "Neutral/Balanced", "Generated statement", "pending"))
+    submission_id = cursor.lastrowid
+    cursor.execute("UPDATE submissions SET status = 'accepted' WHERE id = ?", (submission_id,))
+    cursor.execute("SELECT generated_text, target_audience, tone, context FROM submissions WHERE id = ?", (submission_id,))
+    generated_text, audience, tone, context = cursor.fetchone()
+    cursor.execute("""
+    INSERT INTO past_responses (published_text, topic, tone, source)
+    VALUES (?, ?, ?, ?)
+    """, (generated_text, context or audience, tone, f"Generated from submission #{submission_id}"))
+
+def run_threads(worker, threads, operations):
+    """Run worker(operations_per_thread) on several threads and return ops/sec"""
+    per_thread = max(1, operations // threads)
+    workers = [threading.Thread(target=worker, args=(per_thread,)) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return (per_thread * threads) / elapsed
+
+def bench_pool(args):
+    """Compare connect-per-call against the shared connection pool"""
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = create_bench_database(directory)
+
+        def connect_per_call(count):
+            # Mirrors the old code: one open/close per statement group
+            for _ in range(count):
+                for step in range(4):
+                    conn = sqlite3.connect(db_path, timeout=30)
+                    if step == 0:
+                        accept_cycle(conn)
+                    else:
+                        conn.execute("SELECT 1").fetchone()
+                    conn.commit()
+                    conn.close()
+
+        pool = ConnectionPool(db_path, size=args.pool_size)
+
+        def pooled(count):
+            for _ in range(count):
+                for step in range(4):
+                    with pool.connection() as conn:
+                        if step == 0:
+                            accept_cycle(conn)
+                        else:
+                            conn.execute("SELECT 1").fetchone()
+
+        before = run_threads(connect_per_call, args.threads, args.operations)
+        after = run_threads(pooled, args.threads, args.operations)
+        pool.close()
+
+    print(f"Accept cycles ({args.threads} threads, {args.operations} cycles, 4 connection checkouts each)")
+    print(f"  connect-per-call: {before:10.1f} ops/sec")
+    print(f"  connection pool:  {after:10.1f} ops/sec")
+    print(f"  speedup:          {after / before:10.2f}x")
+
+def bench_writer(args):
+    """Compare a commit per accept cycle against the group-committing writer thread"""
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = create_bench_database(directory)
+        pool = ConnectionPool(db_path, size=args.threads)
+
+        def commit_per_call(count):
+            for _ in range(count):
+                with pool.connection() as conn:
+                    accept_cycle(conn)
+
+        writer = DatabaseWriter(db_path)
+
+        def group_commit(count):
+            for _ in range(count):
+                writer.execute(accept_cycle)
+
+        before = run_threads(commit_per_call, args.threads, args.operations)
+        after = run_threads(group_commit, args.threads, args.operations)
+        commits = writer.commits
+        writer.close()
+        pool.close()
+
+    print(f"Accept cycles ({args.threads} threads, {args.operations} cycles)")
+    print(f"  commit per call:  {before:10.1f} ops/sec")
+    print(f"  writer thread:    {after:10.1f} ops/sec ({commits} commits)")
+    print(f"  speedup:          {after / before:10.2f}x")
+
+SEARCH_VOCABULARY = ("constituency residents funding schools hospital council housing transport "
+                     "bypass bridge repairs police safety community centre minister policy budget "
+                     "families businesses high street investment teachers parents libraries parks "
+                     "flooding energy bills pensions jobs apprenticeships broadband rural town").split()
+
+def zipf_vocabulary(size=20000, exponent=1.1):
+    """Word list with Zipf cumulative weights; the real words are spread through the ranks"""
+    words = [f"w{rank}" for rank in range(size)]
+    for i, word in enumerate(SEARCH_VOCABULARY):
+        words[(i + 1) * 12] = word
+    cumulative = []
+    total = 0.0
+    for rank in range(1, size + 1):
+        total += 1.0 / rank ** exponent
+        cumulative.append(total)
+    return words, cumulative
+
+def synthetic_statements(count, words=60, seed=42):
+    """Yield past_responses rows of random text with a natural word-frequency spread"""
+    rng = random.Random(seed)
+    vocabulary, cumulative = zipf_vocabulary()
+    for _ in range(count):
+        text = ' '.join(rng.choices(vocabulary, cum_weights=cumulative, k=words))
+        yield (text, rng.choice(SEARCH_VOCABULARY).title(), "Neutral/Balanced")
+
+def time_call(fn, repeats):
+    """Average wall time in ms of calling fn"""
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) * 1000 / repeats
+
+def time_query(conn, sql, params, repeats):
+    """Average wall time in ms of fetching a query's results"""
+    return time_call(lambda: conn.execute(sql, params).fetchall(), repeats)
+
+def bench_search(args):
+    """Compare LIKE scans against the FTS5 index at several library sizes"""
+    like_sql = """
+    SELECT id, timestamp, topic, tone, published_text FROM past_responses
+    WHERE published_text LIKE ? OR topic LIKE ? OR tone LIKE ?
+    ORDER BY timestamp DESC
+    """
+    fts_sql = """
+    SELECT p.id, p.timestamp, p.topic, p.tone, p.published_text,
+           snippet(past_responses_fts, -1, '[', ']', '...', 8)
+    FROM past_responses_fts JOIN past_responses p ON p.id = past_responses_fts.rowid
+    WHERE past_responses_fts MATCH ?
+    ORDER BY bm25(past_responses_fts, 10.0, 2.0, 1.0)
+    LIMIT 200
+    """
+
+    print(f"{'rows':>10} {'term':>12} {'LIKE ms':>10} {'FTS5 ms':>10} {'speedup':>9}")
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as directory:
+            conn = configure_connection(sqlite3.connect(create_bench_database(directory)))
+            conn.executemany("INSERT INTO past_responses (published_text, topic, tone) VALUES (?, ?, ?)",
+                             synthetic_statements(rows))
+            conn.commit()
+
+            start = time.perf_counter()
+            create_search_index(conn)
+            conn.commit()
+            build_seconds = time.perf_counter() - start
+
+            for term in args.terms:
+                like = time_query(conn, like_sql, (f'%{term}%',) * 3, args.repeats)
+                fts = time_query(conn, fts_sql, (build_match_query(term),), args.repeats)
+                print(f"{rows:>10} {term:>12} {like:>10.2f} {fts:>10.2f} {like / fts:>8.1f}x")
+            print(f"{rows:>10} {'(index build)':>12} {build_seconds * 1000:>21.0f} ms")
+            conn.close()
+
+def bench_sampler(args):
+    """Compare ORDER BY RANDOM() against slot sampling for prompt examples"""
+    statuses = ['pending', 'accepted', 'rejected']
+
+    print(f"{'rows':>10} {'examples':>10} {'RANDOM() ms':>12} {'sampler ms':>11} {'speedup':>9}")
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as directory:
+            conn = configure_connection(sqlite3.connect(create_bench_database(directory)))
+            create_sampler_tables(conn)
+            conn.executemany("INSERT INTO past_responses (published_text, topic, tone) VALUES (?, ?, ?)",
+                             synthetic_statements(rows, words=20))
+            conn.executemany("""
+            INSERT INTO submissions (original_text, target_audience, tone, generated_text, status)
+            VALUES (?, ?, ?, ?, ?)
+            """, ((text, topic, tone, text, statuses[i % 3])
+                  for i, (text, topic, tone) in enumerate(synthetic_statements(rows, words=20, seed=7))))
+            conn.commit()
+
+            cases = [
+                ("library", lambda: conn.execute(
+                    "SELECT published_text, topic, tone FROM past_responses ORDER BY RANDOM() LIMIT 3").fetchall(),
+                 lambda: sample_library(conn, 3)),
+                ("rejected", lambda: conn.execute(
+                    "SELECT generated_text, target_audience, tone FROM submissions WHERE status = 'rejected' ORDER BY RANDOM() LIMIT 2").fetchall(),
+                 lambda: sample_submissions(conn, 'rejected', 2))
+            ]
+            for name, before_fn, after_fn in cases:
+                before = time_call(before_fn, args.repeats)
+                after = time_call(after_fn, args.repeats)
+                print(f"{rows:>10} {name:>10} {before:>12.3f} {after:>11.3f} {before / after:>8.0f}x")
+            conn.close()
+
+def bench_retrieval(args):
+    """Time building the example index and ranking examples for new statements"""
+    with tempfile.TemporaryDirectory() as directory:
+        conn = configure_connection(sqlite3.connect(create_bench_database(directory)))
+        create_sampler_tables(conn)
+        create_change_log(conn)
+        conn.executemany("INSERT INTO past_responses (published_text, topic, tone) VALUES (?, ?, ?)",
+                         synthetic_statements(args.rows))
+        conn.executemany("""
+        INSERT INTO submissions (original_text, target_audience, tone, generated_text, status)
+        VALUES (?, ?, ?, ?, 'rejected')
+        """, ((text, topic, tone, text) for text, topic, tone in synthetic_statements(args.rows // 10, seed=7)))
+        conn.commit()
+
+        retriever = ExampleRetriever()
+        start = time.perf_counter()
+        retriever.refresh(conn)
+        build_seconds = time.perf_counter() - start
+
+        timings = []
+        queries = synthetic_statements(args.queries, words=args.query_words, seed=99)
+        for text, topic, tone in queries:
+            start = time.perf_counter()
+            retriever.retrieve(conn, text, topic, "Local residents", tone)
+            timings.append((time.perf_counter() - start) * 1000)
+        conn.close()
+
+    timings.sort()
+    print(f"Example retrieval ({args.rows} library statements, {args.rows // 10} rejected, {args.query_words}-word queries)")
+    print(f"  index build:  {build_seconds:8.2f} s")
+    print(f"  query p50:    {timings[len(timings) // 2]:8.2f} ms")
+    print(f"  query p95:    {timings[int(len(timings) * 0.95)]:8.2f} ms")
+    print(f"  query max:    {timings[-1]:8.2f} ms")
+
+def create_plans_database(path, rows):
+    """Migrated database of rows library statements and submissions, analysed, for query plan checks"""
+    statuses = ['pending', 'accepted', 'rejected']
+    conn = configure_connection(sqlite3.connect(path))
+    migrate(conn)
+    conn.executemany("INSERT INTO past_responses (published_text, topic, tone, content_hash) VALUES (?, ?, ?, ?)",
+                     ((text, topic, tone, content_hash(text))
+                      for text, topic, tone in synthetic_statements(rows, words=20)))
+    conn.executemany("""
+    INSERT INTO submissions (original_text, target_audience, tone, generated_text, status, timestamp)
+    VALUES (?, ?, ?, ?, ?, datetime('2024-01-01', ? || ' minutes'))
+    """, ((text, topic, tone, text, statuses[i % 3], i)
+          for i, (text, topic, tone) in enumerate(synthetic_statements(rows, words=20, seed=7))))
+    conn.execute("UPDATE past_responses SET timestamp = datetime('2024-01-01', id || ' minutes')")
+
+    # A few rows without a timestamp, as left by some imports
+    conn.execute("UPDATE submissions SET timestamp = NULL WHERE id % 100 = 0")
+    conn.execute("ANALYZE")
+    conn.commit()
+    return conn
+
+def bench_plans(args):
+    """Check that every hot query uses its index on a migrated database; exits 1 if one does not"""
+    with tempfile.TemporaryDirectory() as directory:
+        conn = create_plans_database(os.path.join(directory, 'plans.db'), args.rows)
+        failures = dict(check_query_plans(conn))
+        for name, sql, params, expected in HOT_QUERIES:
+            print(f"{'FAIL' if name in failures else 'ok':>4}  {name}: {explain(conn, sql, params)}")
+        conn.close()
+
+    if failures:
+        print(f"{len(failures)} of {len(HOT_QUERIES)} hot queries lost their index")
+        sys.exit(1)
+
+def bench_import(args):
+    """Time the streaming CSV import into a migrated database, optionally against row-by-row inserts"""
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, 'statements.csv')
+        with open(csv_path, 'w', encoding='utf-8', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['Statement', 'Topic', 'Tone', 'Date'])
+            for i, (text, topic, tone) in enumerate(synthetic_statements(args.rows, words=args.words)):
+                writer.writerow([text, topic, tone, f"2024-01-{i % 28 + 1:02d} 09:00:00"])
+
+        cases = [("streaming", lambda: import_statements(csv_path, args.chunk_size))]
+        if args.baseline:
+            cases.insert(0, ("row by row", lambda: import_row_by_row(csv_path)))
+
+        print(f"Import of {args.rows} rows ({args.words} words each, "
+              f"{os.path.getsize(csv_path) / 1e6:.0f} MB), chunks of {args.chunk_size}")
+        for name, run in cases:
+            configure_pool(os.path.join(directory, f"{name.replace(' ', '_')}.db"))
+            run_write(migrate)
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+            close_writer()
+            print(f"  {name:>12}: {elapsed:8.1f} s  {args.rows / elapsed:10.0f} rows/s")
+
+def import_row_by_row(csv_path):
+    """The old import: every row read into memory, then one execute per row"""
+    with open(csv_path, 'r', encoding='utf-8') as file:
+        reader = csv.reader(file)
+        next(reader)
+        rows = list(reader)
+
+    def insert_rows(conn, chunk):
+        for text, topic, tone, timestamp in chunk:
+            conn.execute(INSERT_SQL, (text, topic, tone, timestamp, "Imported", None, None))
+
+    for start in range(0, len(rows), 500):
+        run_write(insert_rows, rows[start:start + 500])
+
+def lightly_edited(text, rng, edits=2):
+    """A copy of a statement with a few words replaced"""
+    words = text.split()
+    for _ in range(edits):
+        words[rng.randrange(len(words))] = rng.choice(SEARCH_VOCABULARY)
+    return ' '.join(words)
+
+def bench_near_duplicates(args):
+    """Time near-duplicate lookups against the LSH index at several library sizes"""
+    rng = random.Random(7)
+    print(f"{'rows':>10} {'index s':>9} {'p50 ms':>8} {'p95 ms':>8} {'found':>7}")
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as directory:
+            configure_pool(os.path.join(directory, 'near.db'))
+            run_write(migrate)
+            library = list(synthetic_statements(rows, words=args.words))
+            run_write(lambda conn: conn.executemany(
+                "INSERT INTO past_responses (published_text, topic, tone) VALUES (?, ?, ?)", library))
+
+            start = time.perf_counter()
+            sync_index()
+            index_seconds = time.perf_counter() - start
+
+            # Look up lightly edited copies of random library statements
+            timings = []
+            found = 0
+            with get_connection() as conn:
+                for _ in range(args.queries):
+                    row_id = rng.randrange(rows) + 1
+                    start = time.perf_counter()
+                    matches = find_near_duplicates(conn, lightly_edited(library[row_id - 1][0], rng))
+                    timings.append((time.perf_counter() - start) * 1000)
+                    found += any(match_id == row_id for _, _, match_id in matches)
+            close_writer()
+
+            timings.sort()
+            print(f"{rows:>10} {index_seconds:>9.1f} {timings[len(timings) // 2]:>8.2f} "
+                  f"{timings[int(len(timings) * 0.95)]:>8.2f} {found / args.queries:>6.0%}")
+
+# Provider prompt caching: prefixes of at least 1024 tokens, matched in 128-token steps
+CACHE_MIN_PREFIX = 1024
+CACHE_INCREMENT = 128
+
+def statement_first_layout(raw_text, context, audience, tone, accepted, rejected):
+    """(system, user) in the earlier layout: the statement first, then this tone's instructions,
+    the examples and the static instructions last"""
+    user = construct_prompt(raw_text, context, audience, tone, accepted, rejected)
+    head, request = user.split("## RAW GOVERNMENT STATEMENT:", 1)
+    head = head.replace(get_templates().tone_section(tone), f"## REQUIRED TONE: {tone}\n{get_tone_instructions(tone)}\n")
+    request = request.replace("## REWRITTEN STATEMENT:\n", "")
+    return SYSTEM_PROMPT, f"# MP STATEMENT REWRITING TASK\n\n## RAW GOVERNMENT STATEMENT:{request}{head}{GENERATION_INSTRUCTIONS}\n\n## REWRITTEN STATEMENT:\n"
+
+def instructions_first_layout(raw_text, context, audience, tone, accepted, rejected):
+    """(system, user) as the app sends them: static instructions, tone, examples, then the statement"""
+    return system_message(), construct_prompt(raw_text, context, audience, tone, accepted, rejected)
+
+def common_prefix_length(a, b):
+    """Length of the longest common prefix of two strings, by binary search on slices"""
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[:middle] == b[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+def cached_prefix_tokens(text, recent):
+    """Prompt tokens a provider cache holding the recent requests would serve for text"""
+    longest = max((common_prefix_length(text, other) for other in recent), default=0)
+    tokens = count_tokens(text[:longest])
+    if tokens < CACHE_MIN_PREFIX:
+        return 0
+    return tokens // CACHE_INCREMENT * CACHE_INCREMENT
+
+def bench_prompt_cache(args):
+    """Compare how much of each prompt a provider prefix cache can serve in the old and new layouts"""
+    rng = random.Random(11)
+    library = [text for text, _, _ in synthetic_statements(args.library, words=args.words)]
+    tones = list(TONE_INSTRUCTIONS)
+
+    # A working session: a few favourite tones, examples drawn from a small set of close matches,
+    # and some statements generated again (variants, regenerations) with the same examples
+    requests = []
+    for i in range(args.requests):
+        if requests and rng.random() < args.repeat:
+            requests.append(requests[-1])
+            continue
+        tone = tones[min(int(rng.expovariate(1.0)), len(tones) - 1)]
+        examples = rng.sample(library[:max(5, args.library // 4)] if rng.random() < 0.5 else library, 5)
+        accepted = [(text, "Topic", tone) for text in examples[:3]]
+        rejected = [(text, "Topic", None) for text in examples[3:]]
+        raw_text = ' '.join(rng.choices(SEARCH_VOCABULARY, k=args.words))
+        requests.append((raw_text, "Local context", "Local residents", tone, accepted, rejected))
+
+    print(f"Prompt cache simulation: {args.requests} requests, {args.repeat:.0%} repeated, "
+          f"cache holds the last {args.window} prompts")
+    print(f"{'layout':>20} {'build ms':>9} {'prompt tok':>11} {'cached':>7} {'uncached tok':>13} {'$ / 1k req':>11}")
+    for name, layout in (("statement first", statement_first_layout),
+                         ("instructions first", instructions_first_layout)):
+        start = time.perf_counter()
+        prompts = [layout(*request) for request in requests]
+        build_ms = (time.perf_counter() - start) * 1000 / len(prompts)
+
+        total = cached = 0
+        recent = []
+        for system, user in prompts:
+            text = f"{system}\n{user}"
+            total += count_tokens(text)
+            cached += cached_prefix_tokens(text, recent)
+            recent = (recent + [text])[-args.window:]
+
+        # Cached prompt tokens are billed at the discounted rate, and skip prefill on the provider
+        cost = ((total - cached) * args.price + cached * args.cached_price) / 1e6 / len(prompts) * 1000
+        print(f"{name:>20} {build_ms:>9.2f} {total / len(prompts):>11.0f} {cached / total:>6.0%} "
+              f"{(total - cached) / len(prompts):>13.0f} {cost:>11.3f}")
+
+# Stages timed by the pipeline benchmark, in pipeline order, then the whole request
+PIPELINE_STAGES = ['retrieval', 'prompt_build', 'first_token', 'api', 'db', 'end_to_end']
+
+def run_generation(api_manager, request, budget, stream_output=True):
+    """One generation as the app's process_submission runs it, without the Tk widgets; returns ms per stage
+
+    retrieval is example retrieval, prompt_build fits the examples into the
+    prompt, api is the (streamed) API call including the response cache, and
+    db is logging the submission. first_token and end_to_end run from the start.
+    """
+    raw_text, context, audience, tone = request
+    stream = TokenStream()
+    start = stream.started
+    accepted_responses, rejected_responses = retrieve_examples(raw_text, context, audience, tone,
+                                                               accepted_limit=3, rejected_limit=2)
+    retrieved = time.perf_counter()
+
+    prompt, prompt_tokens = fit_prompt(
+        lambda accepted, rejected: construct_prompt(raw_text, context, audience, tone, accepted, rejected),
+        accepted_responses, rejected_responses, system_message(), budget)
+    built = time.perf_counter()
+
+    if stream_output:
+        success, generated_text = api_manager.stream_llm_api(prompt, stream)
+    else:
+        success, generated_text = api_manager.call_llm_api(prompt)
+    if not success:
+        raise Exception(generated_text)
+    answered = time.perf_counter()
+
+    # The app's write job, without log_submission's error dialog
+    run_write(insert_submission, raw_text, context, audience, tone, generated_text, None, prompt_tokens)
+    finished = time.perf_counter()
+
+    first_token = stream.time_to_first_token if stream.time_to_first_token is not None else answered - start
+    return {
+        'retrieval': (retrieved - start) * 1000,
+        'prompt_build': (built - retrieved) * 1000,
+        'first_token': first_token * 1000,
+        'api': (answered - built) * 1000,
+        'db': (finished - answered) * 1000,
+        'end_to_end': (finished - start) * 1000
+    }
+
+def git_commit():
+    """Short hash of the checked-out commit, or None outside a git checkout"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare_pipeline(baseline, results):
+    """Print each stage's percentiles against a baseline results file"""
+    print(f"Against {baseline.get('commit') or 'baseline'} ({baseline.get('created', '?')}):")
+    print(f"{'stage':>13} {'':>4} {'before ms':>10} {'after ms':>10} {'change':>8}")
+    for stage in PIPELINE_STAGES:
+        before = baseline.get('stages', {}).get(stage, {})
+        after = results['stages'].get(stage, {})
+        for key in ('p50', 'p95', 'p99'):
+            if key in before and key in after:
+                change = f"{(after[key] - before[key]) / before[key]:+.0%}" if before[key] else ''
+                print(f"{stage:>13} {key:>4} {before[key]:>10.2f} {after[key]:>10.2f} {change:>8}")
+
+def bench_pipeline(args):
+    """Drive the generation pipeline headlessly against the local fake API at a fixed concurrency"""
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory, \
+            FakeLLMProcess(latency=args.latency, jitter=args.jitter, tokens_per_second=args.tokens_per_second,
+                          completion_tokens=args.completion_tokens, error_rate=args.error_rate,
+                          seed=args.seed) as server:
+        configure_pool(os.path.join(directory, 'pipeline.db'))
+        run_write(migrate)
+
+        def load_library(conn):
+            conn.executemany(INSERT_SQL, ((text, topic, tone, None, "Imported", None, content_hash(text))
+                                          for text, topic, tone in synthetic_statements(args.library, args.words)))
+            conn.executemany("""
+            INSERT INTO submissions (original_text, target_audience, tone, generated_text, status)
+            VALUES (?, ?, ?, ?, 'rejected')
+            """, ((text, topic, tone, text)
+                  for text, topic, tone in synthetic_statements(args.library // 10, args.words, seed=7)))
+
+        run_write(load_library)
+        warm_up()
+
+        # The fake server stands in for the API; rate limits would only measure themselves
+        os.environ['OPENAI_API_KEY'] = 'fake-key'
+        os.environ['OPENAI_BASE_URL'] = server.url
+        configure_api_limits(0, 0)
+        api_manager = ApiManager()
+        success, message = api_manager.initialize_openai()
+        if not success:
+            print(message)
+            sys.exit(1)
+        budget = prompt_token_budget(api_manager.model, GENERATION_PARAMS["max_tokens"], args.token_budget)
+
+        tones = list(TONE_INSTRUCTIONS)
+        requests = [(text, "Local context", "Local residents", rng.choice(tones))
+                    for text, _, _ in synthetic_statements(args.requests + args.warmup, args.words, seed=args.seed + 1)]
+
+        # Untimed: the first request creates the client and imports the rest of openai
+        for request in requests[:args.warmup]:
+            run_generation(api_manager, request, budget, not args.no_stream)
+        requests = requests[args.warmup:]
+
+        executor = JobExecutor(max_workers=args.concurrency)
+        start = time.perf_counter()
+        jobs = [executor.submit(run_generation, api_manager, request, budget, not args.no_stream, name="generate")
+                for request in requests]
+        timings = []
+        failed = 0
+        for job in jobs:
+            try:
+                timings.append(job.result())
+            except Exception:
+                failed += 1
+        elapsed = time.perf_counter() - start
+        served = server.stats()
+        executor.shutdown()
+        shutdown_async_backend()
+        close_writer()
+
+    results = {
+        'benchmark': 'pipeline',
+        'commit': git_commit(),
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'settings': {key: value for key, value in vars(args).items() if key not in ('func', 'output', 'baseline')},
+        'requests': len(requests),
+        'failed': failed,
+        'api_retries': get_api_limiter().retries,
+        'server': served,
+        'throughput_per_second': round(len(timings) / elapsed, 2),
+        'stages': {stage: latency_summary([timing[stage] for timing in timings]) for stage in PIPELINE_STAGES}
+    }
+
+    print(f"Generation pipeline: {len(requests)} requests at concurrency {args.concurrency}, "
+          f"{'not streamed' if args.no_stream else 'streamed'}, {args.library} library statements")
+    print(f"  fake API: {args.latency:.2f}s +/- {args.jitter:.2f}s to first token, {args.tokens_per_second:.0f} tokens/s, "
+          f"{args.error_rate:.0%} errors; {served['requests']} requests over {served['connections']} connections")
+    print(f"  {len(timings)} succeeded, {failed} failed, {results['api_retries']} retries, "
+          f"{results['throughput_per_second']:.1f} generations/s")
+    print(f"{'stage':>13} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for stage, summary in results['stages'].items():
+        if summary:
+            print(f"{stage:>13} {summary['p50']:>9.2f} {summary['p95']:>9.2f} {summary['p99']:>9.2f} {summary['max']:>9.2f}")
+
+    # Sorted keys keep the files diffable between runs
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+        file.write('\n')
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            compare_pipeline(json.load(file), results)
+
+def main():
+    """Run a benchmark from the command line"""
+    parser = argparse.ArgumentParser(description="MP Statement Rewriter benchmarks")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    pool_parser = subparsers.add_parser('pool', help="connect-per-call vs connection pool")
+    pool_parser.add_argument('--operations', type=int, default=2000)
+    pool_parser.add_argument('--threads', type=int, default=4)
+    pool_parser.add_argument('--pool-size', type=int, default=5)
+    pool_parser.set_defaults(func=bench_pool)
+
+    writer_parser = subparsers.add_parser('writer', help="commit per call vs single writer with group commit")
+    writer_parser.add_argument('--operations', type=int, default=2000)
+    writer_parser.add_argument('--threads', type=int, default=8)
+    writer_parser.set_defaults(func=bench_writer)
+
+    search_parser = subparsers.add_parser('search', help="LIKE scan vs FTS5 search")
+    search_parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    search_parser.add_argument('--terms', nargs='+', default=['bypass', 'hosp', 'broadband'])
+    search_parser.add_argument('--repeats', type=int, default=5)
+    search_parser.set_defaults(func=bench_search)
+
+    sampler_parser = subparsers.add_parser('sampler', help="ORDER BY RANDOM() vs slot sampling")
+    sampler_parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    sampler_parser.add_argument('--repeats', type=int, default=20)
+    sampler_parser.set_defaults(func=bench_sampler)
+
+    retrieval_parser = subparsers.add_parser('retrieval', help="BM25 example retrieval latency")
+    retrieval_parser.add_argument('--rows', type=int, default=100000)
+    retrieval_parser.add_argument('--queries', type=int, default=200)
+    retrieval_parser.add_argument('--query-words', type=int, default=80)
+    retrieval_parser.set_defaults(func=bench_retrieval)
+
+    plans_parser = subparsers.add_parser('plans', help="EXPLAIN QUERY PLAN check of the hot queries")
+    plans_parser.add_argument('--rows', type=int, default=10000)
+    plans_parser.set_defaults(func=bench_plans)
+
+    import_parser = subparsers.add_parser('import', help="streaming CSV import throughput")
+    import_parser.add_argument('--rows', type=int, default=1000000)
+    import_parser.add_argument('--words', type=int, default=20)
+    import_parser.add_argument('--chunk-size', type=int, default=10000)
+    import_parser.add_argument('--baseline', action='store_true', help="also time the old row-by-row import")
+    import_parser.set_defaults(func=bench_import)
+
+    near_parser = subparsers.add_parser('near-duplicates', help="MinHash/LSH near-duplicate lookup latency")
+    near_parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    near_parser.add_argument('--words', type=int, default=80)
+    near_parser.add_argument('--queries', type=int, default=200)
+    near_parser.set_defaults(func=bench_near_duplicates)
+
+    cache_parser = subparsers.add_parser('prompt-cache', help="provider prompt-cache hits, old vs new prompt layout")
+    cache_parser.add_argument('--requests', type=int, default=500)
+    cache_parser.add_argument('--library', type=int, default=40)
+    cache_parser.add_argument('--words', type=int, default=150)
+    cache_parser.add_argument('--repeat', type=float, default=0.2, help="share of requests that repeat the previous one")
+    cache_parser.add_argument('--window', type=int, default=50, help="recent prompts the provider cache holds")
+    cache_parser.add_argument('--price', type=float, default=2.5, help="$ per million prompt tokens")
+    cache_parser.add_argument('--cached-price', type=float, default=1.25, help="$ per million cached prompt tokens")
+    cache_parser.set_defaults(func=bench_prompt_cache)
+
+    pipeline_parser = subparsers.add_parser('pipeline', help="end-to-end generation latency against a local fake API")
+    pipeline_parser.add_argument('--requests', type=int, default=200)
+    pipeline_parser.add_argument('--concurrency', type=int, default=8)
+    pipeline_parser.add_argument('--warmup', type=int, default=2, help="untimed requests made first")
+    pipeline_parser.add_argument('--library', type=int, default=5000, help="library statements to retrieve examples from")
+    pipeline_parser.add_argument('--words', type=int, default=120)
+    pipeline_parser.add_argument('--latency', type=float, default=0.3, help="fake API seconds to first token")
+    pipeline_parser.add_argument('--jitter', type=float, default=0.1)
+    pipeline_parser.add_argument('--tokens-per-second', type=float, default=200.0)
+    pipeline_parser.add_argument('--completion-tokens', type=int, default=200)
+    pipeline_parser.add_argument('--error-rate', type=float, default=0.0, help="share of fake API requests that fail")
+    pipeline_parser.add_argument('--no-stream', action='store_true', help="use plain instead of streamed completions")
+    pipeline_parser.add_argument('--token-budget', type=int, default=6000)
+    pipeline_parser.add_argument('--seed', type=int, default=1)
+    pipeline_parser.add_argument('--output', default='pipeline-benchmark.json', help="JSON results file")
+    pipeline_parser.add_argument('--baseline', help="earlier JSON results file to compare against")
+    pipeline_parser.set_defaults(func=bench_pipeline)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,197 @@
 import configparser
 import os
+import threading
+import time
 from tkinter import messagebox
 from error_handler import log_error
 
+try:
+    from dotenv import dotenv_values, find_dotenv
+except ImportError:
+    dotenv_values = find_dotenv = None
+
+CONFIG_FILE = 'config.ini'
+
+# How often a settings read checks whether config.ini or .env has been saved since it was read
+RELOAD_CHECK_INTERVAL = 1.0
+
+# Environment variables (and .env entries) that set config.ini keys; any other key is
+# set by SECTION_KEY, e.g. PROMPT_TOKEN_BUDGET for TOKEN_BUDGET in [PROMPT]
+ENV_NAMES = {
+    ('API', 'OPENAI_API_KEY'): 'OPENAI_API_KEY',
+    ('API', 'MODEL'): 'OPENAI_MODEL',
+    ('API', 'BASE_URL'): 'OPENAI_BASE_URL'
+}
+
+# Settings the shared API client is built from, and the values config.ini holds
+# instead of a real key (the second when the key is kept in .env)
+API_SETTINGS = {'OPENAI_API_KEY', 'OPENAI_MODEL', 'OPENAI_BASE_URL', 'API_MAX_CONNECTIONS'}
+PLACEHOLDER_API_KEYS = ('your_api_key_here', 'stored_in_env_file')
+
+def env_name(section, key):
+    """Environment variable that overrides a config.ini key"""
+    section, key = section.upper(), key.upper()
+    return ENV_NAMES.get((section, key), f"{section}_{key}")
+
+def _stamp(path):
+    """What changes when a file is saved, replaced or deleted"""
+    try:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+    except OSError:
+        return None
+
+class Config:
+    """Settings from the environment, .env and config.ini, in that order of precedence
+
+    The files are parsed once and read again only after one of them is saved
+    (checked at most every RELOAD_CHECK_INTERVAL seconds), so reading a
+    setting costs a few dictionary lookups. Subscribers are called with the
+    environment-style names (see env_name) of the settings that changed.
+    """
+    
+    def __init__(self, path=CONFIG_FILE, env_path=None):
+        self.path = path
+        if env_path is None:
+            # Found the way python-dotenv's load_dotenv finds it, else watched in the working folder
+            env_path = (find_dotenv(usecwd=True) if find_dotenv else '') or os.path.abspath('.env')
+        self.env_path = env_path
+        self._values = {}
+        self._dotenv = {}
+        self._stamps = None
+        self._checked = 0.0
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self.reload()
+    
+    def _read(self):
+        """Parse both files: ({env name: config.ini value}, {name: .env value})"""
+        parser = configparser.ConfigParser()
+        parser.read(self.path)
+        values = {env_name(section, key): value
+                  for section in parser.sections() for key, value in parser[section].items()}
+        
+        dotenv = {}
+        if dotenv_values is not None and os.path.exists(self.env_path):
+            dotenv = {name: value for name, value in dotenv_values(self.env_path).items() if value is not None}
+        return values, dotenv
+    
+    def reload(self):
+        """Read both files now and notify subscribers of the settings that changed"""
+        with self._lock:
+            stamps = (_stamp(self.path), _stamp(self.env_path))
+            self._checked = time.monotonic()
+            try:
+                values, dotenv = self._read()
+            except Exception as e:
+                # Keep the settings in use until the file is fixed and saved again
+                log_error("Config read error", e)
+                self._stamps = stamps
+                return set()
+            
+            changed = {name for name in values.keys() | self._values.keys()
+                       if values.get(name) != self._values.get(name)}
+            changed |= {name for name in dotenv.keys() | self._dotenv.keys()
+                        if dotenv.get(name) != self._dotenv.get(name)}
+            first_load = self._stamps is None
+            self._values, self._dotenv, self._stamps = values, dotenv, stamps
+            subscribers = list(self._subscribers)
+        
+        if changed and not first_load:
+            for callback in subscribers:
+                try:
+                    callback(changed)
+                except Exception as e:
+                    log_error("Config subscriber error", e)
+        return changed
+    
+    def check(self):
+        """Reload if config.ini or .env has been saved since it was read (at most once a check interval)"""
+        if time.monotonic() - self._checked < RELOAD_CHECK_INTERVAL:
+            return
+        self._checked = time.monotonic()
+        if (_stamp(self.path), _stamp(self.env_path)) != self._stamps:
+            self.reload()
+    
+    def env(self, name, default=None):
+        """An environment setting (the process environment, then .env)"""
+        self.check()
+        value = os.environ.get(name)
+        if value is None:
+            value = self._dotenv.get(name)
+        return default if value is None else value
+    
+    def get(self, section, key, default=None):
+        """A config.ini setting, overridden by its environment variable or .env entry"""
+        name = env_name(section, key)
+        value = self.env(name)
+        if value is None:
+            value = self._values.get(name)
+        return default if value is None else value
+    
+    def get_flag(self, section, key, default=False):
+        """A true/false setting (1/0, yes/no, true/false, on/off)"""
+        value = self.get(section, key)
+        if value is None:
+            return default
+        return configparser.ConfigParser.BOOLEAN_STATES.get(str(value).strip().lower(), default)
+    
+    def subscribe(self, callback):
+        """Call callback(changed_names) whenever a reload changes settings"""
+        with self._lock:
+            self._subscribers.append(callback)
+        return callback
+    
+    def unsubscribe(self, callback):
+        """Stop calling a subscribed callback"""
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+_config = None
+_config_lock = threading.Lock()
+
+def get_config():
+    """Get the process-wide settings, reading them on first use"""
+    global _config
+    if _config is None:
+        with _config_lock:
+            if _config is None:
+                _config = Config()
+    return _config
+
+def get_config_value(section, key, default=None):
+    """Get a value from the environment, .env or the config file"""
+    try:
+        return get_config().get(section, key, default)
+    except Exception as e:
+        log_error("Get config value error", e)
+        return default
+
+def get_config_flag(section, key, default=False):
+    """Get a true/false value from the environment, .env or the config file"""
+    try:
+        return get_config().get_flag(section, key, default)
+    except Exception as e:
+        log_error("Get config flag error", e)
+        return default
+
+def get_env_value(name, default=None):
+    """Get an environment setting, taking .env into account"""
+    try:
+        return get_config().env(name, default)
+    except Exception as e:
+        log_error("Get env value error", e)
+        return default
+
+def subscribe_config(callback):
+    """Call callback(changed_names) when a saved config.ini or .env changes settings"""
+    return get_config().subscribe(callback)
+
+def reload_config():
+    """Re-read config.ini and .env now, e.g. right after saving them"""
+    return get_config().reload()
+
 def save_api_settings(api_key, model, window=None):
     """Save API settings to config file"""
     try:
@@ -27,6 +216,9 @@ def save_api_settings(api_key, model, window=None):
         with open('config.ini', 'w') as f:
             config.write(f)
         
+        # Apply the new settings now rather than at the next check
+        reload_config()
+        
         messagebox.showinfo("Settings Saved", "API settings have been saved.")
         if window:
             window.destroy()
@@ -37,24 +229,6 @@ def save_api_settings(api_key, model, window=None):
         log_error("Save API settings error", e)
         return False
 
-def get_config_value(section, key, default=None):
-    """Get a value from the config file"""
-    try:
-        config = configparser.ConfigParser()
-        
-        if not os.path.exists('config.ini'):
-            return default
-            
-        config.read('config.ini')
-        
-        if section in config and key in config[section]:
-            return config[section][key]
-        else:
-            return default
-    except Exception as e:
-        log_error("Get config value error", e)
-        return default
-
 def ensure_config_exists():
     """Make sure the config file exists with default values"""
     try:
@@ -1,67 +1,42 @@
-import sqlite3
 from tkinter import messagebox
 from error_handler import log_error
+from db_pool import get_connection
+from db_writer import run_write
+from example_sampler import sample_library, sample_submissions
+from dedupe import content_hash
+from near_duplicates import diverse
+from schema import migrate
 
 def initialize_database():
-    """Create database tables if they don't exist"""
+    """Create or upgrade the database schema"""
     try:
-        conn = sqlite3.connect('mp_rewriter.db')
-        cursor = conn.cursor()
-        
-        # Create submissions table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS submissions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            original_text TEXT NOT NULL,
-            context TEXT,
-            target_audience TEXT,
-            tone TEXT,
-            generated_text TEXT,
-            status TEXT DEFAULT 'pending',
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            notes TEXT
-        )
-        ''')
-        
-        # Create past_responses table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS past_responses (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            published_text TEXT NOT NULL,
-            topic TEXT,
-            tone TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            source TEXT,
-            tags TEXT
-        )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        # Versioned schema: tables, search index, sampler, cache, query indexes and content hashes
+        run_write(migrate)
         return True
     except Exception as e:
         messagebox.showerror("Database Error", f"Failed to initialize database: {str(e)}")
         log_error("Database initialization error", e)
         return False
 
-def log_submission(raw_text, context, audience, tone, generated_text, notes=None):
-    """Log the submission to the database"""
+def insert_submission(conn, raw_text, context, audience, tone, generated_text, notes=None, prompt_tokens=None):
+    """Write job adding a pending submission; returns its ID (raises on failure, for callers without a UI)"""
+    cursor = conn.cursor()
+    
+    # Insert submission
+    cursor.execute("""
+    INSERT INTO submissions (original_text, context, target_audience, tone, generated_text, status, notes,
+                             prompt_tokens)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, (raw_text, context, audience, tone, generated_text, "pending", notes, prompt_tokens))
+    
+    # Get the inserted row ID
+    return cursor.lastrowid
+
+def log_submission(raw_text, context, audience, tone, generated_text, notes=None, prompt_tokens=None):
+    """Log the submission to the database, with the prompt's token count if known"""
     try:
-        conn = sqlite3.connect('mp_rewriter.db')
-        cursor = conn.cursor()
-        
-        # Insert submission
-        cursor.execute("""
-        INSERT INTO submissions (original_text, context, target_audience, tone, generated_text, status, notes)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (raw_text, context, audience, tone, generated_text, "pending", notes))
-        
-        # Get the inserted row ID
-        submission_id = cursor.lastrowid
-        
-        conn.commit()
-        conn.close()
-        
+        submission_id = run_write(insert_submission, raw_text, context, audience, tone, generated_text, notes,
+                                  prompt_tokens)
         return submission_id
     except Exception as e:
         messagebox.showerror("Database Error", f"Failed to log submission: {str(e)}")
@@ -71,61 +46,24 @@ def log_submission(raw_text, context, audience, tone, generated_text, notes=None
 def get_past_responses(status=None, limit=3):
     """Retrieve past responses from the database"""
     try:
-        conn = sqlite3.connect('mp_rewriter.db')
-        cursor = conn.cursor()
-        
-        if status == "accepted":
-            # Get random past approved responses
-            cursor.execute("""
-            SELECT published_text, topic, tone FROM past_responses
-            ORDER BY RANDOM()
-            LIMIT ?
-            """, (limit,))
+        with get_connection() as conn:
+            # Sample spares where possible so near-duplicates can be dropped
+            if status == "accepted":
+                # Get random past approved responses
+                results = diverse(sample_library(conn, limit * 2), limit)
             
-            results = cursor.fetchall()
+                # If we don't have enough from past_responses, get from accepted submissions
+                if len(results) < limit:
+                    results = diverse(results + sample_submissions(conn, 'accepted', (limit - len(results)) * 2), limit)
             
-            # If we don't have enough from past_responses, get from accepted submissions
-            if len(results) < limit:
-                cursor.execute("""
-                SELECT generated_text, target_audience, tone FROM submissions
-                WHERE status = 'accepted'
-                ORDER BY RANDOM()
-                LIMIT ?
-                """, (limit - len(results),))
-                
-                results.extend(cursor.fetchall())
+            elif status == "rejected":
+                # Get random rejected submissions
+                results = diverse(sample_submissions(conn, 'rejected', limit * 2), limit)
             
-        elif status == "rejected":
-            # Get random rejected submissions
-            cursor.execute("""
-            SELECT generated_text, target_audience, tone FROM submissions
-            WHERE status = 'rejected'
-            ORDER BY RANDOM()
-            LIMIT ?
-            """, (limit,))
-            
-            results = cursor.fetchall()
-            
-        else:
-            # Get mix of both
-            cursor.execute("""
-            SELECT published_text, topic, tone FROM past_responses
-            ORDER BY RANDOM()
-            LIMIT ?
-            """, (limit // 2 + 1,))
-            
-            results = cursor.fetchall()
-            
-            cursor.execute("""
-            SELECT generated_text, target_audience, tone FROM submissions
-            WHERE status = 'accepted'
-            ORDER BY RANDOM()
-            LIMIT ?
-            """, (limit // 2,))
-            
-            results.extend(cursor.fetchall())
-        
-        conn.close()
+            else:
+                # Get mix of both
+                results = diverse(sample_library(conn, limit // 2 + 1) + sample_submissions(conn, 'accepted', limit // 2),
+                                  limit // 2 + 1 + limit // 2)
         
         # Return list of tuples (text, context/topic, tone)
         return results
@@ -137,15 +75,9 @@ def get_past_responses(status=None, limit=3):
 def update_submission_status(submission_id, status):
     """Update the status of a submission"""
     try:
-        conn = sqlite3.connect('mp_rewriter.db')
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-        UPDATE submissions SET status = ? WHERE id = ?
-        """, (status, submission_id))
-        
-        conn.commit()
-        conn.close()
+        run_write(lambda conn: conn.execute("""
+            UPDATE submissions SET status = ? WHERE id = ?
+            """, (status, submission_id)))
         return True
     except Exception as e:
         log_error("Update submission status error", e)
@@ -154,37 +86,83 @@ def update_submission_status(submission_id, status):
 def get_submission_by_id(submission_id):
     """Get a submission by ID"""
     try:
-        conn = sqlite3.connect('mp_rewriter.db')
-        cursor = conn.cursor()
+        with get_connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute("""
-        SELECT original_text, context, target_audience, tone, generated_text, notes
-        FROM submissions
-        WHERE id = ?
-        """, (submission_id,))
+            cursor.execute("""
+            SELECT original_text, context, target_audience, tone, generated_text, notes
+            FROM submissions
+            WHERE id = ?
+            """, (submission_id,))
         
-        result = cursor.fetchone()
-        conn.close()
+            result = cursor.fetchone()
         
         return result
     except Exception as e:
         log_error("Get submission by ID error", e)
         return None
 
-def save_accepted_statement(submission_id, generated_text, topic, tone):
-    """Save an accepted statement to past_responses"""
+def get_accepted_submission(submission_id):
+    """Get the generated text and metadata needed to save an accepted submission"""
     try:
-        conn = sqlite3.connect('mp_rewriter.db')
-        cursor = conn.cursor()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+            SELECT generated_text, target_audience, tone, context
+            FROM submissions
+            WHERE id = ?
+            """, (submission_id,))
+            
+            result = cursor.fetchone()
         
-        # Add to past_responses
-        cursor.execute("""
-        INSERT INTO past_responses (published_text, topic, tone, source)
-        VALUES (?, ?, ?, ?)
-        """, (generated_text, topic, tone, f"Generated from submission #{submission_id}"))
+        return result
+    except Exception as e:
+        log_error("Get accepted submission error", e)
+        return None
+
+def log_submission_variants(raw_text, context, audience, tone, generated_texts, notes=None, prompt_tokens=None):
+    """Log alternative drafts of one statement in a single transaction, returning their IDs
+
+    The drafts come from one request, so each records the same prompt token count.
+    """
+    try:
+        def insert_submissions(conn):
+            submission_ids = []
+            for generated_text in generated_texts:
+                cursor = conn.execute("""
+                INSERT INTO submissions (original_text, context, target_audience, tone, generated_text, status, notes,
+                                         prompt_tokens)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, (raw_text, context, audience, tone, generated_text, "pending", notes, prompt_tokens))
+                submission_ids.append(cursor.lastrowid)
+            return submission_ids
+        
+        return run_write(insert_submissions)
+    except Exception as e:
+        log_error("Log submission variants error", e)
+        return []
+
+def save_accepted_statement(submission_id, generated_text, topic, tone, reject_ids=()):
+    """Save an accepted statement to past_responses, rejecting any drafts generated alongside it"""
+    try:
+        def save(conn):
+            # Add to past_responses; accepting the same text again refreshes the existing entry
+            conn.execute("""
+            INSERT INTO past_responses (published_text, topic, tone, source, content_hash)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(content_hash) DO UPDATE SET
+                topic = excluded.topic, tone = excluded.tone, source = excluded.source, timestamp = CURRENT_TIMESTAMP
+            """, (generated_text, topic, tone, f"Generated from submission #{submission_id}",
+                  content_hash(generated_text)))
+            
+            if reject_ids:
+                placeholders = ','.join('?' * len(reject_ids))
+                conn.execute(f"""
+                UPDATE submissions SET status = 'rejected' WHERE id IN ({placeholders}) AND status = 'pending'
+                """, list(reject_ids))
         
-        conn.commit()
-        conn.close()
+        run_write(save)
         return True
     except Exception as e:
         log_error("Save accepted statement error", e)
@@ -193,17 +171,16 @@ def save_accepted_statement(submission_id, generated_text, topic, tone):
 def get_submission_details(submission_id):
     """Get detailed information about a submission"""
     try:
-        conn = sqlite3.connect('mp_rewriter.db')
-        cursor = conn.cursor()
+        with get_connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute("""
-        SELECT original_text, context, target_audience, tone, generated_text, status, timestamp, notes
-        FROM submissions
-        WHERE id = ?
-        """, (submission_id,))
+            cursor.execute("""
+            SELECT original_text, context, target_audience, tone, generated_text, status, timestamp, notes
+            FROM submissions
+            WHERE id = ?
+            """, (submission_id,))
         
-        result = cursor.fetchone()
-        conn.close()
+            result = cursor.fetchone()
         
         return result
     except Exception as e:
@@ -213,19 +190,18 @@ def get_submission_details(submission_id):
 def get_approved_statement_details(statement_id):
     """Get details of an approved statement"""
     try:
-        conn = sqlite3.connect('mp_rewriter.db')
-        cursor = conn.cursor()
+        with get_connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute("""
-        SELECT published_text, topic, tone, timestamp, source, tags
-        FROM past_responses
-        WHERE id = ?
-        """, (statement_id,))
+            cursor.execute("""
+            SELECT published_text, topic, tone, timestamp, source, tags
+            FROM past_responses
+            WHERE id = ?
+            """, (statement_id,))
         
-        result = cursor.fetchone()
-        conn.close()
+            result = cursor.fetchone()
         
         return result
     except Exception as e:
         log_error("Get approved statement details error", e)
-        return None
\ No newline at end of file
+        return None
@@ -0,0 +1,248 @@
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from error_handler import log_error
+
+DEFAULT_DB_PATH = 'mp_rewriter.db'
+DEFAULT_POOL_SIZE = 5
+
+# Applied to every connection. WAL lets readers run alongside the single writer,
+# and synchronous=NORMAL is safe under WAL while avoiding an fsync per commit.
+CONNECTION_PRAGMAS = [
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('busy_timeout', 5000),
+    ('cache_size', -65536),      # 64 MB page cache (negative values are KiB)
+    ('mmap_size', 268435456),    # 256 MB memory-mapped I/O
+    ('temp_store', 'MEMORY')
+]
+
+def configure_connection(conn):
+    """Apply the standard pragmas to a new connection"""
+    for name, value in CONNECTION_PRAGMAS:
+        conn.execute(f"PRAGMA {name}={value}")
+    return conn
+
+class ConnectionPool:
+    """Thread-aware pool of SQLite connections to the application database"""
+    
+    def __init__(self, db_path=DEFAULT_DB_PATH, size=DEFAULT_POOL_SIZE, timeout=30.0, health_check_interval=60.0):
+        self.db_path = db_path
+        self.size = max(1, int(size))
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        
+        # Idle connections as (connection, last_used) pairs
+        self._idle = []
+        self._all = set()
+        self._created = 0
+        self._closed = False
+        self._available = threading.Condition(threading.Lock())
+        
+        # Per-thread checkout state
+        self._local = threading.local()
+    
+    def _create_connection(self):
+        """Open a new connection to the database"""
+        # Connections move between threads, but only one thread holds one at a time
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+        return configure_connection(conn)
+    
+    def _is_healthy(self, conn):
+        """Check that a connection can still run a trivial query"""
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+    
+    def _discard(self, conn):
+        """Close a connection and free its slot in the pool"""
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._available:
+            self._all.discard(conn)
+            self._created -= 1
+            self._available.notify()
+    
+    def _checkout(self):
+        """Take an idle connection, open a new one, or wait for one to be released"""
+        deadline = time.monotonic() + self.timeout
+        preferred = getattr(self._local, 'last_conn', None)
+        
+        while True:
+            conn = None
+            last_used = None
+            with self._available:
+                while True:
+                    if self._closed:
+                        raise sqlite3.ProgrammingError("Connection pool is closed")
+                    
+                    if self._idle:
+                        # Prefer the connection this thread used last, otherwise the most recent one
+                        index = len(self._idle) - 1
+                        for i, (idle_conn, _) in enumerate(self._idle):
+                            if idle_conn is preferred:
+                                index = i
+                                break
+                        conn, last_used = self._idle.pop(index)
+                        break
+                    
+                    if self._created < self.size:
+                        self._created += 1
+                        break
+                    
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f"Timed out waiting for a database connection (pool size {self.size})")
+                    self._available.wait(remaining)
+            
+            if conn is None:
+                try:
+                    conn = self._create_connection()
+                except Exception:
+                    with self._available:
+                        self._created -= 1
+                        self._available.notify()
+                    raise
+                with self._available:
+                    self._all.add(conn)
+                return conn
+            
+            # Health check connections that have been idle for a while
+            if time.monotonic() - last_used < self.health_check_interval or self._is_healthy(conn):
+                return conn
+            
+            self._discard(conn)
+    
+    def acquire(self):
+        """Check out a connection, reusing the one already held by this thread"""
+        held = getattr(self._local, 'conn', None)
+        if held is not None:
+            self._local.depth += 1
+            return held
+        
+        conn = self._checkout()
+        self._local.conn = conn
+        self._local.depth = 1
+        return conn
+    
+    def release(self, conn):
+        """Return a connection once the outermost user in this thread is done with it"""
+        if getattr(self._local, 'conn', None) is not conn:
+            raise sqlite3.ProgrammingError("Connection was not acquired by this thread")
+        
+        self._local.depth -= 1
+        if self._local.depth > 0:
+            return
+        
+        self._local.conn = None
+        self._local.last_conn = conn
+        
+        try:
+            # Never hand out a connection with a half-finished transaction
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error as e:
+            log_error("Connection pool release error", e)
+            self._discard(conn)
+            return
+        
+        with self._available:
+            if self._closed:
+                self._all.discard(conn)
+                conn.close()
+                return
+            self._idle.append((conn, time.monotonic()))
+            self._available.notify()
+    
+    @contextmanager
+    def connection(self):
+        """Context manager yielding a pooled connection, committing on success"""
+        conn = self.acquire()
+        outermost = self._local.depth == 1
+        try:
+            yield conn
+            if outermost and conn.in_transaction:
+                conn.commit()
+        except BaseException:
+            if outermost and conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self.release(conn)
+    
+    def stats(self):
+        """Return a snapshot of pool usage"""
+        with self._available:
+            return {
+                'size': self.size,
+                'open': self._created,
+                'idle': len(self._idle),
+                'in_use': self._created - len(self._idle)
+            }
+    
+    def close(self):
+        """Close idle connections and refuse further checkouts"""
+        with self._available:
+            self._closed = True
+            idle = self._idle
+            self._idle = []
+            self._available.notify_all()
+        
+        for conn, _ in idle:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _configured_db_path():
+    """Database file from DB_PATH in the environment or .env, falling back to the default"""
+    from config_manager import get_env_value
+    return get_env_value('DB_PATH', DEFAULT_DB_PATH)
+
+def _configured_pool_size():
+    """Read the pool size from config.ini, falling back to the default"""
+    try:
+        from config_manager import get_config_value
+        return int(get_config_value('DATABASE', 'POOL_SIZE', DEFAULT_POOL_SIZE))
+    except Exception as e:
+        log_error("Pool size config error", e)
+        return DEFAULT_POOL_SIZE
+
+def get_pool():
+    """Get the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(_configured_db_path(), _configured_pool_size())
+    return _pool
+
+def configure_pool(db_path=None, size=None, **kwargs):
+    """Replace the process-wide pool, e.g. to point at another database file"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = ConnectionPool(db_path or _configured_db_path(),
+                               size or _configured_pool_size(), **kwargs)
+    return _pool
+
+def get_connection():
+    """Context manager yielding a connection from the shared pool"""
+    return get_pool().connection()
+
+def close_pool():
+    """Close the shared pool (called on application exit)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
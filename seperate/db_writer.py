@@ -0,0 +1,202 @@
+import atexit
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from error_handler import log_error
+from db_pool import configure_connection, get_pool
+from metrics import flush_metrics, record
+
+DEFAULT_BATCH_SIZE = 64
+# Extra time to wait for more jobs before committing; 0 batches only what is
+# already queued, which is what piles up while the previous commit runs
+DEFAULT_BATCH_WINDOW = 0.0
+
+_STOP = object()
+
+class DatabaseWriter:
+    """Single background thread that performs every write to the database.
+
+    Write jobs are callables taking the writer's connection. Jobs queued close
+    together are committed as one transaction (group commit); each job runs in
+    its own savepoint so a failing job does not undo its neighbours. Jobs must
+    not call commit() or rollback() themselves.
+    """
+    
+    def __init__(self, db_path, batch_size=DEFAULT_BATCH_SIZE, batch_window=DEFAULT_BATCH_WINDOW):
+        self.db_path = db_path
+        self.batch_size = max(1, int(batch_size))
+        self.batch_window = batch_window
+        self._queue = queue.Queue()
+        self._closed = False
+        self._lock = threading.Lock()
+        
+        # Counters for diagnostics
+        self.jobs_written = 0
+        self.commits = 0
+        
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+    
+    def submit(self, fn, *args, **kwargs):
+        """Queue a write job and return a Future for its result"""
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError("Database writer is closed")
+            self._queue.put((future, fn, args, kwargs, time.perf_counter()))
+        return future
+    
+    def execute(self, fn, *args, **kwargs):
+        """Run a write job and wait for it to be committed"""
+        if threading.current_thread() is self._thread:
+            # Already on the writer (a job calling another write helper)
+            return fn(self._conn, *args, **kwargs)
+        return self.submit(fn, *args, **kwargs).result()
+    
+    def flush(self):
+        """Block until every job queued so far has been committed"""
+        self.execute(lambda conn: None)
+    
+    def close(self):
+        """Commit outstanding jobs and stop the writer thread"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._thread.join()
+    
+    def _next_batch(self, first):
+        """Collect jobs queued right behind the first one, up to the batch size"""
+        batch = [first]
+        stop = False
+        while len(batch) < self.batch_size:
+            try:
+                if self.batch_window > 0:
+                    job = self._queue.get(timeout=self.batch_window)
+                else:
+                    job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is _STOP:
+                stop = True
+                break
+            batch.append(job)
+        return batch, stop
+    
+    def _run(self):
+        """Writer loop: take a batch, run each job in a savepoint, commit once"""
+        try:
+            self._conn = configure_connection(sqlite3.connect(self.db_path, timeout=30.0, isolation_level=None))
+        except Exception as e:
+            log_error("Database writer connection error", e)
+            self._fail_pending(e)
+            return
+        
+        stop = False
+        while not stop:
+            job = self._queue.get()
+            if job is _STOP:
+                break
+            batch, stop = self._next_batch(job)
+            self._write_batch(batch)
+        
+        self._conn.close()
+    
+    def _write_batch(self, batch):
+        """Run a batch of jobs inside one transaction"""
+        conn = self._conn
+        outcomes = []
+        started = time.perf_counter()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for future, fn, args, kwargs, queued in batch:
+                # Time each job spent queued behind earlier writes
+                record('db.write_wait', (started - queued) * 1000)
+                if not future.set_running_or_notify_cancel():
+                    continue
+                conn.execute("SAVEPOINT job")
+                try:
+                    result = fn(conn, *args, **kwargs)
+                    conn.execute("RELEASE job")
+                    outcomes.append((future, result, None))
+                except BaseException as e:
+                    conn.execute("ROLLBACK TO job")
+                    conn.execute("RELEASE job")
+                    outcomes.append((future, None, e))
+            conn.execute("COMMIT")
+            self.commits += 1
+            record('db.write_batch', (time.perf_counter() - started) * 1000)
+        except Exception as e:
+            log_error("Database writer commit error", e)
+            try:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+            # Nothing in this batch was committed, including jobs that never started
+            for future, fn, args, kwargs, queued in batch:
+                if future.done():
+                    continue
+                if future.running() or future.set_running_or_notify_cancel():
+                    future.set_exception(e)
+            return
+        
+        # Only report results once they are durable
+        for future, result, error in outcomes:
+            if error is None:
+                self.jobs_written += 1
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+    
+    def _fail_pending(self, error):
+        """Fail every queued job when the writer cannot start"""
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if job is not _STOP and job[0].set_running_or_notify_cancel():
+                job[0].set_exception(error)
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_writer():
+    """Get the process-wide writer, starting it on first use"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = DatabaseWriter(get_pool().db_path)
+    return _writer
+
+def run_write(fn, *args, **kwargs):
+    """Run fn(conn, *args) on the writer thread and return its result once committed"""
+    return get_writer().execute(fn, *args, **kwargs)
+
+def submit_write(fn, *args, **kwargs):
+    """Queue fn(conn, *args) on the writer thread without waiting"""
+    return get_writer().submit(fn, *args, **kwargs)
+
+def execute_write(sql, params=()):
+    """Run a single write statement and return the new row ID"""
+    return run_write(lambda conn: conn.execute(sql, params).lastrowid)
+
+def close_writer():
+    """Flush and stop the writer (registered to run at exit)"""
+    global _writer
+    # Persist the last timing samples along with everything else
+    flush_metrics()
+    with _writer_lock:
+        writer = _writer
+        _writer = None
+    if writer is not None:
+        writer.close()
+
+atexit.register(close_writer)
@@ -0,0 +1,67 @@
+import hashlib
+import unicodedata
+from error_handler import log_error
+from db_writer import run_write
+from job_executor import current_token
+
+# Library rows hashed per write transaction by the one-off backfill
+BACKFILL_BATCH_SIZE = 1000
+
+def normalize_text(text):
+    """Text as compared for duplicates: Unicode-normalised, case-folded, whitespace collapsed"""
+    text = text or ''
+    # ASCII text is already in NFKC form; skipping it keeps bulk imports fast
+    if not text.isascii():
+        text = unicodedata.normalize('NFKC', text)
+    return ' '.join(text.split()).casefold()
+
+def content_hash(text):
+    """Hex SHA-1 of the normalised text; equal for statements that differ only in case or spacing"""
+    return hashlib.sha1(normalize_text(text).encode('utf-8')).hexdigest()
+
+def add_content_hash_column(conn):
+    """Add past_responses.content_hash and its unique index; older rows stay NULL until backfilled"""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(past_responses)")}
+    if 'content_hash' not in columns:
+        conn.execute("ALTER TABLE past_responses ADD COLUMN content_hash TEXT")
+    
+    # NULLs never conflict, so the index can be created before any row is hashed
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_past_responses_hash ON past_responses(content_hash)")
+
+def _hash_batch(conn, batch_size):
+    """Write job: hash the next unhashed rows, deleting all but the oldest copy of each text"""
+    rows = conn.execute("""
+    SELECT id, published_text FROM past_responses WHERE content_hash IS NULL ORDER BY id LIMIT ?
+    """, (batch_size,)).fetchall()
+    
+    collapsed = 0
+    for row_id, text in rows:
+        digest = content_hash(text)
+        existing = conn.execute("SELECT id FROM past_responses WHERE content_hash = ?", (digest,)).fetchone()
+        if existing is not None:
+            # The delete triggers take the copy out of the search index and the example pool
+            conn.execute("DELETE FROM past_responses WHERE id = ?", (max(existing[0], row_id),))
+            collapsed += 1
+            if existing[0] < row_id:
+                continue
+        conn.execute("UPDATE past_responses SET content_hash = ? WHERE id = ?", (digest, row_id))
+    return len(rows), collapsed
+
+def collapse_duplicates(batch_size=BACKFILL_BATCH_SIZE):
+    """Hash library rows that predate the content_hash column and collapse their duplicates
+
+    Meant for a background job at start-up; once every row is hashed it finds
+    nothing to do. Returns (rows hashed, duplicates removed).
+    """
+    token = current_token()
+    hashed = collapsed = 0
+    try:
+        while not token.cancelled:
+            count, removed = run_write(_hash_batch, batch_size)
+            hashed += count
+            collapsed += removed
+            if count < batch_size:
+                break
+    except Exception as e:
+        log_error("Collapse duplicate statements error", e)
+    return hashed, collapsed
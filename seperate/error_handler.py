@@ -1,20 +1,183 @@
+import atexit
 import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
 import traceback
 
+# One JSON object per line: time, level, context, error, type, thread and traceback
+LOG_FILE = "error_log.jsonl"
+
+# The log starts a new file when it passes this size or on the first error of a new day,
+# keeping this many old files (error_log.jsonl.1 is the newest)
+MAX_LOG_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 5
+
+# Repeats of the same error within this many seconds are counted rather than written
+DUPLICATE_WINDOW = 60.0
+
+# Distinct errors remembered for duplicate suppression
+MAX_TRACKED_ERRORS = 1000
+
+class RotatingJsonFileHandler(logging.handlers.RotatingFileHandler):
+    """Log file rotated by size, and daily: a new file is started for the first error of each day"""
+    
+    def __init__(self, path, max_bytes=MAX_LOG_BYTES, backups=LOG_BACKUPS):
+        super().__init__(path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8', delay=True)
+        self.day = (datetime.date.fromtimestamp(os.path.getmtime(path))
+                    if os.path.exists(path) else None)
+    
+    def shouldRollover(self, record):
+        if self.day is not None and self.day != datetime.date.fromtimestamp(record.created):
+            return True
+        return super().shouldRollover(record)
+    
+    def emit(self, record):
+        super().emit(record)
+        self.day = datetime.date.fromtimestamp(record.created)
+
+class JsonLinesFormatter(logging.Formatter):
+    """Formats an error record as one line of JSON, traceback included"""
+    
+    def format(self, record):
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'context': getattr(record, 'context', record.name),
+            'error': record.getMessage(),
+            'type': record.exc_info[0].__name__ if record.exc_info else getattr(record, 'error_type', None),
+            'thread': record.threadName
+        }
+        if getattr(record, 'suppressed', 0):
+            entry['suppressed'] = record.suppressed
+        if record.exc_info:
+            entry['traceback'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+class DuplicateFilter(logging.Filter):
+    """Passes an error, then drops the same error for window seconds; the next one passed carries the count"""
+    
+    def __init__(self, window=DUPLICATE_WINDOW):
+        super().__init__()
+        self.window = window
+        self._seen = {}
+        self._lock = threading.Lock()
+    
+    def filter(self, record):
+        key = (getattr(record, 'context', record.name), record.exc_info[0] if record.exc_info else None,
+               record.getMessage())
+        with self._lock:
+            seen = self._seen.get(key)
+            if seen is not None and record.created - seen[0] < self.window:
+                seen[1] += 1
+                return False
+            record.suppressed = seen[1] if seen is not None else 0
+            self._seen[key] = [record.created, 0]
+            
+            # Forget the errors that have been quiet longest
+            if len(self._seen) > MAX_TRACKED_ERRORS:
+                for stale in sorted(self._seen, key=lambda k: self._seen[k][0])[:len(self._seen) // 2]:
+                    del self._seen[stale]
+        return True
+    
+    def drain(self):
+        """Remove and return ((context, error type, message), count) for errors with uncounted repeats"""
+        with self._lock:
+            pending = [(key, seen[1]) for key, seen in self._seen.items() if seen[1]]
+            for key, _ in pending:
+                self._seen[key][1] = 0
+        return pending
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Queues records as they are, so tracebacks are formatted on the writer thread instead of the caller's"""
+    
+    def prepare(self, record):
+        return record
+
+class ErrorLog:
+    """Error log written by a background thread from a queue
+
+    Logging an error only queues it, so threads that hit errors (for example
+    every worker during an API outage) never wait on the disk. Repeats are
+    suppressed before they are queued.
+    """
+    
+    def __init__(self, path=LOG_FILE, max_bytes=MAX_LOG_BYTES, backups=LOG_BACKUPS, window=DUPLICATE_WINDOW):
+        self.file_handler = RotatingJsonFileHandler(path, max_bytes, backups)
+        self.file_handler.setFormatter(JsonLinesFormatter())
+        self.duplicates = DuplicateFilter(window)
+        
+        self.queue = queue.SimpleQueue()
+        self.handler = DeferredQueueHandler(self.queue)
+        self.listener = logging.handlers.QueueListener(self.queue, self.file_handler)
+        self.listener.start()
+        
+        self.logger = logging.getLogger("mp_statement_writer.errors")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        self.logger.addFilter(self.duplicates)
+        self.logger.addHandler(self.handler)
+        self._closed = False
+        self._lock = threading.Lock()
+    
+    def log(self, context, exception, level=logging.ERROR):
+        """Queue an exception with the context it happened in"""
+        self.logger.log(level, str(exception), exc_info=(type(exception), exception, exception.__traceback__),
+                        extra={'context': context})
+    
+    def close(self):
+        """Write out queued errors and stop the writer thread; errors logged afterwards are written directly"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        # Both handlers share the file's lock, so nothing logged during the switch is lost
+        self.logger.addHandler(self.file_handler)
+        self.logger.removeHandler(self.handler)
+        self.listener.stop()
+        
+        # Repeats suppressed since their error was last written would otherwise go unreported
+        for (context, error_type, message), count in self.duplicates.drain():
+            self.file_handler.handle(logging.makeLogRecord({
+                'name': self.logger.name, 'levelno': logging.WARNING, 'levelname': 'WARNING', 'msg': message,
+                'context': context, 'error_type': error_type.__name__ if error_type else None, 'suppressed': count}))
+        self.file_handler.flush()
+
+_log = None
+_log_lock = threading.Lock()
+
+def get_error_log():
+    """Get the process-wide error log, starting its writer on first use"""
+    global _log
+    if _log is None:
+        with _log_lock:
+            if _log is None:
+                _log = ErrorLog()
+    return _log
+
 def log_error(error_context, exception):
     """Log errors to a file with context information"""
     try:
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        # Format the error message
-        error_message = f"[{timestamp}] ERROR in {error_context}: {str(exception)}\n"
-        error_message += "".join(traceback.format_exception(type(exception), exception, exception.__traceback__))
-        error_message += "\n" + "-"*80 + "\n"
-        
-        # Write to error log file
-        with open("error_log.txt", "a") as log_file:
-            log_file.write(error_message)
-    except:
+        get_error_log().log(error_context, exception)
+    except Exception:
         # If we can't even log the error, just print it
         print(f"ERROR in {error_context}: {str(exception)}")
-        traceback.print_exc()
\ No newline at end of file
+        traceback.print_exception(type(exception), exception, exception.__traceback__)
+
+def log_unhandled(exc_type, exc_value, exc_traceback):
+    """Log an exception nothing caught (for sys.excepthook)"""
+    try:
+        get_error_log().log("Unhandled error", exc_value.with_traceback(exc_traceback), logging.CRITICAL)
+    except Exception:
+        traceback.print_exception(exc_type, exc_value, exc_traceback)
+
+def close_error_log():
+    """Flush the error log (registered to run at exit)"""
+    if _log is not None:
+        _log.close()
+
+# error_handler is imported before the modules that log while shutting down, so this runs after them
+atexit.register(close_error_log)
@@ -0,0 +1,349 @@
+import heapq
+import math
+import re
+import sys
+import threading
+from error_handler import log_error
+from db_pool import get_connection
+from example_sampler import LIBRARY, count_examples, sample_library, sample_submissions
+from near_duplicates import diverse
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Upper bound on postings scored per query. Query terms are taken rarest first
+# until the budget is spent, which keeps lookups a few milliseconds even when a
+# statement is full of common words.
+POSTINGS_BUDGET = 3000
+MAX_QUERY_TERMS = 12
+
+# Candidates ranked per example slot, so near-duplicates can be skipped without running short
+DIVERSITY_OVERFETCH = 3
+
+# Changes kept in example_changes; a retriever further behind than this rebuilds its indexes
+MAX_LOGGED_CHANGES = 10000
+
+# Triggers log every change the id high-water mark and row counts cannot see: library rows
+# rewritten in place (the content_hash upsert) and submissions entering, leaving or edited
+# in the rejected pool. Bulk imports insert new ids, which the high-water mark picks up.
+_PRUNE_CHANGES = f"""
+        DELETE FROM example_changes WHERE seq <= (SELECT MAX(seq) FROM example_changes) - {MAX_LOGGED_CHANGES};
+"""
+
+CHANGE_LOG_DDL = [
+    '''
+    CREATE TABLE IF NOT EXISTS example_changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        pool TEXT NOT NULL,
+        row_id INTEGER NOT NULL
+    )
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS past_responses_example_update
+    AFTER UPDATE OF published_text, topic, tone ON past_responses BEGIN
+        INSERT INTO example_changes (pool, row_id) VALUES ('library', new.id);{_PRUNE_CHANGES}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS submissions_example_insert AFTER INSERT ON submissions
+    WHEN new.status IS 'rejected' BEGIN
+        INSERT INTO example_changes (pool, row_id) VALUES ('rejected', new.id);{_PRUNE_CHANGES}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS submissions_example_update
+    AFTER UPDATE OF status, generated_text, target_audience, tone ON submissions
+    WHEN old.status IS 'rejected' OR new.status IS 'rejected' BEGIN
+        INSERT INTO example_changes (pool, row_id) VALUES ('rejected', new.id);{_PRUNE_CHANGES}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS submissions_example_delete AFTER DELETE ON submissions
+    WHEN old.status IS 'rejected' BEGIN
+        INSERT INTO example_changes (pool, row_id) VALUES ('rejected', old.id);{_PRUNE_CHANGES}
+    END
+    '''
+]
+
+def create_change_log(conn):
+    """Create the change log the retriever's in-memory indexes are kept current from"""
+    for statement in CHANGE_LOG_DDL:
+        conn.execute(statement)
+
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below between
+both but by can could did do does doing down during each few for from further had has have having he her
+here hers herself him himself his how i if in into is it its itself just me more most my myself no nor not
+now of off on once only or other our ours ourselves out over own same she should so some such than that the
+their theirs them themselves then there these they this those through to too under until up very was we
+were what when where which while who whom why will with would you your yours yourself yourselves
+""".split())
+
+def tokenize(text):
+    """Lowercase word tokens with stopwords and single characters removed"""
+    return [word for word in re.findall(r'\w+', (text or '').lower())
+            if len(word) > 1 and word not in STOPWORDS]
+
+class Bm25Index:
+    """In-memory inverted index scored with BM25"""
+    
+    def __init__(self):
+        self.postings = {}
+        self.lengths = {}
+        self.total_length = 0
+        
+        # Distinct terms of each document, so removing one touches only its own postings
+        self.terms = {}
+        
+        # Per-document BM25 length normalisation, recomputed when the average drifts
+        self._norms = {}
+        self._norm_average = 0.0
+    
+    def __len__(self):
+        return len(self.lengths)
+    
+    def add(self, doc_id, tokens):
+        """Index a document's tokens"""
+        counts = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        terms = []
+        for term, tf in counts.items():
+            # Interned so the per-document term lists share the postings' strings
+            term = sys.intern(term)
+            self.postings.setdefault(term, {})[doc_id] = tf
+            terms.append(term)
+        self.terms[doc_id] = tuple(terms)
+        self.lengths[doc_id] = len(tokens)
+        self.total_length += len(tokens)
+        if self._norm_average:
+            self._norms[doc_id] = K1 * (1.0 - B + B * len(tokens) / self._norm_average)
+    
+    def remove(self, doc_id):
+        """Drop a document"""
+        if doc_id not in self.lengths:
+            return
+        for term in self.terms.pop(doc_id, ()):
+            docs = self.postings.get(term)
+            if docs is not None:
+                docs.pop(doc_id, None)
+                if not docs:
+                    del self.postings[term]
+        self.total_length -= self.lengths.pop(doc_id)
+        self._norms.pop(doc_id, None)
+    
+    def prepare(self):
+        """Length normalisation per document, recomputed if the average length has drifted"""
+        average = (self.total_length / len(self.lengths) if self.lengths else 0.0) or 1.0
+        if abs(average - self._norm_average) > 0.05 * average:
+            self._norm_average = average
+            self._norms = {doc_id: K1 * (1.0 - B + B * length / average)
+                           for doc_id, length in self.lengths.items()}
+        return self._norms
+    
+    def search(self, query_tokens, k, exclude=()):
+        """Top-k (doc_id, score) pairs for a query, best first"""
+        n = len(self.lengths)
+        if n == 0 or k <= 0:
+            return []
+        
+        # Rarest terms carry the most weight and have the shortest postings
+        terms = sorted((len(self.postings[t]), t) for t in set(query_tokens) if t in self.postings)
+        selected = []
+        spent = 0
+        for df, term in terms[:MAX_QUERY_TERMS]:
+            if selected and spent + df > POSTINGS_BUDGET:
+                break
+            selected.append((df, term))
+            spent += df
+        
+        norms = self.prepare()
+        scores = {}
+        get = scores.get
+        for df, term in selected:
+            weight = math.log(1.0 + (n - df + 0.5) / (df + 0.5)) * (K1 + 1.0)
+            for doc_id, tf in self.postings[term].items():
+                scores[doc_id] = get(doc_id, 0.0) + weight * tf / (tf + norms[doc_id])
+        
+        for doc_id in exclude:
+            scores.pop(doc_id, None)
+        return [(doc_id, scores[doc_id]) for doc_id in heapq.nlargest(k, scores, key=get)]
+
+class ExampleRetriever:
+    """Finds the approved and rejected statements most similar to a new request"""
+    
+    def __init__(self):
+        self.library = Bm25Index()
+        self.rejected = Bm25Index()
+        self._library_high_water = 0
+        self._change_seq = None
+        self._lock = threading.Lock()
+    
+    def _load_library(self, rows):
+        """Index past_responses rows of (id, published_text, topic, tone)"""
+        for row_id, text, topic, tone in rows:
+            self.library.add(row_id, tokenize(text) + tokenize(topic) + tokenize(tone))
+            self._library_high_water = max(self._library_high_water, row_id)
+    
+    def _rejected_tokens(self, text, audience, tone):
+        """Tokens indexed for a rejected submission"""
+        return tokenize(text) + tokenize(audience) + tokenize(tone)
+    
+    def _changes(self, conn):
+        """Library and rejected row ids changed since the last refresh, or None if the log has moved past them"""
+        rows = conn.execute("SELECT seq, pool, row_id FROM example_changes WHERE seq > ? ORDER BY seq",
+                            (self._change_seq or 0,)).fetchall()
+        first = conn.execute("SELECT MIN(seq) FROM example_changes").fetchone()[0]
+        behind = self._change_seq is None or (first is not None and first > self._change_seq + 1)
+        if rows:
+            self._change_seq = rows[-1][0]
+        elif self._change_seq is None:
+            self._change_seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM example_changes").fetchone()[0]
+        if behind:
+            return None
+        
+        changed = {LIBRARY: set(), 'rejected': set()}
+        for seq, pool, row_id in rows:
+            changed[pool].add(row_id)
+        return changed
+    
+    def _sync_library(self, conn, changed):
+        """Pick up new statements by id and ones rewritten in place from the change log, rebuilding after deletes"""
+        rows = conn.execute("""
+        SELECT id, published_text, topic, tone FROM past_responses WHERE id > ? ORDER BY id
+        """, (self._library_high_water,)).fetchall()
+        self._load_library(rows)
+        
+        # Rows rewritten in place are re-tokenized from their current text
+        ids = [row_id for row_id in changed if row_id in self.library.lengths]
+        for row_id in ids:
+            self.library.remove(row_id)
+        if ids:
+            self._load_library(self._fetch_library(conn, ids))
+        
+        if len(self.library) != count_examples(conn, LIBRARY):
+            self.library = Bm25Index()
+            self._library_high_water = 0
+            self._load_library(conn.execute(
+                "SELECT id, published_text, topic, tone FROM past_responses").fetchall())
+    
+    def _sync_rejected(self, conn, changed):
+        """Apply changes into, out of and within 'rejected' from the change log, rebuilding if the count disagrees"""
+        for row_id in changed:
+            self.rejected.remove(row_id)
+        current = {row[0] for row in conn.execute(f"""
+        SELECT row_id FROM example_slots WHERE pool = 'rejected' AND row_id IN ({','.join('?' * len(changed))})
+        """, list(changed))} if changed else set()
+        for row_id, text, audience, tone in self._fetch_submissions(conn, list(current)):
+            self.rejected.add(row_id, self._rejected_tokens(text, audience, tone))
+        
+        if len(self.rejected) != count_examples(conn, 'rejected'):
+            self.rejected = Bm25Index()
+            current = [row[0] for row in conn.execute("SELECT row_id FROM example_slots WHERE pool = 'rejected'")]
+            for row_id, text, audience, tone in self._fetch_submissions(conn, current):
+                self.rejected.add(row_id, self._rejected_tokens(text, audience, tone))
+    
+    def _fetch_library(self, conn, ids):
+        """Yield (id, published_text, topic, tone) for library ids"""
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            yield from conn.execute(f"""
+            SELECT id, published_text, topic, tone FROM past_responses WHERE id IN ({placeholders})
+            """, chunk).fetchall()
+    
+    def _fetch_submissions(self, conn, ids):
+        """Yield (id, generated_text, target_audience, tone) for submission ids"""
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            yield from conn.execute(f"""
+            SELECT id, generated_text, target_audience, tone FROM submissions WHERE id IN ({placeholders})
+            """, chunk).fetchall()
+    
+    def refresh(self, conn):
+        """Bring both indexes up to date with the database"""
+        with self._lock:
+            changed = self._changes(conn)
+            if changed is None:
+                # First refresh, or too far behind the log: index everything from scratch
+                self.library = Bm25Index()
+                self._library_high_water = 0
+                self.rejected = Bm25Index()
+                changed = {LIBRARY: set(), 'rejected': set()}
+            self._sync_library(conn, changed[LIBRARY])
+            self._sync_rejected(conn, changed['rejected'])
+            
+            # Keep the occasional full renormalisation out of the query path
+            self.library.prepare()
+            self.rejected.prepare()
+    
+    def retrieve(self, conn, raw_text, context, audience, tone, accepted_limit=3, rejected_limit=2, exclude_id=None):
+        """Most similar approved statements and nearest rejected ones, topped up at random"""
+        self.refresh(conn)
+        query = tokenize(raw_text) + tokenize(context) + tokenize(audience) + tokenize(tone)
+        
+        with self._lock:
+            library_hits = self.library.search(query, accepted_limit * DIVERSITY_OVERFETCH)
+            rejected_hits = self.rejected.search(query, rejected_limit * DIVERSITY_OVERFETCH,
+                                                 exclude=(exclude_id,) if exclude_id is not None else ())
+        
+        # Lightly edited copies of one statement teach nothing new: keep the best-ranked of each
+        accepted = diverse(self._fetch(conn, "SELECT id, published_text, topic, tone FROM past_responses",
+                                       [doc_id for doc_id, _ in library_hits]), accepted_limit)
+        rejected = diverse(self._fetch(conn, "SELECT id, generated_text, target_audience, tone FROM submissions",
+                                       [doc_id for doc_id, _ in rejected_hits]), rejected_limit)
+        
+        # Nothing in common with the library yet: fall back to random examples
+        if len(accepted) < accepted_limit:
+            accepted = diverse(accepted + [row for row in sample_library(conn, accepted_limit) if row not in accepted],
+                               accepted_limit)
+        if len(rejected) < rejected_limit:
+            rejected = diverse(rejected + [row for row in sample_submissions(conn, 'rejected', rejected_limit,
+                                                                             exclude_id=exclude_id)
+                                           if row not in rejected], rejected_limit)
+        
+        return accepted, rejected
+    
+    def _fetch(self, conn, select, ids):
+        """Load rows by id, keeping the ranking order"""
+        if not ids:
+            return []
+        placeholders = ','.join('?' * len(ids))
+        rows = {row[0]: row[1:] for row in conn.execute(f"{select} WHERE id IN ({placeholders})", ids)}
+        return [rows[doc_id] for doc_id in ids if doc_id in rows]
+
+_retriever = None
+_retriever_lock = threading.Lock()
+
+def get_retriever():
+    """Get the process-wide retriever, building its indexes on first use"""
+    global _retriever
+    if _retriever is None:
+        with _retriever_lock:
+            if _retriever is None:
+                retriever = ExampleRetriever()
+                with get_connection() as conn:
+                    retriever.refresh(conn)
+                _retriever = retriever
+    return _retriever
+
+def retrieve_examples(raw_text, context, audience, tone, accepted_limit=3, rejected_limit=2, exclude_id=None):
+    """Return (accepted, rejected) example tuples most relevant to a statement"""
+    with get_connection() as conn:
+        try:
+            return get_retriever().retrieve(conn, raw_text, context, audience, tone,
+                                            accepted_limit, rejected_limit, exclude_id)
+        except Exception as e:
+            # Random examples are better than none
+            log_error("Example retrieval error", e)
+            return (sample_library(conn, accepted_limit),
+                    sample_submissions(conn, 'rejected', rejected_limit, exclude_id=exclude_id))
+
+def warm_up():
+    """Build the indexes ahead of the first generation (run off the UI thread)"""
+    try:
+        get_retriever()
+    except Exception as e:
+        log_error("Example index build error", e)
@@ -0,0 +1,162 @@
+import random
+
+# Every sampleable row has a dense slot number 1..n within its group, so k
+# random rows are k random slot lookups instead of sorting the whole table.
+# Groups are 'library' for past_responses and the status for submissions.
+# Triggers keep the slots and the per-group counts in step with every insert,
+# status change and delete, whichever code path or process makes it.
+LIBRARY = 'library'
+
+SAMPLER_DDL = [
+    '''
+    CREATE TABLE IF NOT EXISTS example_counts (
+        pool TEXT PRIMARY KEY,
+        count INTEGER NOT NULL DEFAULT 0
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS example_slots (
+        pool TEXT NOT NULL,
+        slot INTEGER NOT NULL,
+        row_id INTEGER NOT NULL,
+        PRIMARY KEY (pool, slot)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_example_slots_row ON example_slots(pool, row_id)
+    '''
+]
+
+def _add_slot(pool, row_id):
+    """Trigger statements that append a row to the end of a pool"""
+    return f'''
+        INSERT OR IGNORE INTO example_counts (pool, count) VALUES ({pool}, 0);
+        UPDATE example_counts SET count = count + 1 WHERE pool = {pool};
+        INSERT INTO example_slots (pool, slot, row_id)
+        VALUES ({pool}, (SELECT count FROM example_counts WHERE pool = {pool}), {row_id});
+    '''
+
+def _remove_slot(pool, row_id):
+    """Trigger statements that remove a row, moving the pool's last row into its slot"""
+    return f'''
+        UPDATE example_counts SET count = count - 1
+        WHERE pool = {pool} AND EXISTS (SELECT 1 FROM example_slots WHERE pool = {pool} AND row_id = {row_id});
+        UPDATE example_slots SET slot = -slot WHERE pool = {pool} AND row_id = {row_id};
+        UPDATE example_slots SET slot = (SELECT -slot FROM example_slots WHERE pool = {pool} AND row_id = {row_id})
+        WHERE pool = {pool} AND slot = (SELECT count + 1 FROM example_counts WHERE pool = {pool})
+        AND EXISTS (SELECT 1 FROM example_slots WHERE pool = {pool} AND row_id = {row_id});
+        DELETE FROM example_slots WHERE pool = {pool} AND row_id = {row_id};
+    '''
+
+_OLD_STATUS = "COALESCE(old.status, '')"
+_NEW_STATUS = "COALESCE(new.status, '')"
+
+SAMPLER_TRIGGERS = [
+    f'''
+    CREATE TRIGGER IF NOT EXISTS past_responses_sampler_insert AFTER INSERT ON past_responses BEGIN
+        {_add_slot(repr(LIBRARY), 'new.id')}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS past_responses_sampler_delete AFTER DELETE ON past_responses BEGIN
+        {_remove_slot(repr(LIBRARY), 'old.id')}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS submissions_sampler_insert AFTER INSERT ON submissions BEGIN
+        {_add_slot(_NEW_STATUS, 'new.id')}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS submissions_sampler_status AFTER UPDATE OF status ON submissions
+    WHEN old.status IS NOT new.status BEGIN
+        {_remove_slot(_OLD_STATUS, 'old.id')}
+        {_add_slot(_NEW_STATUS, 'new.id')}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS submissions_sampler_delete AFTER DELETE ON submissions BEGIN
+        {_remove_slot(_OLD_STATUS, 'old.id')}
+    END
+    '''
+]
+
+def create_sampler_tables(conn):
+    """Create the slot tables and triggers, filling them from existing rows"""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='example_slots'").fetchone()
+    
+    for statement in SAMPLER_DDL + SAMPLER_TRIGGERS:
+        conn.execute(statement)
+    
+    if exists:
+        return
+    
+    # Databases that predate the sampler get their slots numbered once
+    conn.execute("""
+    INSERT INTO example_slots (pool, slot, row_id)
+    SELECT ?, ROW_NUMBER() OVER (ORDER BY id), id FROM past_responses
+    """, (LIBRARY,))
+    conn.execute("""
+    INSERT INTO example_slots (pool, slot, row_id)
+    SELECT COALESCE(status, ''), ROW_NUMBER() OVER (PARTITION BY status ORDER BY id), id FROM submissions
+    """)
+    conn.execute("""
+    INSERT OR REPLACE INTO example_counts (pool, count)
+    SELECT pool, COUNT(*) FROM example_slots GROUP BY pool
+    """)
+
+def add_library_slots(conn, after_id):
+    """Append library rows with id > after_id to the pool (bulk loads that bypass the insert trigger)"""
+    conn.execute("INSERT OR IGNORE INTO example_counts (pool, count) VALUES (?, 0)", (LIBRARY,))
+    added = conn.execute("""
+    INSERT INTO example_slots (pool, slot, row_id)
+    SELECT ?, (SELECT count FROM example_counts WHERE pool = ?) + ROW_NUMBER() OVER (ORDER BY id), id
+    FROM past_responses WHERE id > ?
+    """, (LIBRARY, LIBRARY, after_id)).rowcount
+    conn.execute("UPDATE example_counts SET count = count + ? WHERE pool = ?", (added, LIBRARY))
+
+def count_examples(conn, pool):
+    """Number of rows in a pool, read from the trigger-maintained counts"""
+    row = conn.execute("SELECT count FROM example_counts WHERE pool = ?", (pool,)).fetchone()
+    return row[0] if row else 0
+
+def _pick_slots(conn, pool, k):
+    """Choose up to k distinct random slots from a pool"""
+    count = count_examples(conn, pool)
+    if count <= 0 or k <= 0:
+        return []
+    return random.sample(range(1, count + 1), min(k, count))
+
+def sample_library(conn, k):
+    """k random approved statements as (published_text, topic, tone)"""
+    slots = _pick_slots(conn, LIBRARY, k)
+    if not slots:
+        return []
+    
+    placeholders = ','.join('?' * len(slots))
+    rows = conn.execute(f"""
+    SELECT p.published_text, p.topic, p.tone
+    FROM example_slots e JOIN past_responses p ON p.id = e.row_id
+    WHERE e.pool = ? AND e.slot IN ({placeholders})
+    """, (LIBRARY, *slots)).fetchall()
+    
+    random.shuffle(rows)
+    return rows
+
+def sample_submissions(conn, status, k, exclude_id=None):
+    """k random submissions with a status as (generated_text, target_audience, tone)"""
+    # One extra pick leaves room to drop the excluded submission
+    slots = _pick_slots(conn, status, k + 1 if exclude_id is not None else k)
+    if not slots:
+        return []
+    
+    placeholders = ','.join('?' * len(slots))
+    rows = conn.execute(f"""
+    SELECT s.id, s.generated_text, s.target_audience, s.tone
+    FROM example_slots e JOIN submissions s ON s.id = e.row_id
+    WHERE e.pool = ? AND e.slot IN ({placeholders})
+    """, (status, *slots)).fetchall()
+    
+    random.shuffle(rows)
+    return [row[1:] for row in rows if row[0] != exclude_id][:k]
@@ -0,0 +1,285 @@
+"""
+Local OpenAI-compatible stub server: python -m fake_llm_server --port 8089
+
+Answers /v1/chat/completions (plain, n choices and streamed) with generated
+filler text after a configurable delay, at a configurable token rate, failing
+a configurable share of requests with the errors the API limiter retries. Point
+the application at it with OPENAI_BASE_URL=http://127.0.0.1:8089/v1 to try it
+out or benchmark it without paying for API calls.
+"""
+import argparse
+import json
+import multiprocessing
+import random
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from prompt_budget import count_tokens
+
+DEFAULT_LATENCY = 0.5
+DEFAULT_JITTER = 0.2
+DEFAULT_TOKENS_PER_SECOND = 60.0
+DEFAULT_COMPLETION_TOKENS = 250
+
+# Errors returned for the --error-rate share of requests: (status, message, extra headers)
+FAKE_ERRORS = [
+    (429, "Rate limit reached (fake server)", {'retry-after-ms': '100'}),
+    (500, "Internal server error (fake server)", {}),
+    (503, "Service unavailable (fake server)", {})
+]
+
+FILLER_WORDS = ("I am pleased to confirm that our community will benefit from new investment in local services , "
+                "and I will keep working with residents , councillors and businesses to make sure it delivers . "
+                "This matters for families across the constituency who have told me about their concerns .").split()
+
+class FakeLLMServer:
+    """OpenAI-compatible chat completions endpoint answering locally, with counters of what it served"""
+    
+    def __init__(self, host='127.0.0.1', port=0, latency=DEFAULT_LATENCY, jitter=DEFAULT_JITTER,
+                 tokens_per_second=DEFAULT_TOKENS_PER_SECOND, completion_tokens=DEFAULT_COMPLETION_TOKENS,
+                 error_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self.connections = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+        
+        server = self
+        
+        class Handler(ChatCompletionsHandler):
+            fake = server
+        
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+    
+    @property
+    def url(self):
+        """Base URL to give the OpenAI client (OPENAI_BASE_URL)"""
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+    
+    def start(self):
+        """Serve requests on a background thread"""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-llm-server", daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        """Stop serving and close the listening socket"""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, *exc_info):
+        self.stop()
+    
+    def stats(self):
+        """Requests served, requests failed on purpose and connections accepted so far"""
+        with self._lock:
+            return {'requests': self.requests, 'errors': self.errors, 'connections': self.connections}
+    
+    def plan(self):
+        """Draw one request's delay before the first token and its error, if it fails"""
+        with self._lock:
+            self.requests += 1
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            error = None
+            if self._random.random() < self.error_rate:
+                self.errors += 1
+                error = self._random.choice(FAKE_ERRORS)
+            return delay, error
+    
+    def completion_text(self, max_tokens, choice=0):
+        """Filler completion of completion_tokens words (at most max_tokens), one list item per token"""
+        count = min(self.completion_tokens, max_tokens or self.completion_tokens)
+        start = choice * 7
+        return [('' if i == 0 else ' ') + FILLER_WORDS[(start + i) % len(FILLER_WORDS)] for i in range(count)]
+
+class ChatCompletionsHandler(BaseHTTPRequestHandler):
+    """Request handler for FakeLLMServer; keeps connections alive like the real API"""
+    
+    protocol_version = "HTTP/1.1"
+    fake = None
+    
+    def log_message(self, format, *args):
+        """Stay quiet; the server is used by benchmarks"""
+    
+    def setup(self):
+        super().setup()
+        with self.fake._lock:
+            self.fake.connections += 1
+    
+    def send_json(self, status, payload, headers=None):
+        """Send a complete JSON response"""
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def send_event(self, data):
+        """Send one server-sent event as an HTTP chunk"""
+        event = f"data: {data}\n\n".encode('utf-8')
+        self.wfile.write(f"{len(event):x}\r\n".encode('ascii') + event + b"\r\n")
+        self.wfile.flush()
+    
+    def do_GET(self):
+        if self.path.rstrip('/').endswith('/fake/stats'):
+            self.send_json(200, self.fake.stats())
+        elif self.path.rstrip('/').endswith('/models'):
+            self.send_json(200, {"object": "list", "data": [{"id": "fake-model", "object": "model", "owned_by": "local"}]})
+        else:
+            self.send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+    
+    def do_POST(self):
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        except ValueError:
+            self.send_json(400, {"error": {"message": "Invalid JSON", "type": "invalid_request_error"}})
+            return
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self.send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+            return
+        
+        delay, error = self.fake.plan()
+        time.sleep(delay)
+        if error is not None:
+            status, message, headers = error
+            self.send_json(status, {"error": {"message": message, "type": "server_error"}}, headers)
+            return
+        
+        try:
+            if request.get('stream'):
+                self.stream_completion(request)
+            else:
+                self.send_completion(request)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client cancelled the request
+            self.close_connection = True
+    
+    def usage(self, request, completion_tokens):
+        """Usage block for a request, counting the prompt locally"""
+        prompt_tokens = sum(count_tokens(message.get('content') or '') for message in request.get('messages', []))
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens, "prompt_tokens_details": {"cached_tokens": 0}}
+    
+    def pace(self, tokens):
+        """Wait as long as generating this many tokens takes at the configured rate"""
+        if self.fake.tokens_per_second > 0:
+            time.sleep(tokens / self.fake.tokens_per_second)
+    
+    def send_completion(self, request):
+        """Answer with n complete choices once they have all been 'generated'"""
+        choices = [self.fake.completion_text(request.get('max_tokens'), i) for i in range(request.get('n', 1))]
+        completion_tokens = sum(len(tokens) for tokens in choices)
+        self.pace(max(len(tokens) for tokens in choices))
+        self.send_json(200, {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get('model', 'fake-model'),
+            "choices": [{"index": i, "message": {"role": "assistant", "content": ''.join(tokens)},
+                         "finish_reason": "stop"} for i, tokens in enumerate(choices)],
+            "usage": self.usage(request, completion_tokens)
+        })
+    
+    def stream_completion(self, request):
+        """Stream one choice token by token, then the usage chunk if asked for, then [DONE]"""
+        tokens = self.fake.completion_text(request.get('max_tokens'))
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        
+        chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                 "model": request.get('model', 'fake-model')}
+        for token in tokens:
+            self.pace(1)
+            self.send_event(json.dumps({**chunk, "choices": [{"index": 0, "delta": {"content": token},
+                                                              "finish_reason": None}]}))
+        if (request.get('stream_options') or {}).get('include_usage'):
+            self.send_event(json.dumps({**chunk, "choices": [], "usage": self.usage(request, len(tokens))}))
+        self.send_event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+def _serve(settings, ready):
+    """Process target: serve until terminated, reporting the URL through the ready queue"""
+    server = FakeLLMServer(**settings)
+    ready.put(server.url)
+    server.httpd.serve_forever()
+
+class FakeLLMProcess:
+    """FakeLLMServer in a child process, so its own CPU use does not slow the process being measured"""
+    
+    def __init__(self, **settings):
+        self.settings = settings
+        self.url = None
+        self._process = None
+    
+    def start(self):
+        """Start the server process and wait until it is listening"""
+        ready = multiprocessing.Queue()
+        self._process = multiprocessing.Process(target=_serve, args=(self.settings, ready), daemon=True)
+        self._process.start()
+        self.url = ready.get(timeout=30)
+        return self
+    
+    def stats(self):
+        """The server's counters (see FakeLLMServer.stats)"""
+        with urllib.request.urlopen(f"{self.url}/fake/stats", timeout=10) as response:
+            return json.load(response)
+    
+    def stop(self):
+        """Stop the server process"""
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join()
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, *exc_info):
+        self.stop()
+
+def main():
+    """Run the fake server until interrupted"""
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stub server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=float, default=DEFAULT_LATENCY, help="seconds before the first token")
+    parser.add_argument('--jitter', type=float, default=DEFAULT_JITTER, help="random +/- seconds added to the latency")
+    parser.add_argument('--tokens-per-second', type=float, default=DEFAULT_TOKENS_PER_SECOND,
+                        help="generation speed (0 for instant)")
+    parser.add_argument('--completion-tokens', type=int, default=DEFAULT_COMPLETION_TOKENS)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of requests answered with 429/500/503")
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+    
+    server = FakeLLMServer(args.host, args.port, args.latency, args.jitter, args.tokens_per_second,
+                           args.completion_tokens, args.error_rate, args.seed)
+    print(f"Fake OpenAI API at {server.url} (set OPENAI_BASE_URL to this); Ctrl+C to stop")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(f"Served {server.requests} requests ({server.errors} failed on purpose) "
+              f"over {server.connections} connections")
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,16 @@
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
-import sqlite3
 import datetime
 from error_handler import log_error
+from db_pool import get_connection
+from search_index import find_submissions, find_approved_statements
+from paged_tree import get_pager, stop_paging
 from utils import format_timestamp, truncate_text
 
+# Listing columns for the paged history and library views; previews only need the first 51 characters
+SUBMISSION_PAGE_COLUMNS = "id, timestamp, status, target_audience, tone, substr(original_text, 1, 51)"
+APPROVED_PAGE_COLUMNS = "id, timestamp, topic, tone, substr(published_text, 1, 51)"
+
 def create_history_window(root, callbacks):
     """Create and manage the history window"""
     try:
@@ -97,36 +103,17 @@ def create_history_window(root, callbacks):
         log_error("Open history error", e)
         return None, None
 
+def format_submission_row(row):
+    """Treeview values for a submissions page row"""
+    id, timestamp, status, audience, tone, original = row
+    
+    # Preview of original text (first 50 chars)
+    return (id, format_timestamp(timestamp), status, audience, tone, truncate_text(original, 50))
+
 def load_submissions(tree):
-    """Load submissions into the treeview"""
+    """Load submissions into the treeview, newest first, a page at a time as it is scrolled"""
     try:
-        # Clear existing items
-        for item in tree.get_children():
-            tree.delete(item)
-            
-        conn = sqlite3.connect('mp_rewriter.db')
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-        SELECT id, timestamp, status, target_audience, tone, original_text, generated_text 
-        FROM submissions
-        ORDER BY timestamp DESC
-        LIMIT 100
-        """)
-        
-        for row in cursor.fetchall():
-            id, timestamp, status, audience, tone, original, generated = row
-            
-            # Format the timestamp
-            formatted_time = format_timestamp(timestamp)
-            
-            # Preview of original text (first 50 chars)
-            preview = truncate_text(original, 50)
-            
-            tree.insert('', tk.END, values=(id, formatted_time, status, audience, tone, preview))
-            
-        conn.close()
-        
+        get_pager(tree, 'submissions', SUBMISSION_PAGE_COLUMNS, format_submission_row).reload()
     except Exception as e:
         messagebox.showerror("Database Error", f"Failed to load submissions: {str(e)}")
         log_error("Load submissions error", e)
@@ -134,6 +121,9 @@ def load_submissions(tree):
 def search_submissions(tree, search_text, search_field):
     """Search submissions based on criteria"""
     try:
+        # Search results replace the paged listing
+        stop_paging(tree)
+        
         # Clear existing items
         for item in tree.get_children():
             tree.delete(item)
@@ -141,58 +131,17 @@ def search_submissions(tree, search_text, search_field):
         if not search_text:
             load_submissions(tree)
             return
-            
-        conn = sqlite3.connect('mp_rewriter.db')
-        cursor = conn.cursor()
-        
-        # Build query based on search field
-        if search_field == "All Fields":
-            query = """
-            SELECT id, timestamp, status, target_audience, tone, original_text, generated_text 
-            FROM submissions
-            WHERE original_text LIKE ? OR generated_text LIKE ? OR target_audience LIKE ? OR status LIKE ? OR tone LIKE ?
-            ORDER BY timestamp DESC
-            """
-            params = ('%' + search_text + '%',) * 5
-        elif search_field == "Content":
-            query = """
-            SELECT id, timestamp, status, target_audience, tone, original_text, generated_text 
-            FROM submissions
-            WHERE original_text LIKE ? OR generated_text LIKE ?
-            ORDER BY timestamp DESC
-            """
-            params = ('%' + search_text + '%', '%' + search_text + '%')
-        else:
-            # Map UI fields to database fields
-            field_map = {
-                "Audience": "target_audience",
-                "Status": "status",
-                "Tone": "tone"
-            }
-            db_field = field_map.get(search_field, "target_audience")
-            
-            query = f"""
-            SELECT id, timestamp, status, target_audience, tone, original_text, generated_text 
-            FROM submissions
-            WHERE {db_field} LIKE ?
-            ORDER BY timestamp DESC
-            """
-            params = ('%' + search_text + '%',)
         
-        cursor.execute(query, params)
+        # Ranked full-text search; the preview shows the matched passage
+        rows = find_submissions(search_text, search_field)
         
-        for row in cursor.fetchall():
-            id, timestamp, status, audience, tone, original, generated = row
+        for row in rows:
+            id, timestamp, status, audience, tone, original, generated, snippet = row
             
             # Format the timestamp
             formatted_time = format_timestamp(timestamp)
             
-            # Preview of original text (first 50 chars)
-            preview = truncate_text(original, 50)
-            
-            tree.insert('', tk.END, values=(id, formatted_time, status, audience, tone, preview))
-            
-        conn.close()
+            tree.insert('', tk.END, values=(id, formatted_time, status, audience, tone, snippet))
         
     except Exception as e:
         messagebox.showerror("Search Error", f"Failed to search submissions: {str(e)}")
@@ -205,17 +154,16 @@ def view_submission_details(root, submission_id):
             messagebox.showwarning("No Selection", "Please select a submission to view.")
             return
             
-        conn = sqlite3.connect('mp_rewriter.db')
-        cursor = conn.cursor()
+        with get_connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute("""
-        SELECT original_text, context, target_audience, tone, generated_text, status, timestamp, notes
-        FROM submissions
-        WHERE id = ?
-        """, (submission_id,))
+            cursor.execute("""
+            SELECT original_text, context, target_audience, tone, generated_text, status, timestamp, notes
+            FROM submissions
+            WHERE id = ?
+            """, (submission_id,))
         
-        result = cursor.fetchone()
-        conn.close()
+            result = cursor.fetchone()
         
         if not result:
             messagebox.showwarning("Not Found", f"Submission #{submission_id} not found.")
@@ -394,35 +342,18 @@ def create_approved_statements_window(root, callbacks):
         log_error("View approved statements error", e)
         return None, None
 
+def format_approved_row(row):
+    """Treeview values for a past_responses page row"""
+    id, timestamp, topic, tone, text = row
+    
+    # Preview of text
+    return (id, format_timestamp(timestamp, "%d %b %Y"), topic or "General", tone or "Not specified",
+            truncate_text(text, 50))
+
 def load_approved_statements(tree):
-    """Load approved statements into the treeview"""
+    """Load approved statements into the treeview, newest first, a page at a time as it is scrolled"""
     try:
-        # Clear existing items
-        for item in tree.get_children():
-            tree.delete(item)
-            
-        conn = sqlite3.connect('mp_rewriter.db')
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-        SELECT id, timestamp, topic, tone, published_text 
-        FROM past_responses
-        ORDER BY timestamp DESC
-        """)
-        
-        for row in cursor.fetchall():
-            id, timestamp, topic, tone, text = row
-            
-            # Format the timestamp
-            formatted_time = format_timestamp(timestamp, "%d %b %Y")
-            
-            # Preview of text
-            preview = truncate_text(text, 50)
-            
-            tree.insert('', tk.END, values=(id, formatted_time, topic or "General", tone or "Not specified", preview))
-            
-        conn.close()
-        
+        get_pager(tree, 'past_responses', APPROVED_PAGE_COLUMNS, format_approved_row).reload()
     except Exception as e:
         messagebox.showerror("Database Error", f"Failed to load approved statements: {str(e)}")
         log_error("Load approved statements error", e)
@@ -430,6 +361,9 @@ def load_approved_statements(tree):
 def search_approved_statements(tree, search_text, search_field):
     """Search approved statements based on criteria"""
     try:
+        # Search results replace the paged listing
+        stop_paging(tree)
+        
         # Clear existing items
         for item in tree.get_children():
             tree.delete(item)
@@ -438,57 +372,17 @@ def search_approved_statements(tree, search_text, search_field):
             # Reload all
             load_approved_statements(tree)
             return
-            
-        conn = sqlite3.connect('mp_rewriter.db')
-        cursor = conn.cursor()
-        
-        # Build query based on search field
-        if search_field == "All Fields":
-            query = """
-            SELECT id, timestamp, topic, tone, published_text 
-            FROM past_responses
-            WHERE published_text LIKE ? OR topic LIKE ? OR tone LIKE ?
-            ORDER BY timestamp DESC
-            """
-            params = ('%' + search_text + '%',) * 3
-        elif search_field == "Content":
-            query = """
-            SELECT id, timestamp, topic, tone, published_text 
-            FROM past_responses
-            WHERE published_text LIKE ?
-            ORDER BY timestamp DESC
-            """
-            params = ('%' + search_text + '%',)
-        else:
-            # Map UI fields to database fields
-            field_map = {
-                "Topic": "topic",
-                "Tone": "tone"
-            }
-            db_field = field_map.get(search_field, "topic")
-            
-            query = f"""
-            SELECT id, timestamp, topic, tone, published_text 
-            FROM past_responses
-            WHERE {db_field} LIKE ?
-            ORDER BY timestamp DESC
-            """
-            params = ('%' + search_text + '%',)
         
-        cursor.execute(query, params)
+        # Ranked full-text search; the preview shows the matched passage
+        rows = find_approved_statements(search_text, search_field)
         
-        for row in cursor.fetchall():
-            id, timestamp, topic, tone, text = row
+        for row in rows:
+            id, timestamp, topic, tone, text, snippet = row
             
             # Format the timestamp
             formatted_time = format_timestamp(timestamp, "%d %b %Y")
             
-            # Preview of text
-            preview = truncate_text(text, 50)
-            
-            tree.insert('', tk.END, values=(id, formatted_time, topic or "General", tone or "Not specified", preview))
-            
-        conn.close()
+            tree.insert('', tk.END, values=(id, formatted_time, topic or "General", tone or "Not specified", snippet))
         
     except Exception as e:
         messagebox.showerror("Search Error", f"Failed to search statements: {str(e)}")
@@ -501,17 +395,16 @@ def view_approved_statement_details(root, statement_id, callbacks):
             messagebox.showwarning("No Selection", "Please select a statement to view.")
             return None
             
-        conn = sqlite3.connect('mp_rewriter.db')
-        cursor = conn.cursor()
+        with get_connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute("""
-        SELECT published_text, topic, tone, timestamp, source, tags
-        FROM past_responses
-        WHERE id = ?
-        """, (statement_id,))
+            cursor.execute("""
+            SELECT published_text, topic, tone, timestamp, source, tags
+            FROM past_responses
+            WHERE id = ?
+            """, (statement_id,))
         
-        result = cursor.fetchone()
-        conn.close()
+            result = cursor.fetchone()
         
         if not result:
             messagebox.showwarning("Not Found", f"Statement #{statement_id} not found.")
@@ -0,0 +1,213 @@
+import heapq
+import itertools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from error_handler import log_error
+
+# Lower numbers run first when every worker is busy
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+PRIORITY_SPECULATIVE = 20
+
+DEFAULT_MAX_WORKERS = 4
+
+# Workers of the shared executor kept free of background and speculative jobs, so a
+# generation starts at once even while start-up work or an import fills the others
+INTERACTIVE_RESERVED_WORKERS = 1
+
+# How long shutdown waits for running jobs to notice cancellation
+DEFAULT_SHUTDOWN_TIMEOUT = 5.0
+
+class JobCancelled(Exception):
+    """Raised by a job that stops early because it was cancelled"""
+
+class CancellationToken:
+    """Cooperative cancellation flag checked by long-running jobs"""
+    
+    def __init__(self):
+        self._event = threading.Event()
+    
+    def cancel(self):
+        """Ask the job to stop"""
+        self._event.set()
+    
+    @property
+    def cancelled(self):
+        """Whether cancellation has been requested"""
+        return self._event.is_set()
+    
+    def wait(self, timeout):
+        """Sleep up to timeout seconds, waking early on cancellation; True if cancelled"""
+        return self._event.wait(timeout)
+    
+    def raise_if_cancelled(self):
+        """Raise JobCancelled once cancellation has been requested"""
+        if self._event.is_set():
+            raise JobCancelled()
+
+class Job:
+    """Handle to a submitted job: its future, cancellation token and priority"""
+    
+    def __init__(self, fn, args, kwargs, priority, name):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.name = name or getattr(fn, '__name__', 'job')
+        self.future = Future()
+        self.token = CancellationToken()
+    
+    def cancel(self):
+        """Cancel a queued job outright, or signal a running one to stop"""
+        self.token.cancel()
+        return self.future.cancel()
+    
+    def done(self):
+        """Whether the job has finished, failed or been cancelled"""
+        return self.future.done()
+    
+    def result(self, timeout=None):
+        """Wait for and return the job's result"""
+        return self.future.result(timeout)
+
+_local = threading.local()
+
+def current_token():
+    """Cancellation token of the job running on this thread (a fresh, unset token elsewhere)"""
+    token = getattr(_local, 'token', None)
+    return token if token is not None else CancellationToken()
+
+class JobExecutor:
+    """Bounded worker pool that runs queued jobs highest priority first
+
+    Priority only orders queued jobs, so reserved_workers of the pool are kept
+    for PRIORITY_INTERACTIVE jobs: lower-priority jobs wait in the queue once
+    the rest of the workers are busy with them.
+    """
+    
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, reserved_workers=0):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._queue = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._running = set()
+        self._shutdown = False
+        
+        # Lower-priority jobs running, and queued ones left without a pool task while at the limit
+        self._background_limit = max(1, max_workers - reserved_workers)
+        self._background_running = 0
+        self._parked = 0
+    
+    def submit(self, fn, *args, priority=PRIORITY_BACKGROUND, name=None, **kwargs):
+        """Queue fn(*args, **kwargs) and return its Job"""
+        job = Job(fn, args, kwargs, priority, name)
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("Job executor has been shut down")
+            heapq.heappush(self._queue, (priority, next(self._sequence), job))
+        
+        # One pool task per queued job; each task takes whichever job is most urgent
+        self._pool.submit(self._run_next)
+        return job
+    
+    def _run_next(self):
+        """Pool task: run the most urgent queued job"""
+        with self._lock:
+            while True:
+                if not self._queue:
+                    return
+                if self._queue[0][0] > PRIORITY_INTERACTIVE and self._background_running >= self._background_limit:
+                    # Leave the job queued; a finishing lower-priority job dispatches it
+                    self._parked += 1
+                    return
+                _, _, job = heapq.heappop(self._queue)
+                # Skip jobs cancelled while queued
+                if job.future.set_running_or_notify_cancel():
+                    break
+            self._running.add(job)
+            background = job.priority > PRIORITY_INTERACTIVE
+            if background:
+                self._background_running += 1
+        
+        _local.token = job.token
+        try:
+            result = job.fn(*job.args, **job.kwargs)
+        except JobCancelled as e:
+            job.future.set_exception(e)
+        except BaseException as e:
+            log_error(f"Background job '{job.name}' error", e)
+            job.future.set_exception(e)
+        else:
+            job.future.set_result(result)
+        finally:
+            _local.token = None
+            with self._lock:
+                self._running.discard(job)
+                resume = False
+                if background:
+                    self._background_running -= 1
+                    resume = self._parked > 0 and not self._shutdown
+                    if resume:
+                        self._parked -= 1
+            if resume:
+                try:
+                    self._pool.submit(self._run_next)
+                except RuntimeError:
+                    # Shut down in the meantime; queued jobs were cancelled
+                    pass
+    
+    def pending(self):
+        """Number of jobs waiting for a worker"""
+        with self._lock:
+            return len(self._queue)
+    
+    def running(self):
+        """Jobs currently executing"""
+        with self._lock:
+            return list(self._running)
+    
+    def shutdown(self, timeout=DEFAULT_SHUTDOWN_TIMEOUT):
+        """Cancel queued jobs, signal running ones, and wait up to timeout for them to finish
+
+        Returns True if every running job finished in time.
+        """
+        with self._lock:
+            if self._shutdown:
+                return not self._running
+            self._shutdown = True
+            queued = [job for _, _, job in self._queue]
+            self._queue.clear()
+            running = list(self._running)
+        
+        for job in queued:
+            job.cancel()
+        for job in running:
+            job.token.cancel()
+        
+        _, not_done = wait([job.future for job in running], timeout=timeout)
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        return not not_done
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    """Get the process-wide job executor"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = JobExecutor(reserved_workers=INTERACTIVE_RESERVED_WORKERS)
+    return _executor
+
+def submit_job(fn, *args, priority=PRIORITY_BACKGROUND, name=None, **kwargs):
+    """Queue a job on the shared executor"""
+    return get_executor().submit(fn, *args, priority=priority, name=name, **kwargs)
+
+def shutdown_executor(timeout=DEFAULT_SHUTDOWN_TIMEOUT):
+    """Stop the shared executor, waiting up to timeout for running jobs"""
+    with _executor_lock:
+        executor = _executor
+    if executor is None:
+        return True
+    return executor.shutdown(timeout)
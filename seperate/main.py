@@ -2,30 +2,23 @@ import tkinter as tk
 from tkinter import messagebox
 import sys
 import os
-import traceback
-import datetime
+import time
 from mp_rewriter_app import MPStatementRewriter
-from error_handler import log_error
+from error_handler import LOG_FILE, log_error, log_unhandled
+from job_executor import DEFAULT_SHUTDOWN_TIMEOUT, get_executor, shutdown_executor
+from async_client import shutdown_async_backend
 
 def main():
     """Main function to start the application"""
     # Set up exception handler to catch unhandled exceptions
     def handle_exception(exc_type, exc_value, exc_traceback):
         """Handle uncaught exceptions"""
-        # Log the error
-        error_details = "".join(traceback.format_exception(exc_type, exc_value, exc_traceback))
-        
-        try:
-            # Write to error log
-            with open("error_log.txt", "a") as log_file:
-                log_file.write(f"\n\n--- Unhandled Error {datetime.datetime.now()} ---\n")
-                log_file.write(error_details)
-        except:
-            pass
+        # Log the error (queued; written by the error log's background thread)
+        log_unhandled(exc_type, exc_value, exc_traceback)
         
         # Show error dialog
         messagebox.showerror("Application Error", 
-                           "An unexpected error occurred. Please check error_log.txt for details.\n\n" + 
+                           f"An unexpected error occurred. Please check {LOG_FILE} for details.\n\n" + 
                            str(exc_value))
     
     # Set up exception hook
@@ -79,13 +72,28 @@ def main():
         position_down = int(root.winfo_screenheight()/2 - window_height/2)
         root.geometry(f"+{position_right}+{position_down}")
         
+        # Stop background jobs before closing, keeping the event loop running
+        # so jobs that are finishing can still post their UI updates
+        def close_when_idle(deadline):
+            if get_executor().running() and time.monotonic() < deadline:
+                root.after(100, close_when_idle, deadline)
+            else:
+                shutdown_async_backend(timeout=1.0)
+                root.destroy()
+        
+        def shut_down():
+            root.protocol("WM_DELETE_WINDOW", lambda: None)
+            app.status_var.set("Finishing background work...")
+            shutdown_executor(timeout=0)
+            close_when_idle(time.monotonic() + DEFAULT_SHUTDOWN_TIMEOUT)
+        
         # Add window close confirmation if there are unsaved changes
         def on_closing():
             if app.current_submission_id and messagebox.askyesno("Confirm Exit", 
                                                             "You have unsaved changes. Are you sure you want to exit?"):
-                root.destroy()
+                shut_down()
             elif not app.current_submission_id:
-                root.destroy()
+                shut_down()
         
         root.protocol("WM_DELETE_WINDOW", on_closing)
         
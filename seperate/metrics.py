@@ -0,0 +1,194 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from error_handler import log_error
+
+# Recent samples kept per metric; percentiles describe this window, not the whole session
+ROLLING_WINDOW = 500
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+HISTOGRAM_BUCKETS_MS = (10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+# Persisted samples are written together once this many are waiting or this many seconds have passed
+PERSIST_BATCH_SIZE = 50
+PERSIST_INTERVAL = 10.0
+
+# Persisted samples older than this are deleted as new ones are written
+METRICS_RETENTION_DAYS = 30
+
+METRICS_DDL = [
+    '''
+    CREATE TABLE IF NOT EXISTS metrics (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        recorded REAL NOT NULL,
+        name TEXT NOT NULL,
+        value REAL NOT NULL
+    )
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS idx_metrics_recorded ON metrics(recorded)
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS idx_metrics_name ON metrics(name, recorded)
+    '''
+]
+
+def create_metrics_table(conn):
+    """Create the table persisted timing samples are written to"""
+    for statement in METRICS_DDL:
+        conn.execute(statement)
+
+def latency_summary(values):
+    """p50, p95, p99, mean and max of a list of milliseconds"""
+    values = sorted(values)
+    if not values:
+        return {}
+    
+    def pick(fraction):
+        return round(values[min(len(values) - 1, int(len(values) * fraction))], 2)
+    
+    return {'p50': pick(0.50), 'p95': pick(0.95), 'p99': pick(0.99), 'mean': round(sum(values) / len(values), 2),
+            'max': round(values[-1], 2)}
+
+def histogram(values, bounds=HISTOGRAM_BUCKETS_MS):
+    """Count of values up to each bound, plus a last count of those above every bound"""
+    counts = [0] * (len(bounds) + 1)
+    for value in values:
+        for index, bound in enumerate(bounds):
+            if value <= bound:
+                counts[index] += 1
+                break
+        else:
+            counts[-1] += 1
+    return counts
+
+class Metrics:
+    """Rolling in-memory samples of named timings and counts, optionally persisted
+
+    Names are dotted, operation first: 'generation.api' is the API stage of
+    a generation, 'refresh.total' a whole refresh. Timings are milliseconds;
+    names ending in '_tokens' hold token counts instead.
+    """
+    
+    def __init__(self, window=ROLLING_WINDOW, persist=False):
+        self.window = window
+        self.persist = persist
+        self._samples = {}
+        self._counts = {}
+        self._pending = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def record(self, name, value):
+        """Add one sample of a metric"""
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.window)
+            samples.append(value)
+            self._counts[name] = self._counts.get(name, 0) + 1
+            
+            flush = False
+            if self.persist:
+                self._pending.append((time.time(), name, value))
+                flush = (len(self._pending) >= PERSIST_BATCH_SIZE
+                         or time.monotonic() - self._last_flush >= PERSIST_INTERVAL)
+        if flush:
+            self.flush()
+    
+    @contextmanager
+    def span(self, name):
+        """Time the body of a with block as one sample of name (skipped if the body raises)"""
+        started = time.perf_counter()
+        yield
+        self.record(name, (time.perf_counter() - started) * 1000)
+    
+    def samples(self, name):
+        """Recent samples of a metric, oldest first"""
+        with self._lock:
+            return list(self._samples.get(name, ()))
+    
+    def summary(self):
+        """Per metric: samples recorded this session, then latency_summary of the recent ones"""
+        with self._lock:
+            snapshot = {name: (self._counts[name], list(samples)) for name, samples in self._samples.items()}
+        return {name: {'count': count, **latency_summary(values)} for name, (count, values) in sorted(snapshot.items())}
+    
+    def reset(self):
+        """Forget every in-memory sample (persisted ones are kept)"""
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+    
+    def configure(self, persist):
+        """Turn writing samples to the metrics table on or off"""
+        if not persist:
+            self.flush()
+        with self._lock:
+            self.persist = persist
+    
+    def flush(self):
+        """Queue the samples waiting to be persisted as one write job"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+        
+        # Imported here because db_writer records its own timings through this module
+        from db_writer import submit_write
+        
+        def store(conn):
+            conn.executemany("INSERT INTO metrics (recorded, name, value) VALUES (?, ?, ?)", pending)
+            conn.execute("DELETE FROM metrics WHERE recorded < ?", (time.time() - METRICS_RETENTION_DAYS * 86400,))
+        
+        try:
+            submit_write(store)
+        except Exception as e:
+            log_error("Metrics persist error", e)
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+def get_metrics():
+    """Get the process-wide metrics"""
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = Metrics()
+    return _metrics
+
+def configure_metrics(persist):
+    """Set whether samples are also written to the metrics table ([DIAGNOSTICS] PERSIST_METRICS)"""
+    get_metrics().configure(persist)
+
+def record(name, value):
+    """Add one sample to the process-wide metrics"""
+    get_metrics().record(name, value)
+
+def span(name):
+    """Context manager timing its body into the process-wide metrics"""
+    return get_metrics().span(name)
+
+def flush_metrics():
+    """Queue samples waiting to be persisted (called before the database writer closes)"""
+    if _metrics is not None:
+        _metrics.flush()
+
+def is_latency(name):
+    """Whether a metric holds milliseconds (token counts end in '_tokens')"""
+    return not name.endswith('_tokens')
+
+def summary_row(name, stats):
+    """Table values for one metric of Metrics.summary: name, samples, p50, p95, p99, mean, max"""
+    digits = 1 if is_latency(name) else 0
+    return (name, stats['count'], *(f"{stats[key]:.{digits}f}" for key in ('p50', 'p95', 'p99', 'mean', 'max')))
+
+def histogram_text(name, values):
+    """Recent samples of a latency per histogram bucket, leaving out empty buckets"""
+    if not is_latency(name):
+        return ""
+    labels = [f"<={bound} ms" for bound in HISTOGRAM_BUCKETS_MS] + [f">{HISTOGRAM_BUCKETS_MS[-1]} ms"]
+    return "   ".join(f"{label}: {count}" for label, count in zip(labels, histogram(values)) if count)
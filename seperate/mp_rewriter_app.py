@@ -1,21 +1,34 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import os
-import threading
-import csv
-import sqlite3
+import time
 from tkinter import scrolledtext
 
 # Import custom modules
 from error_handler import log_error
-from database_manager import initialize_database, log_submission, get_past_responses, update_submission_status, get_submission_by_id, save_accepted_statement
-from ui_components import setup_styles, create_menu, create_input_panel, create_output_panel, create_status_bar
-from api_manager import ApiManager
-from system_prompt import construct_prompt, construct_refresh_prompt
+from database_manager import (initialize_database, log_submission, log_submission_variants, update_submission_status, 
+                              get_submission_by_id, get_accepted_submission, save_accepted_statement)
+from db_pool import get_connection
+from db_writer import get_writer
+from example_sampler import sample_library, sample_submissions
+from example_retriever import retrieve_examples, warm_up
+from job_executor import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, current_token, submit_job
+from token_stream import TokenStream, pump_stream
+from response_cache import get_response_cache
+from ui_components import (MAX_VARIANTS, setup_styles, create_menu, create_input_panel, create_output_panel,
+                           create_status_bar, create_variants_window, create_diagnostics_window)
+from api_manager import GENERATION_PARAMS, ApiManager
+from prompt_budget import DEFAULT_PROMPT_TOKEN_BUDGET, fit_prompt, get_prompt_usage, prompt_token_budget
+from speculative_refresh import SpeculativeRefresh
+from dedupe import collapse_duplicates
+from statement_import import DEFAULT_CHUNK_SIZE, ImportFormatError, import_statements, near_duplicate_report
+from near_duplicates import cluster_statements, sync_index
+from prompt_templates import construct_prompt, construct_refresh_prompt, system_message
+from metrics import configure_metrics, get_metrics, record, span
 from history_manager import (create_history_window, load_submissions, search_submissions, 
                           view_submission_details, create_approved_statements_window, 
                           search_approved_statements, view_approved_statement_details)
-from config_manager import save_api_settings
+from config_manager import get_config_flag, get_config_value, save_api_settings
 from sample_data import populate_sample_data
 from utils import update_word_count, copy_to_clipboard
 
@@ -31,6 +44,20 @@ class MPStatementRewriter:
         self.status_var = tk.StringVar()
         self.status_var.set("Ready")
         
+        # Response cache counters shown in the status bar
+        self.cache_var = tk.StringVar()
+        self.cache_var.set(get_response_cache().status_text())
+        
+        # Drafts per generation, and the other drafts of a multi-draft generation
+        self.variant_count = tk.StringVar()
+        self.variant_count.set("1")
+        self.variant_siblings = []
+        
+        # Optional background generation of the next refresh draft
+        self.speculative_refresh = tk.BooleanVar()
+        self.speculative_refresh.set(get_config_flag('GENERATION', 'SPECULATIVE_REFRESH'))
+        self.speculation = SpeculativeRefresh()
+        
         # Word count variables
         self.raw_word_count = tk.StringVar()
         self.raw_word_count.set("Words: 0")
@@ -52,6 +79,7 @@ class MPStatementRewriter:
         self.tone_var = None
         self.notes = None
         self.generated_statement = None
+        self.last_time_to_first_token = None
         self.accept_button = None
         self.refresh_button = None
         self.edit_button = None
@@ -80,6 +108,9 @@ class MPStatementRewriter:
         # Initialize database first
         initialize_database()
         
+        # Stage timings are kept in memory, and also written to the metrics table if enabled
+        configure_metrics(get_config_flag('DIAGNOSTICS', 'PERSIST_METRICS'))
+        
         # Initialize OpenAI API
         self.api_manager = ApiManager()
         
@@ -90,7 +121,16 @@ class MPStatementRewriter:
         self.create_ui()
         
         # Load sample data if needed (moved after database initialization)
-        threading.Thread(target=populate_sample_data).start()
+        submit_job(populate_sample_data, priority=PRIORITY_BACKGROUND, name="sample-data")
+        
+        # Collapse library duplicates left by older versions (a no-op once every row is hashed)
+        submit_job(collapse_duplicates, priority=PRIORITY_BACKGROUND, name="dedupe")
+        
+        # Bring the near-duplicate index up to date with statements added since the last run
+        submit_job(sync_index, priority=PRIORITY_BACKGROUND, name="near-duplicates")
+        
+        # Build the example retrieval index in the background
+        submit_job(warm_up, priority=PRIORITY_BACKGROUND, name="warm-up")
 
     def create_ui(self):
         """Create the user interface"""
@@ -114,8 +154,10 @@ class MPStatementRewriter:
                 'open_history': self.open_history,
                 'view_approved_statements': self.view_approved_statements,
                 'import_past_statements': self.import_past_statements,
+                'find_near_duplicates': self.find_near_duplicates,
                 'open_settings': self.open_settings,
                 'show_user_guide': self.show_user_guide,
+                'show_diagnostics': self.show_diagnostics,
                 'show_about': self.show_about
             }
             
@@ -131,7 +173,8 @@ class MPStatementRewriter:
             
             # Create the input panel
             input_widgets = create_input_panel(left_frame, 
-                                            {'raw_word_count': self.raw_word_count}, 
+                                            {'raw_word_count': self.raw_word_count, 'variant_count': self.variant_count,
+                                             'speculative_refresh': self.speculative_refresh}, 
                                             input_callbacks)
             
             # Set up output panel callbacks
@@ -164,7 +207,7 @@ class MPStatementRewriter:
             self.copy_button = output_widgets['copy_button']
             
             # Status bar
-            create_status_bar(self.root, self.status_var)
+            create_status_bar(self.root, self.status_var, self.cache_var)
         except Exception as e:
             messagebox.showerror("UI Error", f"Failed to create UI: {str(e)}")
             log_error("UI creation error", e)
@@ -188,6 +231,8 @@ class MPStatementRewriter:
                 self.notes.delete(0, tk.END)
                 self.generated_statement.delete("1.0", tk.END)
                 self.current_submission_id = None
+                self.variant_siblings = []
+                self.speculation.discard()
                 self.accept_button.config(state=tk.DISABLED)
                 self.refresh_button.config(state=tk.DISABLED)
                 self.edit_button.config(state=tk.DISABLED)
@@ -329,6 +374,7 @@ class MPStatementRewriter:
             
             # Set current submission ID
             self.current_submission_id = submission_id
+            self.speculation.discard()
             
             # Close history window if it exists
             if self.history_window and self.history_window.winfo_exists():
@@ -435,9 +481,10 @@ class MPStatementRewriter:
             # Update GUI
             import_window.update()
             
-            # Run import in thread
-            threading.Thread(target=self.perform_import, 
-                           args=(file_path, progress_text, progress_bar, status_label, close_button, import_window)).start()
+            # Run import on the background pool; closing the window cancels it
+            job = submit_job(self.perform_import, file_path, progress_text, progress_bar, status_label, close_button,
+                             import_window, priority=PRIORITY_BACKGROUND, name="import")
+            import_window.protocol("WM_DELETE_WINDOW", lambda: [job.cancel(), import_window.destroy()])
             
         except Exception as e:
             messagebox.showerror("Import Error", f"Failed to import statements: {str(e)}")
@@ -445,127 +492,84 @@ class MPStatementRewriter:
 
     def perform_import(self, file_path, progress_text, progress_bar, status_label, close_button, window):
         """Perform the actual import operation"""
+        def show_progress(progress):
+            # Runs on the import thread at most every PROGRESS_INTERVAL; hand the Tk work to the main loop
+            if progress.cancelled:
+                # The import window has been closed
+                return
+            messages = progress.take_messages()
+            if progress.finished:
+                messages.append(f"\nImport completed in {progress.elapsed:.1f}s ({progress.rows_per_second:.0f} rows/sec):\n"
+                                f"- {progress.imported} statements imported successfully\n"
+                                f"- {progress.duplicates} duplicates of statements already in the library skipped\n"
+                                f"- {progress.skipped} empty rows skipped\n- {progress.errors} errors encountered")
+                status = f"Import completed: {progress.imported} statements imported"
+            else:
+                messages.append(f"Read {progress.rows_read} rows, {progress.imported} imported, "
+                                f"{progress.duplicates} duplicates "
+                                f"({progress.rows_per_second:.0f} rows/sec)")
+                status = f"Importing... {progress.fraction:.0%} ({progress.rows_read} rows)"
+            fraction, finished = progress.fraction, progress.finished
+            window.after(0, lambda: [
+                progress_text.insert(tk.END, '\n'.join(messages) + '\n'),
+                progress_text.see(tk.END),
+                progress_bar.config(value=fraction * 100),
+                status_label.config(text=status),
+                close_button.config(state=tk.NORMAL if finished else tk.DISABLED)
+            ])
+        
         try:
-            # Read CSV file
-            with open(file_path, 'r', encoding='utf-8') as file:
-                reader = csv.reader(file)
-                
-                # Get header row
-                headers = next(reader)
-                
-                # Try to map columns
-                col_map = {}
-                required_cols = ['text', 'topic']
-                
-                for i, header in enumerate(headers):
-                    header_lower = header.lower().strip()
-                    
-                    if 'text' in header_lower or 'statement' in header_lower or 'content' in header_lower:
-                        col_map['text'] = i
-                    elif 'topic' in header_lower or 'subject' in header_lower or 'category' in header_lower:
-                        col_map['topic'] = i
-                    elif 'tone' in header_lower:
-                        col_map['tone'] = i
-                    elif 'date' in header_lower or 'time' in header_lower:
-                        col_map['timestamp'] = i
-                    elif 'source' in header_lower:
-                        col_map['source'] = i
-                    elif 'tag' in header_lower:
-                        col_map['tags'] = i
-                
-                # Validate required columns
-                missing = [col for col in required_cols if col not in col_map]
-                if missing:
-                    window.after(0, lambda: [
-                        progress_text.insert(tk.END, f"Error: Missing required columns: {', '.join(missing)}\n"),
-                        progress_text.see(tk.END),
-                        status_label.config(text="Import failed: Missing required columns"),
-                        close_button.config(state=tk.NORMAL)
-                    ])
-                    return
-                
-                # Read all rows to get count
-                all_rows = list(reader)
-                total_rows = len(all_rows)
-                
-                window.after(0, lambda: [
-                    progress_text.insert(tk.END, f"Found {total_rows} statements to import\n"),
-                    progress_text.see(tk.END),
-                    progress_bar.config(maximum=total_rows)
-                ])
-                
-                # Connect to database
-                conn = sqlite3.connect('mp_rewriter.db')
-                cursor = conn.cursor()
-                
-                # Process each row
-                success_count = 0
-                error_count = 0
-                
-                for i, row in enumerate(all_rows):
-                    try:
-                        # Extract data using column mapping
-                        text = row[col_map['text']] if 'text' in col_map and len(row) > col_map['text'] else None
-                        topic = row[col_map['topic']] if 'topic' in col_map and len(row) > col_map['topic'] else None
-                        tone = row[col_map['tone']] if 'tone' in col_map and len(row) > col_map['tone'] else None
-                        timestamp = row[col_map['timestamp']] if 'timestamp' in col_map and len(row) > col_map['timestamp'] else None
-                        source = row[col_map['source']] if 'source' in col_map and len(row) > col_map['source'] else "Imported"
-                        tags = row[col_map['tags']] if 'tags' in col_map and len(row) > col_map['tags'] else None
-                        
-                        # Skip empty rows
-                        if not text or not text.strip():
-                            window.after(0, lambda i=i: [
-                                progress_text.insert(tk.END, f"Skipping row {i+1}: Empty text\n"),
-                                progress_text.see(tk.END),
-                                progress_bar.step(1)
-                            ])
-                            continue
-                        
-                        # Insert into database
-                        cursor.execute("""
-                        INSERT INTO past_responses (published_text, topic, tone, timestamp, source, tags)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                        """, (text, topic, tone, timestamp, source, tags))
-                        
-                        success_count += 1
-                        
-                        # Update progress every 10 rows
-                        if i % 10 == 0 or i == total_rows - 1:
-                            window.after(0, lambda i=i, sc=success_count: [
-                                progress_text.insert(tk.END, f"Imported {sc} statements so far... ({i+1}/{total_rows})\n"),
-                                progress_text.see(tk.END),
-                                progress_bar.step(10 if i % 10 == 0 else i % 10),
-                                status_label.config(text=f"Importing... ({i+1}/{total_rows})")
-                            ])
-                            
-                    except Exception as e:
-                        error_count += 1
-                        window.after(0, lambda i=i, e=str(e): [
-                            progress_text.insert(tk.END, f"Error in row {i+1}: {e}\n"),
-                            progress_text.see(tk.END),
-                            progress_bar.step(1)
-                        ])
-                
-                # Commit changes
-                conn.commit()
-                conn.close()
-                
-                # Final update
+            chunk_size = int(get_config_value('IMPORT', 'CHUNK_SIZE', DEFAULT_CHUNK_SIZE))
+            progress = import_statements(file_path, chunk_size, show_progress)
+            if progress.cancelled or not progress.imported:
+                return
+            
+            # The rows are in; flag any that are lightly edited copies of statements already held
+            window.after(0, lambda: [
+                progress_text.insert(tk.END, "\nChecking the imported statements for near-duplicates...\n"),
+                progress_text.see(tk.END)
+            ])
+            lines = near_duplicate_report(progress)
+            if not current_token().cancelled:
                 window.after(0, lambda: [
-                    progress_text.insert(tk.END, f"\nImport completed:\n- {success_count} statements imported successfully\n- {error_count} errors encountered\n"),
-                    progress_text.see(tk.END),
-                    status_label.config(text=f"Import completed: {success_count} statements imported"),
-                    close_button.config(state=tk.NORMAL)
+                    progress_text.insert(tk.END, '\n'.join(lines) + '\n'),
+                    progress_text.see(tk.END)
                 ])
-                
+        except ImportFormatError as e:
+            window.after(0, lambda message=str(e): [
+                progress_text.insert(tk.END, f"Error: {message}\n"),
+                progress_text.see(tk.END),
+                status_label.config(text="Import failed: Missing required columns"),
+                close_button.config(state=tk.NORMAL)
+            ])
         except Exception as e:
-            window.after(0, lambda: [
-                progress_text.insert(tk.END, f"Import failed: {str(e)}\n"),
+            window.after(0, lambda message=str(e): [
+                progress_text.insert(tk.END, f"Import failed: {message}\n"),
                 progress_text.see(tk.END),
                 status_label.config(text="Import failed"),
                 close_button.config(state=tk.NORMAL)
             ])
             log_error("Import execution error", e)
+    
+    def find_near_duplicates(self):
+        """Group near-duplicate statements in the background and report how many were found"""
+        self.status_var.set("Looking for near-duplicate statements...")
+        
+        def run():
+            try:
+                clusters, statements = cluster_statements()
+            except Exception as e:
+                log_error("Near-duplicate clustering error", e)
+                self.root.after(0, lambda: self.status_var.set("Near-duplicate check failed."))
+                return
+            message = (f"Found {clusters} groups of near-duplicate statements ({statements} statements in all)."
+                       if clusters else "No near-duplicate statements found.")
+            self.root.after(0, lambda: [
+                self.status_var.set(message),
+                messagebox.showinfo("Near-Duplicates", message)
+            ])
+        
+        submit_job(run, priority=PRIORITY_BACKGROUND, name="cluster")
 
     def open_settings(self):
         """Open settings dialog"""
@@ -588,11 +592,8 @@ class MPStatementRewriter:
             
             ttk.Label(api_frame, text="OpenAI API Key:", style='Header.TLabel').grid(row=0, column=0, sticky=tk.W, pady=(10, 5))
             
-            # Load current API key
-            import configparser
-            config = configparser.ConfigParser()
-            config.read('config.ini')
-            current_key = config['API']['OPENAI_API_KEY'] if 'API' in config and 'OPENAI_API_KEY' in config['API'] else ''
+            # Load current API key (from the environment or .env if set there)
+            current_key = get_config_value('API', 'OPENAI_API_KEY', '')
             
             # If it's the actual key, mask it
             masked_key = "•" * 20 + current_key[-5:] if current_key and current_key != 'your_api_key_here' else ''
@@ -706,6 +707,23 @@ For more detailed information, refer to the full documentation provided with the
             messagebox.showerror("Error", f"Failed to show user guide: {str(e)}")
             log_error("Show user guide error", e)
 
+    def show_diagnostics(self):
+        """Show recent stage latencies, token counts, cache hit rates and database write times"""
+        create_diagnostics_window(self.root, get_metrics(), self.diagnostics_lines)
+    
+    def diagnostics_lines(self):
+        """Cache and database counters shown under the diagnostics table"""
+        cache = get_response_cache()
+        usage = get_prompt_usage()
+        writer = get_writer()
+        return [
+            f"Response cache: {cache.hit_rate:.0%} hit rate ({cache.hits} hits / {cache.misses} misses)",
+            f"Prompt cache: {usage.hit_rate:.0%} of {usage.prompt_tokens} prompt tokens over {usage.requests} requests",
+            self.speculation.status_text(),
+            f"Database writer: {writer.jobs_written} writes in {writer.commits} commits "
+            "(db.write_batch is one commit, db.write_wait the time a write was queued)"
+        ]
+    
     def show_about(self):
         """Show the about dialog"""
         try:
@@ -756,8 +774,13 @@ For more detailed information, refer to the full documentation provided with the
             self.edit_button.config(state=tk.DISABLED)
             self.copy_button.config(state=tk.DISABLED)
             
-            # Use threading to prevent UI freeze
-            threading.Thread(target=self.process_submission, args=(raw_text, context, audience, tone, notes)).start()
+            # Drafts from an earlier multi-draft generation no longer apply
+            self.variant_siblings = []
+            self.speculation.discard()
+            
+            # Generate on the background pool, ahead of any queued imports
+            submit_job(self.process_submission, raw_text, context, audience, tone, notes, self.get_variant_count(),
+                       priority=PRIORITY_INTERACTIVE, name="generate")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to submit: {str(e)}")
             log_error("Submit error", e)
@@ -765,28 +788,133 @@ For more detailed information, refer to the full documentation provided with the
             self.progress.grid_remove()
             self.status_var.set("Error during submission.")
 
-    def process_submission(self, raw_text, context, audience, tone, notes):
-        """Process the submission in a separate thread"""
+    def process_submission(self, raw_text, context, audience, tone, notes, variants=1):
+        """Process the submission in a separate thread, streaming tokens to the UI"""
+        if variants > 1:
+            return self.process_variants(raw_text, context, audience, tone, notes, variants)
+        
+        # Tokens are shown as they arrive; timings run from the submit click
+        stream = TokenStream()
+        self.root.after(0, self.start_stream_display, stream)
         try:
-            # Retrieve past statements
-            accepted_responses = get_past_responses(status="accepted", limit=3)
-            rejected_responses = get_past_responses(status="rejected", limit=2)
-            
-            # Construct prompt
-            prompt = construct_prompt(raw_text, context, audience, tone, accepted_responses, rejected_responses)
-            
-            # Call the LLM API
-            generated_text = self.api_manager.call_llm_api(prompt)
-            
-            # Log the submission
-            self.current_submission_id = log_submission(raw_text, context, audience, tone, generated_text, notes)
-            
-            # Update UI
-            self.root.after(0, self.update_ui_with_generation, generated_text)
+            # Retrieve the past statements most similar to this one
+            with span('generation.retrieval'):
+                accepted_responses, rejected_responses = retrieve_examples(raw_text, context, audience, tone,
+                                                                           accepted_limit=3, rejected_limit=2)
+            
+            # Construct prompt, fitting the examples into the token budget
+            with span('generation.prompt_build'):
+                prompt, prompt_tokens = self.fit_generation_prompt(raw_text, context, audience, tone,
+                                                                   accepted_responses, rejected_responses)
+            record('generation.prompt_tokens', prompt_tokens)
+            
+            # Call the LLM API in streaming mode
+            with span('generation.api'):
+                success, generated_text = self.api_manager.stream_llm_api(prompt, stream)
+            if not success:
+                raise Exception(generated_text)
+            
+            # Log the full statement once the stream has completed
+            with span('generation.db'):
+                self.current_submission_id = log_submission(raw_text, context, audience, tone, generated_text, notes,
+                                                            prompt_tokens)
+            stream.finish(generated_text)
             
         except Exception as e:
-            self.root.after(0, lambda: self.handle_error(f"Error during generation: {str(e)}"))
+            stream.fail(f"Error during generation: {str(e)}")
             log_error("Process submission error", e)
+    
+    def prompt_budget(self):
+        """Token budget for one request: [PROMPT] TOKEN_BUDGET, leaving room for the completion"""
+        try:
+            budget = int(get_config_value('PROMPT', 'TOKEN_BUDGET', DEFAULT_PROMPT_TOKEN_BUDGET))
+        except ValueError:
+            budget = DEFAULT_PROMPT_TOKEN_BUDGET
+        return prompt_token_budget(getattr(self.api_manager, 'model', None), GENERATION_PARAMS["max_tokens"], budget)
+    
+    def fit_generation_prompt(self, raw_text, context, audience, tone, accepted_responses, rejected_responses):
+        """Generation prompt with the best-ranked examples that fit the budget; returns (prompt, prompt tokens)"""
+        return fit_prompt(
+            lambda accepted, rejected: construct_prompt(raw_text, context, audience, tone, accepted, rejected),
+            accepted_responses, rejected_responses, system_message(), self.prompt_budget())
+    
+    def start_stream_display(self, stream):
+        """Clear the output box and start draining streamed tokens into it"""
+        try:
+            self.generated_statement.delete("1.0", tk.END)
+            pump_stream(self.root, self.generated_statement, stream, self.finish_stream_display)
+        except Exception as e:
+            log_error("Start stream display error", e)
+    
+    def finish_stream_display(self, stream):
+        """Show the completed statement, or the error that ended the stream"""
+        if stream.error:
+            self.handle_error(stream.error)
+            return
+        
+        self.last_time_to_first_token = stream.time_to_first_token
+        with span('generation.render'):
+            self.update_ui_with_generation(stream.text)
+        record('generation.end_to_end', (time.perf_counter() - stream.started) * 1000)
+        if stream.time_to_first_token is not None:
+            record('generation.first_token', stream.time_to_first_token * 1000)
+            self.status_var.set(f"Statement generated in {stream.total_time:.1f}s "
+                                f"(first words after {stream.time_to_first_token:.1f}s). "
+                                "Please review and accept or regenerate.")
+    
+    def get_variant_count(self):
+        """Number of drafts requested in the input panel"""
+        try:
+            return max(1, min(MAX_VARIANTS, int(self.variant_count.get())))
+        except (TypeError, ValueError):
+            return 1
+    
+    def process_variants(self, raw_text, context, audience, tone, notes, count):
+        """Generate several drafts in one request and log them together"""
+        try:
+            # Retrieve the past statements most similar to this one
+            with span('variants.retrieval'):
+                accepted_responses, rejected_responses = retrieve_examples(raw_text, context, audience, tone,
+                                                                           accepted_limit=3, rejected_limit=2)
+            
+            # Construct prompt, fitting the examples into the token budget
+            with span('variants.prompt_build'):
+                prompt, prompt_tokens = self.fit_generation_prompt(raw_text, context, audience, tone,
+                                                                   accepted_responses, rejected_responses)
+            record('variants.prompt_tokens', prompt_tokens)
+            
+            # One request returns every draft, so N drafts cost a single round trip
+            with span('variants.api'):
+                success, generated_texts = self.api_manager.call_llm_api_variants(prompt, count)
+            if not success:
+                raise Exception(generated_texts)
+            
+            # All drafts are logged in one transaction
+            with span('variants.db'):
+                submission_ids = log_submission_variants(raw_text, context, audience, tone, generated_texts, notes,
+                                                         prompt_tokens)
+            if len(submission_ids) != len(generated_texts):
+                raise Exception("Failed to log the generated drafts")
+            
+            self.root.after(0, self.show_variants, list(zip(submission_ids, generated_texts)))
+        
+        except Exception as e:
+            self.root.after(0, self.handle_error, f"Error during generation: {str(e)}")
+            log_error("Process variants error", e)
+    
+    def show_variants(self, candidates):
+        """Load the first draft and open the side-by-side comparison"""
+        self.choose_variant(candidates, 0)
+        create_variants_window(self.root, candidates, lambda index: self.choose_variant(candidates, index))
+    
+    def choose_variant(self, candidates, index):
+        """Continue with one draft; the others are rejected once it is accepted"""
+        submission_id, text = candidates[index]
+        self.current_submission_id = submission_id
+        self.variant_siblings = [other_id for other_id, _ in candidates if other_id != submission_id]
+        self.update_ui_with_generation(text)
+        self.status_var.set(f"Showing draft {index + 1} of {len(candidates)}. "
+                            "Accepting it marks the other drafts rejected.")
 
     def update_ui_with_generation(self, generated_text):
         """Update the UI with the generated text"""
@@ -810,9 +938,43 @@ For more detailed information, refer to the full documentation provided with the
             
             # Update status
             self.status_var.set("Statement generated. Please review and accept or regenerate.")
+            
+            # Update cache hit/miss counters
+            self.update_usage_status()
+            
+            # Start on the likely next refresh while the user reviews this draft
+            self.start_speculative_refresh()
         except Exception as e:
             self.handle_error(f"Error updating UI: {str(e)}")
             log_error("Update UI error", e)
+    
+    def finish_refresh_display(self, generated_text, started):
+        """Show a refreshed statement and record the refresh's time from start to screen"""
+        with span('refresh.render'):
+            self.update_ui_with_generation(generated_text)
+        record('refresh.end_to_end', (time.perf_counter() - started) * 1000)
+    
+    def update_usage_status(self):
+        """Show response cache, prompt cache and speculative refresh counters in the status bar"""
+        texts = [get_response_cache().status_text(), get_prompt_usage().status_text(), self.speculation.status_text()]
+        self.cache_var.set("  |  ".join(text for text in texts if text))
+    
+    def refresh_key(self, raw_text, context, audience, tone):
+        """Inputs a refresh draft depends on; a speculation is only used if they are unchanged"""
+        return (self.current_submission_id, raw_text, context, audience, tone)
+    
+    def start_speculative_refresh(self):
+        """Request the refresh draft for the statement on screen at the lowest priority, if enabled"""
+        if not self.speculative_refresh.get() or not self.current_submission_id:
+            self.speculation.discard()
+            return
+        
+        raw_text = self.raw_statement.get("1.0", tk.END).strip()
+        context = self.context.get().strip()
+        audience = self.target_audience.get().strip()
+        tone = self.tone_var.get()
+        self.speculation.start(self.refresh_key(raw_text, context, audience, tone), self.generate_refresh,
+                               self.current_submission_id, raw_text, context, audience, tone)
 
     def handle_error(self, error_message):
         """Handle errors and update UI accordingly"""
@@ -833,22 +995,14 @@ For more detailed information, refer to the full documentation provided with the
             return
         
         try:
+            # A refresh is no longer coming
+            self.speculation.discard()
+            
             # Update submission status to 'accepted'
             update_submission_status(self.current_submission_id, 'accepted')
             
             # Get the accepted text and metadata to add to past_responses
-            conn = sqlite3.connect('mp_rewriter.db')
-            cursor = conn.cursor()
-            
-            # Get the accepted text and metadata
-            cursor.execute("""
-            SELECT generated_text, target_audience, tone, context 
-            FROM submissions 
-            WHERE id = ?
-            """, (self.current_submission_id,))
-            
-            result = cursor.fetchone()
-            conn.close()
+            result = get_accepted_submission(self.current_submission_id)
             
             if result:
                 generated_text, audience, tone, context = result
@@ -856,8 +1010,10 @@ For more detailed information, refer to the full documentation provided with the
                 # Determine topic from context/audience
                 topic = context if context else audience
                 
-                # Add to past_responses
-                save_accepted_statement(self.current_submission_id, generated_text, topic, tone)
+                # Add to past_responses; other drafts from the same generation become rejected
+                save_accepted_statement(self.current_submission_id, generated_text, topic, tone,
+                                        reject_ids=self.variant_siblings)
+                self.variant_siblings = []
             
             # Update status
             self.status_var.set("Statement accepted and saved to your library.")
@@ -903,6 +1059,9 @@ For more detailed information, refer to the full documentation provided with the
             tone = self.tone_var.get()
             notes = self.notes.get().strip()
             
+            # A draft pre-generated for these same inputs is shown instead of a new request
+            speculation = self.speculation.claim(self.refresh_key(raw_text, context, audience, tone))
+            
             # Update status and show progress
             self.status_var.set("Regenerating statement with new approach...")
             self.progress.grid()
@@ -915,68 +1074,89 @@ For more detailed information, refer to the full documentation provided with the
             self.copy_button.config(state=tk.DISABLED)
             
             # Regenerate with slightly higher temperature for diversity
-            threading.Thread(target=self.process_refresh, args=(raw_text, context, audience, tone, notes)).start()
+            submit_job(self.process_refresh, raw_text, context, audience, tone, notes, speculation,
+                       priority=PRIORITY_INTERACTIVE, name="refresh")
             
         except Exception as e:
             messagebox.showerror("Database Error", f"Failed to refresh statement: {str(e)}")
             log_error("Refresh statement error", e)
 
-    def process_refresh(self, raw_text, context, audience, tone, notes):
-        """Process the refresh in a separate thread"""
-        try:
-            # Get the most recently rejected statement to explicitly avoid
-            conn = sqlite3.connect('mp_rewriter.db')
+    def build_refresh_prompt(self, submission_id, raw_text, context, audience, tone):
+        """Refresh prompt steering away from the given submission's draft; returns (prompt, prompt tokens)"""
+        # Get the most recently rejected statement to explicitly avoid
+        with get_connection() as conn:
             cursor = conn.cursor()
             
             cursor.execute("""
             SELECT generated_text FROM submissions 
             WHERE id = ? 
             LIMIT 1
-            """, (self.current_submission_id,))
+            """, (submission_id,))
             
             rejected_text = cursor.fetchone()
             
             # Get examples of good statements
-            cursor.execute("""
-            SELECT published_text, topic, tone FROM past_responses 
-            ORDER BY RANDOM() 
-            LIMIT 3
-            """)
-            
-            good_examples = cursor.fetchall()
+            good_examples = sample_library(conn, 3)
             
             # Get another rejected statement
-            cursor.execute("""
-            SELECT generated_text, target_audience, tone FROM submissions 
-            WHERE status = 'rejected' AND id != ? 
-            ORDER BY RANDOM() 
-            LIMIT 1
-            """, (self.current_submission_id,))
-            
-            other_rejected = cursor.fetchall()
-            
-            conn.close()
-            
-            # Create an explicit rejection example
-            rejected_examples = []
-            if rejected_text:
-                rejected_examples.append((rejected_text[0], f"Previous attempt for {audience}", tone))
-            
-            # Add other rejected examples
-            rejected_examples.extend(other_rejected)
-            
-            # Construct a refresh prompt
-            prompt = construct_refresh_prompt(raw_text, context, audience, tone, good_examples, rejected_examples)
-            
-            # Call the LLM API with higher temperature
-            generated_text = self.api_manager.call_refresh_llm_api(prompt)
-            
-            # Log as a new submission
-            self.current_submission_id = log_submission(raw_text, context, audience, tone, generated_text, notes)
+            other_rejected = sample_submissions(conn, 'rejected', 1, exclude_id=submission_id)
+        
+        # Create an explicit rejection example
+        rejected_examples = []
+        if rejected_text:
+            rejected_examples.append((rejected_text[0], f"Previous attempt for {audience}", tone))
+        
+        # Add other rejected examples
+        rejected_examples.extend(other_rejected)
+        
+        # Construct a refresh prompt; the previous attempt ranks first among the examples to avoid
+        return fit_prompt(
+            lambda accepted, rejected: construct_refresh_prompt(raw_text, context, audience, tone, accepted, rejected),
+            good_examples, rejected_examples, system_message(refresh=True), self.prompt_budget())
+    
+    def generate_refresh(self, submission_id, raw_text, context, audience, tone):
+        """Generate a refresh draft; returns (generated_text, estimated tokens spent)"""
+        with span('refresh.prompt_build'):
+            prompt, prompt_tokens = self.build_refresh_prompt(submission_id, raw_text, context, audience, tone)
+        record('refresh.prompt_tokens', prompt_tokens)
+        
+        # Call the LLM API, bypassing the response cache so each refresh differs
+        with span('refresh.api'):
+            success, generated_text = self.api_manager.call_refresh_llm_api(prompt, use_cache=False)
+        if not success:
+            raise Exception(generated_text)
+        return generated_text, prompt_tokens + GENERATION_PARAMS["max_tokens"]
+    
+    def process_refresh(self, raw_text, context, audience, tone, notes, speculation=None):
+        """Process the refresh in a separate thread"""
+        started = time.perf_counter()
+        try:
+            # Use the pre-generated draft if there is one, waiting for it if still in flight
+            generated_text = None
+            if speculation is not None:
+                try:
+                    with span('refresh.speculation_wait'):
+                        generated_text, spent = speculation.result()
+                except Exception as e:
+                    log_error("Speculative refresh error", e)
+            pre_generated = generated_text is not None
+            
+            if not pre_generated:
+                generated_text, spent = self.generate_refresh(self.current_submission_id, raw_text, context, audience,
+                                                              tone)
+            
+            # Log as a new submission; the estimate spent is the prompt plus the completion budget
+            with span('refresh.db'):
+                self.current_submission_id = log_submission(raw_text, context, audience, tone, generated_text, notes,
+                                                            spent - GENERATION_PARAMS["max_tokens"])
             
             # Update UI
-            self.root.after(0, self.update_ui_with_generation, generated_text)
+            self.root.after(0, self.finish_refresh_display, generated_text, started)
+            if pre_generated:
+                self.speculation.record_used()
+                self.root.after(0, self.status_var.set, "Statement regenerated from the pre-generated draft. "
+                                "Please review and accept or regenerate.")
             
         except Exception as e:
-            self.root.after(0, lambda: self.handle_error(f"Error during regeneration: {str(e)}"))
+            self.root.after(0, self.handle_error, f"Error during regeneration: {str(e)}")
             log_error("Process refresh error", e)
\ No newline at end of file
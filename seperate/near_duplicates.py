@@ -0,0 +1,388 @@
+import argparse
+import hashlib
+import struct
+import zlib
+from error_handler import log_error
+from db_pool import get_connection
+from db_writer import run_write
+from job_executor import current_token
+from dedupe import normalize_text
+from example_sampler import LIBRARY
+
+# One-permutation MinHash: each word 3-gram is hashed once into one of NUM_BINS
+# bins and every bin keeps its smallest hash. Equal bins estimate Jaccard similarity.
+NUM_BINS = 64
+SHINGLE_SIZE = 3
+
+# LSH banding: two statements share a bucket in some band with probability
+# 1 - (1 - J**ROWS)**BANDS, about 99% at J = 0.9, 77% at 0.8 and under 0.1% at 0.4
+BANDS = 8
+ROWS = NUM_BINS // BANDS
+
+# Estimated similarity at which two statements count as near-duplicates
+NEAR_DUPLICATE_THRESHOLD = 0.8
+
+# Members read from one bucket; a huge bucket (shared boilerplate) must not turn a lookup into a scan
+MAX_BUCKET_SIZE = 200
+
+# Statements signed and written per index transaction
+SYNC_BATCH_SIZE = 2000
+
+# Band of the placeholder row marking an accepted submission with no words as indexed;
+# lookups and clustering only read bands 0 to BANDS - 1, so it never matches anything
+UNSIGNED_BAND = -1
+
+# Sources of indexed statements: LIBRARY (past_responses) and accepted submissions
+SUBMISSION = 'submission'
+
+# The top 6 bits of a 32-bit shingle hash pick the bin, the other 26 are its value.
+# _EMPTY is one past the largest value, and the step between borrowed bin values.
+_EMPTY = 1 << 26
+_HASH_MASK = _EMPTY - 1
+
+NEAR_DUPLICATE_DDL = [
+    '''
+    CREATE TABLE IF NOT EXISTS near_duplicate_bands (
+        band INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        source TEXT NOT NULL,
+        row_id INTEGER NOT NULL,
+        PRIMARY KEY (band, bucket, source, row_id)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS idx_near_duplicate_bands_row ON near_duplicate_bands(source, row_id)
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS near_duplicate_state (
+        source TEXT PRIMARY KEY,
+        indexed_through INTEGER NOT NULL DEFAULT 0
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS near_duplicate_clusters (
+        source TEXT NOT NULL,
+        row_id INTEGER NOT NULL,
+        cluster INTEGER NOT NULL,
+        PRIMARY KEY (source, row_id)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS idx_near_duplicate_clusters ON near_duplicate_clusters(cluster)
+    ''',
+    # Statements leaving the library or the accepted set leave the index with them
+    '''
+    CREATE TRIGGER IF NOT EXISTS past_responses_near_duplicate_delete AFTER DELETE ON past_responses BEGIN
+        DELETE FROM near_duplicate_bands WHERE source = 'library' AND row_id = old.id;
+        DELETE FROM near_duplicate_clusters WHERE source = 'library' AND row_id = old.id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS submissions_near_duplicate_delete AFTER DELETE ON submissions
+    WHEN old.status = 'accepted' BEGIN
+        DELETE FROM near_duplicate_bands WHERE source = 'submission' AND row_id = old.id;
+        DELETE FROM near_duplicate_clusters WHERE source = 'submission' AND row_id = old.id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS submissions_near_duplicate_status AFTER UPDATE OF status ON submissions
+    WHEN old.status = 'accepted' AND new.status IS NOT 'accepted' BEGIN
+        DELETE FROM near_duplicate_bands WHERE source = 'submission' AND row_id = old.id;
+        DELETE FROM near_duplicate_clusters WHERE source = 'submission' AND row_id = old.id;
+    END
+    '''
+]
+
+def create_near_duplicate_tables(conn):
+    """Create the LSH band, sync state and cluster tables; the index is filled by sync_index"""
+    for statement in NEAR_DUPLICATE_DDL:
+        conn.execute(statement)
+
+def shingles(text):
+    """Word 3-grams of the normalised text (the whole text if it is shorter)"""
+    words = normalize_text(text).split()
+    if len(words) <= SHINGLE_SIZE:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+def signature(text):
+    """MinHash signature of a statement, or None if it has no words"""
+    bins = [_EMPTY] * NUM_BINS
+    for shingle in shingles(text):
+        # Multiplying by an odd constant mixes crc32 so the top bits pick the bin
+        value = (zlib.crc32(shingle.encode('utf-8')) * 0x9E3779B1) & 0xFFFFFFFF
+        slot = value >> 26
+        value &= _HASH_MASK
+        if value < bins[slot]:
+            bins[slot] = value
+    
+    filled = [slot for slot in range(NUM_BINS) if bins[slot] != _EMPTY]
+    if not filled:
+        return None
+    
+    # Short texts leave bins empty: borrow the next filled bin, offset by the distance
+    # (rotation densification) so two statements agree on a bin only when they share it
+    if len(filled) < NUM_BINS:
+        original = list(bins)
+        for slot in range(NUM_BINS):
+            if original[slot] == _EMPTY:
+                distance = 1
+                while original[(slot + distance) % NUM_BINS] == _EMPTY:
+                    distance += 1
+                bins[slot] = original[(slot + distance) % NUM_BINS] + distance * _EMPTY
+    return tuple(bins)
+
+def similarity(first, second):
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(a == b for a, b in zip(first, second)) / NUM_BINS
+
+def band_keys(sig):
+    """(band, bucket) pairs of a signature, one per band"""
+    keys = []
+    for band in range(BANDS):
+        packed = struct.pack(f'<{ROWS}I', *sig[band * ROWS:(band + 1) * ROWS])
+        keys.append((band, int.from_bytes(hashlib.blake2b(packed, digest_size=8).digest(), 'little', signed=True)))
+    return keys
+
+def _texts(conn, keys):
+    """Current text of (source, row_id) keys; rows deleted or no longer accepted are left out"""
+    texts = {}
+    for source, select in ((LIBRARY, "SELECT id, published_text FROM past_responses WHERE id IN ({})"),
+                           (SUBMISSION, "SELECT id, generated_text FROM submissions WHERE status = 'accepted' AND id IN ({})")):
+        ids = [row_id for key_source, row_id in keys if key_source == source]
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            for row_id, text in conn.execute(select.format(','.join('?' * len(chunk))), chunk):
+                texts[(source, row_id)] = text
+    return texts
+
+def _candidates(conn, sig):
+    """Statements sharing at least one band bucket with a signature"""
+    candidates = set()
+    for band, bucket in band_keys(sig):
+        candidates.update(conn.execute("""
+        SELECT source, row_id FROM near_duplicate_bands WHERE band = ? AND bucket = ? LIMIT ?
+        """, (band, bucket, MAX_BUCKET_SIZE)))
+    return candidates
+
+def find_near_duplicates(conn, text, threshold=NEAR_DUPLICATE_THRESHOLD, exclude=(), limit=10):
+    """Indexed statements similar to text, as (similarity, source, row_id), most similar first"""
+    sig = signature(text)
+    if sig is None:
+        return []
+    
+    candidates = _candidates(conn, sig) - set(exclude)
+    matches = []
+    for (source, row_id), candidate_text in _texts(conn, candidates).items():
+        score = similarity(sig, signature(candidate_text) or ())
+        if score >= threshold:
+            matches.append((score, source, row_id))
+    matches.sort(reverse=True)
+    return matches[:limit]
+
+def diverse(rows, limit, threshold=NEAR_DUPLICATE_THRESHOLD, text_of=lambda row: row[0]):
+    """The first limit rows, skipping any that are near-duplicates of a row already kept"""
+    kept = []
+    kept_signatures = []
+    for row in rows:
+        sig = signature(text_of(row))
+        if sig is not None and any(similarity(sig, other) >= threshold for other in kept_signatures):
+            continue
+        kept.append(row)
+        if sig is not None:
+            kept_signatures.append(sig)
+        if len(kept) == limit:
+            break
+    return kept
+
+def _pending_library(conn, limit):
+    """Library rows added since the last sync"""
+    row = conn.execute("SELECT indexed_through FROM near_duplicate_state WHERE source = ?", (LIBRARY,)).fetchone()
+    return conn.execute("""
+    SELECT id, published_text FROM past_responses WHERE id > ? ORDER BY id LIMIT ?
+    """, (row[0] if row else 0, limit)).fetchall()
+
+def _pending_submissions(conn, limit):
+    """Accepted submissions not in the index yet"""
+    return conn.execute("""
+    SELECT id, generated_text FROM submissions s WHERE status = 'accepted'
+    AND NOT EXISTS (SELECT 1 FROM near_duplicate_bands b WHERE b.source = 'submission' AND b.row_id = s.id)
+    LIMIT ?
+    """, (limit,)).fetchall()
+
+def _write_bands(conn, source, entries, indexed_through=None):
+    """Write job: add band rows, advancing the library sync position"""
+    conn.executemany("""
+    INSERT OR IGNORE INTO near_duplicate_bands (band, bucket, source, row_id) VALUES (?, ?, ?, ?)
+    """, entries)
+    if indexed_through is not None:
+        conn.execute("""
+        INSERT INTO near_duplicate_state (source, indexed_through) VALUES (?, ?)
+        ON CONFLICT(source) DO UPDATE SET indexed_through = MAX(indexed_through, excluded.indexed_through)
+        """, (source, indexed_through))
+
+def sync_index(batch_size=SYNC_BATCH_SIZE):
+    """Add library rows and accepted submissions that are not in the index yet; returns how many were added
+
+    Runs as a background job at start-up and after imports; stops between
+    batches when cancelled and carries on from there next time.
+    """
+    token = current_token()
+    indexed = 0
+    try:
+        for source, pending in ((LIBRARY, _pending_library), (SUBMISSION, _pending_submissions)):
+            while not token.cancelled:
+                with get_connection() as conn:
+                    rows = pending(conn, batch_size)
+                if not rows:
+                    break
+                
+                entries = []
+                for row_id, text in rows:
+                    sig = signature(text)
+                    if sig is not None:
+                        entries.extend((band, bucket, source, row_id) for band, bucket in band_keys(sig))
+                    elif source == SUBMISSION:
+                        # Submissions are found by having no band rows, so mark this one or it is re-read forever
+                        entries.append((UNSIGNED_BAND, 0, source, row_id))
+                run_write(_write_bands, source, entries, rows[-1][0] if source == LIBRARY else None)
+                indexed += len(rows)
+                
+                if len(rows) < batch_size:
+                    break
+    except Exception as e:
+        log_error("Near-duplicate index sync error", e)
+    return indexed
+
+def flag_new_statements(after_id, threshold=NEAR_DUPLICATE_THRESHOLD):
+    """Library rows above after_id (e.g. just imported) that nearly duplicate an earlier statement
+
+    Returns (row_id, similarity, source, match_id) for each flagged row, matched
+    against older library rows and accepted submissions.
+    """
+    sync_index()
+    with get_connection() as conn:
+        buckets = {}
+        for band, bucket, row_id in conn.execute("""
+        SELECT band, bucket, row_id FROM near_duplicate_bands WHERE source = 'library' AND row_id > ?
+        """, (after_id,)):
+            buckets.setdefault((band, bucket), []).append(row_id)
+        
+        # Each new row is compared with at most MAX_BUCKET_SIZE earlier members of a bucket, older
+        # statements first, so an import of shared boilerplate stays linear instead of quadratic
+        pairs = set()
+        for (band, bucket), new_ids in buckets.items():
+            older = conn.execute("""
+            SELECT source, row_id FROM near_duplicate_bands
+            WHERE band = ? AND bucket = ? AND NOT (source = 'library' AND row_id > ?) LIMIT ?
+            """, (band, bucket, after_id, MAX_BUCKET_SIZE)).fetchall()
+            new_ids.sort()
+            for row_id in new_ids:
+                earlier = older + [(LIBRARY, other) for other in new_ids[:max(0, MAX_BUCKET_SIZE - len(older))]
+                                   if other < row_id]
+                pairs.update((row_id, source, match_id) for source, match_id in earlier)
+        texts = _texts(conn, {(LIBRARY, row_id) for row_id, _, _ in pairs} |
+                       {(source, row_id) for _, source, row_id in pairs})
+    
+    signatures = {}
+    best = {}
+    for row_id, source, match_id in pairs:
+        keys = [(LIBRARY, row_id), (source, match_id)]
+        if any(key not in texts for key in keys):
+            continue
+        for key in keys:
+            if key not in signatures:
+                signatures[key] = signature(texts[key]) or ()
+        score = similarity(*(signatures[key] for key in keys))
+        if score >= threshold and score > best.get(row_id, (0,))[0]:
+            best[row_id] = (score, source, match_id)
+    return [(row_id, *best[row_id]) for row_id in sorted(best)]
+
+def cluster_statements(threshold=NEAR_DUPLICATE_THRESHOLD):
+    """Group the library and accepted submissions into near-duplicate clusters
+
+    Background job: syncs the index, links statements that share a bucket and
+    are similar enough, and stores every cluster of two or more statements in
+    near_duplicate_clusters. Returns (clusters, statements in them).
+    """
+    sync_index()
+    token = current_token()
+    parent = {}
+    
+    def find(key):
+        root = key
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while key != root:
+            parent[key], key = root, parent[key]
+        return root
+    
+    signatures = {}
+    with get_connection() as conn:
+        for band in range(BANDS):
+            if token.cancelled:
+                return 0, 0
+            
+            # The primary key keeps each bucket's members together
+            groups = []
+            current, members = None, []
+            for bucket, source, row_id in conn.execute("""
+            SELECT bucket, source, row_id FROM near_duplicate_bands WHERE band = ? ORDER BY bucket
+            """, (band,)):
+                if bucket != current:
+                    if len(members) > 1:
+                        groups.append(members[:MAX_BUCKET_SIZE])
+                    current, members = bucket, []
+                members.append((source, row_id))
+            if len(members) > 1:
+                groups.append(members[:MAX_BUCKET_SIZE])
+            
+            missing = {key for members in groups for key in members if key not in signatures}
+            for key, text in _texts(conn, missing).items():
+                signatures[key] = signature(text)
+            
+            for members in groups:
+                members = [key for key in members if signatures.get(key)]
+                for i, key in enumerate(members):
+                    for other in members[:i]:
+                        if find(key) != find(other) and similarity(signatures[key], signatures[other]) >= threshold:
+                            parent[find(key)] = find(other)
+    
+    clusters = {}
+    for key in set(parent) | set(parent.values()):
+        clusters.setdefault(find(key), []).append(key)
+    clusters = sorted((members for members in clusters.values() if len(members) > 1), key=len, reverse=True)
+    
+    def store(conn):
+        conn.execute("DELETE FROM near_duplicate_clusters")
+        conn.executemany("INSERT INTO near_duplicate_clusters (source, row_id, cluster) VALUES (?, ?, ?)",
+                         ((source, row_id, number) for number, members in enumerate(clusters, 1)
+                          for source, row_id in members))
+    
+    run_write(store)
+    return len(clusters), sum(len(members) for members in clusters)
+
+def main():
+    """Maintain the near-duplicate index from the command line"""
+    parser = argparse.ArgumentParser(description="MP Statement Rewriter near-duplicate detection")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('sync', help="index statements added since the last sync")
+    cluster_parser = subparsers.add_parser('cluster', help="group the library into near-duplicate clusters")
+    cluster_parser.add_argument('--show', type=int, default=10, help="largest clusters to print")
+    args = parser.parse_args()
+    
+    if args.command == 'sync':
+        print(f"{sync_index()} statements indexed")
+    elif args.command == 'cluster':
+        clusters, statements = cluster_statements()
+        print(f"{clusters} clusters of near-duplicates covering {statements} statements")
+        with get_connection() as conn:
+            for cluster, size in conn.execute("""
+            SELECT cluster, COUNT(*) FROM near_duplicate_clusters GROUP BY cluster ORDER BY cluster LIMIT ?
+            """, (args.show,)):
+                members = conn.execute("SELECT source, row_id FROM near_duplicate_clusters WHERE cluster = ?",
+                                       (cluster,)).fetchall()
+                print(f"  #{cluster} ({size}): " + ', '.join(f"{source} {row_id}" for source, row_id in members[:8]))
+
+if __name__ == "__main__":
+    main()
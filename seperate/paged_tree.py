@@ -0,0 +1,174 @@
+import tkinter as tk
+from error_handler import log_error
+from db_pool import get_connection
+from job_executor import PRIORITY_INTERACTIVE, submit_job
+
+# Rows fetched per query, and how many pages are held as Treeview items at once
+PAGE_SIZE = 100
+MAX_PAGES = 5
+
+# Fetch the next page once the view is this close to either end (fraction of the scroll range)
+PREFETCH_MARGIN = 0.15
+
+def _select(conn, table, columns, where, order, limit, params=()):
+    """Run one page query"""
+    sql = f"SELECT {columns} FROM {table} {where} ORDER BY {order} LIMIT ?"
+    return conn.execute(sql, (*params, limit)).fetchall()
+
+def fetch_page(table, columns, page_size, before=None, after=None):
+    """Rows of table newest first, keyed on (timestamp, id)
+
+    columns must start with id and timestamp. With before, the page follows that
+    key; with after, it is the page just above it (still returned newest first).
+    Rows without a timestamp (e.g. some imports) sort after all others, by id.
+    """
+    with get_connection() as conn:
+        if after is not None:
+            # Walk upwards in ascending order, from the undated rows into the dated ones
+            if after[0] is None:
+                rows = _select(conn, table, columns, "WHERE timestamp IS NULL AND id > ?", "timestamp, id", page_size,
+                               (after[1],))
+                if len(rows) < page_size:
+                    rows += _select(conn, table, columns, "WHERE timestamp IS NOT NULL", "timestamp, id",
+                                    page_size - len(rows))
+            else:
+                rows = _select(conn, table, columns, "WHERE (timestamp, id) > (?, ?)", "timestamp, id", page_size,
+                               after)
+            rows.reverse()
+        elif before is None:
+            rows = _select(conn, table, columns, "", "timestamp DESC, id DESC", page_size)
+        elif before[0] is None:
+            rows = _select(conn, table, columns, "WHERE timestamp IS NULL AND id < ?", "timestamp DESC, id DESC", page_size,
+                           (before[1],))
+        else:
+            rows = _select(conn, table, columns, "WHERE (timestamp, id) < (?, ?)", "timestamp DESC, id DESC",
+                           page_size, before)
+            if len(rows) < page_size:
+                rows += _select(conn, table, columns, "WHERE timestamp IS NULL", "timestamp DESC, id DESC",
+                                page_size - len(rows))
+    return rows
+
+def _key(row):
+    """Keyset position of a row: (timestamp, id)"""
+    return (row[1], row[0])
+
+class PagedTree:
+    """Shows a table in a Treeview a page at a time, keeping only a window of pages as items"""
+    
+    def __init__(self, tree, table, columns, format_row, page_size=PAGE_SIZE, max_pages=MAX_PAGES):
+        self.tree = tree
+        self.table = table
+        self.columns = columns
+        self.format_row = format_row
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.pages = []
+        self.at_start = True
+        self.at_end = False
+        self.loading = False
+        self._generation = 0
+        
+        # Keep driving the existing scrollbar, and watch the view to fetch pages on demand
+        self._scroll_command = tree.cget('yscrollcommand')
+        tree.configure(yscrollcommand=self._on_scroll)
+    
+    def reload(self):
+        """Drop every row and load the newest page"""
+        self._generation += 1
+        self.tree.delete(*self.tree.get_children())
+        self.pages = []
+        self.at_start = True
+        self.at_end = False
+        self.loading = False
+        self._fetch(None, None)
+    
+    def stop(self):
+        """Stop paging, e.g. while the tree shows search results instead"""
+        self._generation += 1
+        self.pages = []
+        self.loading = False
+    
+    def _fetch(self, before, after):
+        """Query a page on the job executor and add it on the Tk thread"""
+        if self.loading:
+            return
+        self.loading = True
+        generation = self._generation
+        
+        def query():
+            try:
+                rows = fetch_page(self.table, self.columns, self.page_size, before, after)
+            except Exception as e:
+                log_error(f"Load {self.table} page error", e)
+                rows = None
+            self.tree.after(0, self._add_page, generation, rows, after is not None)
+        
+        submit_job(query, priority=PRIORITY_INTERACTIVE, name=f"{self.table}-page")
+    
+    def _add_page(self, generation, rows, above):
+        """Insert a fetched page, dropping the page at the far end once the window is full"""
+        if generation != self._generation or not self.tree.winfo_exists():
+            return
+        self.loading = False
+        if rows is None:
+            return
+        
+        complete = len(rows) == self.page_size
+        if not rows:
+            if above:
+                self.at_start = True
+            else:
+                self.at_end = True
+            return
+        
+        # Rows added or dropped above the view shift it, so keep the top row in place
+        count = len(self.tree.get_children())
+        top = round(float(self.tree.yview()[0]) * count)
+        if above:
+            items = [self.tree.insert('', 0, values=self.format_row(row)) for row in reversed(rows)]
+            items.reverse()
+            self.pages.insert(0, (_key(rows[0]), _key(rows[-1]), items))
+            top += len(items)
+            self.at_start = not complete
+            if len(self.pages) > self.max_pages:
+                self.tree.delete(*self.pages.pop()[2])
+                self.at_end = False
+        else:
+            items = [self.tree.insert('', tk.END, values=self.format_row(row)) for row in rows]
+            self.pages.append((_key(rows[0]), _key(rows[-1]), items))
+            self.at_end = not complete
+            if len(self.pages) > self.max_pages:
+                dropped = self.pages.pop(0)[2]
+                self.tree.delete(*dropped)
+                top -= len(dropped)
+                self.at_start = False
+        self.tree.yview_moveto(max(0, top) / len(self.tree.get_children()))
+    
+    def _on_scroll(self, first, last):
+        """yscrollcommand: update the scrollbar and fetch more rows near either end"""
+        if self._scroll_command:
+            self.tree.tk.call(*self.tree.tk.splitlist(self._scroll_command), first, last)
+        
+        if self.loading or not self.pages:
+            return
+        if float(last) >= 1.0 - PREFETCH_MARGIN and not self.at_end:
+            self._fetch(self.pages[-1][1], None)
+        elif float(first) <= PREFETCH_MARGIN and not self.at_start:
+            self._fetch(None, self.pages[0][0])
+
+_pagers = {}
+
+def get_pager(tree, table, columns, format_row):
+    """The PagedTree attached to a Treeview, created on first use"""
+    pager = _pagers.get(tree)
+    if pager is None:
+        pager = PagedTree(tree, table, columns, format_row)
+        _pagers[tree] = pager
+        tree.bind('<Destroy>', lambda event: _pagers.pop(tree, None), add='+')
+    return pager
+
+def stop_paging(tree):
+    """Stop a Treeview's PagedTree, if it has one"""
+    pager = _pagers.get(tree)
+    if pager is not None:
+        pager.stop()
@@ -0,0 +1,178 @@
+import re
+import threading
+
+# Whole request (system prompt, user prompt and message framing) in tokens; override
+# with TOKEN_BUDGET in a [PROMPT] section of config.ini
+DEFAULT_PROMPT_TOKEN_BUDGET = 6000
+
+# Context windows by model name prefix, more specific prefixes first; unknown models get the default
+MODEL_CONTEXT_WINDOWS = [
+    ('gpt-4o', 128000),
+    ('gpt-4-turbo', 128000),
+    ('gpt-4.1', 1047576),
+    ('gpt-4', 8192),
+    ('gpt-3.5-turbo', 16385),
+    ('o1', 200000),
+    ('o3', 200000),
+    ('o4', 200000)
+]
+DEFAULT_CONTEXT_WINDOW = 128000
+
+# Tokens the chat format adds around a system and a user message
+MESSAGE_OVERHEAD = 10
+
+# An example cut shorter than this is dropped instead
+MIN_TRUNCATED_TOKENS = 50
+TRUNCATION_MARK = " [...]"
+
+# Words and single punctuation marks; without tiktoken each word counts one token per five
+# characters, which slightly overestimates English text for the GPT-4 family tokenizers
+_PIECES = re.compile(r"\w+|[^\w\s]")
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+def _get_encoding():
+    """The tiktoken encoding for the GPT-4o family, or None when tiktoken is not installed"""
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding("o200k_base")
+                except Exception:
+                    _encoding = False
+    return _encoding or None
+
+def count_tokens(text):
+    """Tokens in a text, counted locally"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return sum((len(piece) + 4) // 5 for piece in _PIECES.findall(text))
+
+def truncate_to_tokens(text, limit):
+    """The text cut to at most limit tokens (including TRUNCATION_MARK), or unchanged if it fits"""
+    if count_tokens(text) <= limit:
+        return text
+    limit = max(0, limit - count_tokens(TRUNCATION_MARK))
+
+    encoding = _get_encoding()
+    if encoding is not None:
+        cut = encoding.decode(encoding.encode(text, disallowed_special=())[:limit])
+    else:
+        cut = text
+        spent = 0
+        for match in _PIECES.finditer(text):
+            spent += (len(match.group()) + 4) // 5
+            if spent > limit:
+                cut = text[:match.start()]
+                break
+    return cut.rstrip() + TRUNCATION_MARK
+
+def context_window(model):
+    """Context window of a model in tokens"""
+    for prefix, window in MODEL_CONTEXT_WINDOWS:
+        if (model or '').startswith(prefix):
+            return window
+    return DEFAULT_CONTEXT_WINDOW
+
+def prompt_token_budget(model, max_tokens, budget=DEFAULT_PROMPT_TOKEN_BUDGET):
+    """Tokens a request may use: the configured budget, capped so max_tokens still fits the context window"""
+    return max(0, min(int(budget), context_window(model) - max_tokens))
+
+def request_tokens(prompt, system_prompt):
+    """Prompt tokens of a chat request with one system and one user message"""
+    return count_tokens(system_prompt) + count_tokens(prompt) + MESSAGE_OVERHEAD
+
+class PromptUsage:
+    """Prompt tokens reported by the API, and how many of them the provider served from its prompt cache"""
+    
+    def __init__(self):
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self._lock = threading.Lock()
+    
+    def record(self, usage):
+        """Add the usage block of one response (legacy or v1 client)"""
+        prompt_tokens = getattr(usage, 'prompt_tokens', None)
+        if not prompt_tokens:
+            return
+        details = getattr(usage, 'prompt_tokens_details', None)
+        cached_tokens = getattr(details, 'cached_tokens', None) or 0
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += prompt_tokens
+            self.cached_tokens += cached_tokens
+    
+    @property
+    def hit_rate(self):
+        """Share of prompt tokens served from the prompt cache"""
+        with self._lock:
+            return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+    
+    def status_text(self):
+        """Prompt cache summary for the status bar ('' until the API has reported usage)"""
+        if not self.requests:
+            return ''
+        return f"Prompt cache: {self.hit_rate:.0%} of {self.prompt_tokens} prompt tokens"
+
+_usage = None
+_usage_lock = threading.Lock()
+
+def get_prompt_usage():
+    """Get the process-wide prompt usage counters"""
+    global _usage
+    if _usage is None:
+        with _usage_lock:
+            if _usage is None:
+                _usage = PromptUsage()
+    return _usage
+
+def record_usage(usage):
+    """Record a response's usage block, if it has one"""
+    if usage is not None:
+        get_prompt_usage().record(usage)
+
+def fit_prompt(render, accepted, rejected, system_prompt, budget):
+    """Render the prompt with as many examples as fit in budget; returns (prompt, prompt tokens)
+
+    render(accepted, rejected) builds the prompt from example tuples of
+    (text, topic, tone). Both lists are ranked best first and are considered
+    alternately, so the lowest-ranked examples are the first to be truncated
+    or dropped. If even the prompt without examples is over budget it is
+    returned as it is.
+    """
+    ranked = []
+    for i in range(max(len(accepted), len(rejected))):
+        ranked += [(index, examples[i]) for index, examples in ((0, accepted), (1, rejected)) if i < len(examples)]
+
+    kept = ([], [])
+    prompt = render(*kept)
+    tokens = request_tokens(prompt, system_prompt)
+    for index, example in ranked:
+        kept[index].append(example)
+        candidate = render(*kept)
+        candidate_tokens = request_tokens(candidate, system_prompt)
+
+        # Too long to fit whole: keep the start of it if that is still worth including
+        if candidate_tokens > budget:
+            room = count_tokens(example[0]) - (candidate_tokens - budget)
+            if room < MIN_TRUNCATED_TOKENS:
+                kept[index].pop()
+                break
+            kept[index][-1] = (truncate_to_tokens(example[0], room),) + tuple(example[1:])
+            candidate = render(*kept)
+            candidate_tokens = request_tokens(candidate, system_prompt)
+            if candidate_tokens > budget:
+                kept[index].pop()
+                break
+
+        prompt, tokens = candidate, candidate_tokens
+        if tokens >= budget:
+            break
+    return prompt, tokens
@@ -0,0 +1,326 @@
+"""
+Prompt template engine: python -m prompt_templates check
+
+Loads the templates in system_prompt.py once, validates their placeholders and
+pre-renders everything that does not depend on the request (system messages,
+tone sections, example headings). Building a prompt then only fills the request
+into the validated templates. When system_prompt.py is saved the templates are
+reloaded on next use; a file that fails to load or validate is reported and the
+previous templates stay in use.
+"""
+import argparse
+import functools
+import importlib
+import json
+import os
+import sys
+import threading
+import time
+from string import Formatter
+from error_handler import log_error
+
+# Seconds between checks of system_prompt.py's modification time
+RELOAD_CHECK_INTERVAL = 1.0
+
+# Rendered examples kept per version of the templates
+EXAMPLE_CACHE_SIZE = 512
+
+# Prompts rendered by the builders the templates replaced, across every tone and example
+# shape; `check` fails when the templates render anything different
+GOLDEN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'prompt_golden.json')
+
+# Kinds of example section
+ACCEPTED = 'accepted'
+REJECTED = 'rejected'
+REFRESH_REJECTED = 'refresh_rejected'
+
+# Plain texts system_prompt.py must define
+TEXTS = ['SYSTEM_PROMPT', 'REFRESH_SYSTEM_PROMPT', 'GENERATION_INSTRUCTIONS', 'REFRESH_INSTRUCTIONS',
+         'DEFAULT_TONE_INSTRUCTION', 'TONE_GUIDE_HEADER', 'ACCEPTED_HEADER', 'REJECTED_HEADER',
+         'REFRESH_REJECTED_HEADER']
+
+# Templates system_prompt.py must define, with the placeholders each must use
+TEMPLATES = {
+    'TONE_GUIDE_ENTRY': {'tone', 'instructions'},
+    'REQUIRED_TONE_TEMPLATE': {'tone'},
+    'CUSTOM_TONE_TEMPLATE': {'tone', 'instructions'},
+    'ACCEPTED_EXAMPLE_TEMPLATE': {'number', 'tone_label', 'text'},
+    'ACCEPTED_TONE_LABEL': {'tone'},
+    'REJECTED_EXAMPLE_TEMPLATE': {'number', 'text'},
+    'PREVIOUS_ATTEMPT_TEMPLATE': {'text'},
+    'REFRESH_REJECTED_EXAMPLE_TEMPLATE': {'number', 'text'},
+    'GENERATION_TEMPLATE': {'tone_section', 'accepted_examples', 'rejected_examples', 'raw_text', 'context',
+                            'audience'},
+    'REFRESH_TEMPLATE': {'tone_section', 'accepted_examples', 'rejected_examples', 'raw_text', 'context',
+                         'audience'}
+}
+
+class TemplateError(Exception):
+    """system_prompt.py is missing a template or a template has the wrong placeholders"""
+
+def placeholders(name, template):
+    """Names of a template's placeholders, rejecting positional, indexed and formatted ones"""
+    try:
+        parsed = list(Formatter().parse(template))
+    except ValueError as e:
+        raise TemplateError(f"{name}: {e}")
+    
+    names = set()
+    for _, field, spec, conversion in parsed:
+        if field is None:
+            continue
+        if not field.isidentifier() or spec or conversion:
+            raise TemplateError(f"{name}: unsupported placeholder {{{field}}}; use plain {{name}} placeholders")
+        names.add(field)
+    return names
+
+def compile_template(name, template):
+    """Compile a template into a function of its placeholders, rendered as an f-string
+
+    The placeholders have been checked to be plain names, and a template with
+    only plain names means the same as an f-string, so str.format's per-call
+    parsing is done once here instead.
+    """
+    fields = sorted(placeholders(name, template))
+    source = f"lambda *, {', '.join(fields)}: f{template!r}" if fields else f"lambda: {template!r}"
+    return eval(compile(source, f"<{name}>", 'eval'), {})
+
+class PromptTemplates:
+    """The templates of one version of system_prompt.py, validated and partly pre-rendered"""
+    
+    def __init__(self, module):
+        for name in TEXTS + list(TEMPLATES):
+            if not isinstance(getattr(module, name, None), str):
+                raise TemplateError(f"{name} is missing or is not a string")
+        for name, expected in TEMPLATES.items():
+            found = placeholders(name, getattr(module, name))
+            if found != expected:
+                wanted = ', '.join(f"{{{field}}}" for field in sorted(expected))
+                raise TemplateError(f"{name} must use exactly {wanted}")
+        
+        tones = getattr(module, 'TONE_INSTRUCTIONS', None)
+        if not isinstance(tones, dict) or not all(isinstance(tone, str) and isinstance(text, str)
+                                                  for tone, text in tones.items()):
+            raise TemplateError("TONE_INSTRUCTIONS must be a dictionary of tone names to instructions")
+        
+        self.texts = {name: getattr(module, name) for name in TEXTS}
+        self.tone_instructions = dict(tones)
+        self.default_tone_instruction = module.DEFAULT_TONE_INSTRUCTION
+        compiled = {name: compile_template(name, getattr(module, name)) for name in TEMPLATES}
+        self._custom_tone = compiled['CUSTOM_TONE_TEMPLATE']
+        self._accepted_example = compiled['ACCEPTED_EXAMPLE_TEMPLATE']
+        self._accepted_tone_label = compiled['ACCEPTED_TONE_LABEL']
+        self._rejected_example = compiled['REJECTED_EXAMPLE_TEMPLATE']
+        self._previous_attempt = compiled['PREVIOUS_ATTEMPT_TEMPLATE']
+        self._refresh_rejected_example = compiled['REFRESH_REJECTED_EXAMPLE_TEMPLATE']
+        self._generation = compiled['GENERATION_TEMPLATE']
+        self._refresh = compiled['REFRESH_TEMPLATE']
+        
+        # Everything below is the same for every request, so it is rendered once here
+        tone_guide = module.TONE_GUIDE_HEADER + ''.join(
+            compiled['TONE_GUIDE_ENTRY'](tone=tone, instructions=instructions)
+            for tone, instructions in tones.items())
+        self.generation_system = f"{module.SYSTEM_PROMPT}\n\n{module.GENERATION_INSTRUCTIONS}\n\n{tone_guide}"
+        self.refresh_system = f"{module.REFRESH_SYSTEM_PROMPT}\n\n{module.REFRESH_INSTRUCTIONS}\n\n{tone_guide}"
+        self.tone_sections = {tone: compiled['REQUIRED_TONE_TEMPLATE'](tone=tone) for tone in tones}
+        
+        # fit_prompt renders the same examples again each time it tries one more
+        self.example = functools.lru_cache(maxsize=EXAMPLE_CACHE_SIZE)(self._render_example)
+    
+    def get_tone_instructions(self, tone):
+        """Instructions for a tone, or the default instruction for an unknown one"""
+        return self.tone_instructions.get(tone, self.default_tone_instruction)
+    
+    def tone_section(self, tone):
+        """The REQUIRED TONE section; a tone missing from the tone guide brings its own instructions"""
+        section = self.tone_sections.get(tone)
+        if section is None:
+            section = self._custom_tone(tone=tone, instructions=self.default_tone_instruction)
+        return section
+    
+    def accepted_examples(self, examples):
+        """EXAMPLES TO EMULATE section for (text, topic, tone) tuples, or ''"""
+        if not examples:
+            return ''
+        example = self.example
+        return self.texts['ACCEPTED_HEADER'] + ''.join(
+            example(ACCEPTED, number, text, tone) for number, (text, topic, tone) in enumerate(examples, 1))
+    
+    def _render_example(self, kind, number, text, tone):
+        """One example as it appears in a prompt"""
+        if kind == ACCEPTED:
+            label = self._accepted_tone_label(tone=tone) if tone and tone != "None" else ''
+            return self._accepted_example(number=number, tone_label=label, text=text)
+        if kind == REJECTED:
+            return self._rejected_example(number=number, text=text)
+        if number == 1:
+            return self._previous_attempt(text=text)
+        return self._refresh_rejected_example(number=number, text=text)
+    
+    def generation_prompt(self, raw_text, context, audience, tone, accepted_responses, rejected_responses=None):
+        """User message for a generation"""
+        rejected = ''
+        if rejected_responses:
+            example = self.example
+            rejected = self.texts['REJECTED_HEADER'] + ''.join(
+                example(REJECTED, number, text, None) for number, (text, topic, resp_tone) in enumerate(rejected_responses, 1))
+        return self._generation(tone_section=self.tone_section(tone),
+                                accepted_examples=self.accepted_examples(accepted_responses),
+                                rejected_examples=rejected, raw_text=raw_text, context=context, audience=audience)
+    
+    def refresh_prompt(self, raw_text, context, audience, tone, accepted_examples, rejected_examples):
+        """User message for a refresh; the first rejected example is the draft being replaced"""
+        rejected = ''
+        if rejected_examples:
+            example = self.example
+            rejected = self.texts['REFRESH_REJECTED_HEADER'] + ''.join(
+                example(REFRESH_REJECTED, number, text, None)
+                for number, (text, topic, resp_tone) in enumerate(rejected_examples, 1))
+        return self._refresh(tone_section=self.tone_section(tone),
+                             accepted_examples=self.accepted_examples(accepted_examples),
+                             rejected_examples=rejected, raw_text=raw_text, context=context, audience=audience)
+
+_templates = None
+_source_mtime = None
+_next_check = 0.0
+_templates_lock = threading.Lock()
+
+def _source_path():
+    """Path of system_prompt.py"""
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'system_prompt.py')
+
+def _load(reload):
+    """Import (or re-import) system_prompt.py and compile its templates"""
+    module = importlib.import_module('system_prompt')
+    if reload:
+        module = importlib.reload(module)
+    return PromptTemplates(module)
+
+def get_templates():
+    """The current templates, reloaded first if system_prompt.py has been saved since they were loaded"""
+    global _templates, _source_mtime, _next_check
+    now = time.monotonic()
+    if _templates is not None and now < _next_check:
+        return _templates
+    
+    with _templates_lock:
+        if _templates is not None and now < _next_check:
+            return _templates
+        _next_check = now + RELOAD_CHECK_INTERVAL
+        try:
+            mtime = os.path.getmtime(_source_path())
+        except OSError:
+            mtime = None
+        
+        if _templates is None:
+            _templates = _load(reload=False)
+            _source_mtime = mtime
+        elif mtime != _source_mtime:
+            # Remember the new version even if it is broken, so it is reported once, not every second
+            _source_mtime = mtime
+            try:
+                _templates = _load(reload=True)
+            except Exception as e:
+                log_error("Prompt template reload error; keeping the previous templates", e)
+        return _templates
+
+def construct_prompt(raw_text, context, audience, tone, accepted_responses, rejected_responses=None):
+    """User message for a generation: tone and examples first, then the statement itself"""
+    return get_templates().generation_prompt(raw_text, context, audience, tone, accepted_responses,
+                                             rejected_responses)
+
+def construct_refresh_prompt(raw_text, context, audience, tone, accepted_examples, rejected_examples):
+    """User message for a refresh, which asks for a markedly different draft"""
+    return get_templates().refresh_prompt(raw_text, context, audience, tone, accepted_examples, rejected_examples)
+
+def system_message(refresh=False):
+    """System message for a generation or a refresh: persona, static instructions and tone guide"""
+    templates = get_templates()
+    return templates.refresh_system if refresh else templates.generation_system
+
+def get_tone_instructions(tone):
+    """Instructions for a tone, or the default instruction for an unknown one"""
+    return get_templates().get_tone_instructions(tone)
+
+def sample_requests(templates):
+    """Rendering inputs covering every tone, an unknown tone and empty or tone-less examples"""
+    accepted = [("An accepted statement with {braces}.", "Topic", "Formal/Professional"),
+                ("Another accepted statement.", "Topic", None), ("A third one.", "Topic", "None")]
+    rejected = [("The previous attempt.", "Audience", "Neutral/Balanced"), ("An older rejected draft.", "Topic", None)]
+    for tone in list(templates.tone_instructions) + ["Not a listed tone", ""]:
+        yield ("Raw statement.", "Local context", "Local residents", tone, accepted, rejected)
+        yield ("Raw statement.", "", "", tone, [], [])
+        yield ("Raw statement.", "Local context", "Local residents", tone, accepted[:1], None)
+
+def _request(stored):
+    """A request read back from the golden file, with examples as tuples again"""
+    raw_text, context, audience, tone, accepted, rejected = stored
+    return (raw_text, context, audience, tone, [tuple(example) for example in accepted],
+            None if rejected is None else [tuple(example) for example in rejected])
+
+def render_golden(templates):
+    """System messages and generation/refresh prompts for every sample request, in golden file form"""
+    return {
+        'system': {'generation': templates.generation_system, 'refresh': templates.refresh_system},
+        'prompts': [{'request': request, 'generation': construct_prompt(*request),
+                     'refresh': construct_refresh_prompt(*request[:5], request[5] or [])}
+                    for request in sample_requests(templates)]
+    }
+
+def check(golden_path=GOLDEN_FILE, render=None, render_refresh=None, system=None):
+    """Validate the templates and compare renderings with the golden file; returns the mismatches
+
+    render, render_refresh and system default to this module's construct_prompt,
+    construct_refresh_prompt and system_message; pass an application's own to
+    check that entry point.
+    """
+    get_templates()
+    render = render or construct_prompt
+    render_refresh = render_refresh or construct_refresh_prompt
+    system = system or system_message
+    with open(golden_path, 'r', encoding='utf-8') as file:
+        golden = json.load(file)
+    
+    mismatches = []
+    if golden['system'] != {'generation': system(), 'refresh': system(refresh=True)}:
+        mismatches.append("system messages")
+    for expected in golden['prompts']:
+        request = _request(expected['request'])
+        if render(*request) != expected['generation']:
+            mismatches.append(f"generation prompt for tone {request[3]!r}")
+        if render_refresh(*request[:5], request[5] or []) != expected['refresh']:
+            mismatches.append(f"refresh prompt for tone {request[3]!r}")
+    return mismatches
+
+def main():
+    """Check the prompt templates from the command line"""
+    parser = argparse.ArgumentParser(description="Prompt template checks")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    check_parser = subparsers.add_parser('check', help="validate system_prompt.py and compare its prompts with the "
+                                                       "golden renderings")
+    check_parser.add_argument('--golden', default=GOLDEN_FILE, help="golden renderings file")
+    check_parser.add_argument('--update', action='store_true',
+                              help="rewrite the golden file from the current templates after a deliberate edit")
+    args = parser.parse_args()
+    
+    try:
+        if args.update:
+            with open(args.golden, 'w', encoding='utf-8') as file:
+                json.dump(render_golden(get_templates()), file, ensure_ascii=False, indent=1)
+                file.write('\n')
+            print(f"Golden renderings written to {args.golden}")
+            return
+        mismatches = check(args.golden)
+    except TemplateError as e:
+        print(f"Invalid template: {e}")
+        sys.exit(1)
+    
+    if mismatches:
+        for mismatch in mismatches:
+            print(f"  differs: {mismatch}")
+        print("If the templates were changed on purpose, run: python -m prompt_templates check --update")
+        sys.exit(1)
+    print("Templates valid; prompts match the golden renderings")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import threading
+import time
+from error_handler import log_error
+from db_pool import get_connection
+from db_writer import run_write, submit_write
+
+# Cached completions older than this are treated as misses and dropped
+CACHE_TTL_SECONDS = 7 * 24 * 3600
+
+# Total response text kept before the least recently used entries are evicted
+CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+RESPONSE_CACHE_DDL = [
+    '''
+    CREATE TABLE IF NOT EXISTS llm_cache (
+        key TEXT PRIMARY KEY,
+        model TEXT,
+        response TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        created REAL NOT NULL,
+        last_used REAL NOT NULL
+    )
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache(last_used)
+    '''
+]
+
+def create_cache_table(conn):
+    """Create the response cache table"""
+    for statement in RESPONSE_CACHE_DDL:
+        conn.execute(statement)
+
+def cache_key(model, system_prompt, prompt, params):
+    """Content hash identifying one completion request"""
+    payload = json.dumps([model, system_prompt, prompt, params], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    """Persistent LLM response cache with TTL and size-bounded LRU eviction"""
+    
+    def __init__(self, ttl=CACHE_TTL_SECONDS, max_bytes=CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+    
+    def _count(self, hit):
+        """Record a lookup outcome"""
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+    
+    def get(self, key):
+        """Cached response text for a key, or None"""
+        now = time.time()
+        with get_connection() as conn:
+            row = conn.execute("SELECT response, created FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        
+        if row is None or now - row[1] > self.ttl:
+            self._count(False)
+            return None
+        
+        # Recency only orders eviction, so it need not hold up the caller
+        submit_write(lambda conn: conn.execute(
+            "UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key)))
+        self._count(True)
+        return row[0]
+    
+    def put(self, key, model, response):
+        """Store a response and evict expired and least recently used entries"""
+        now = time.time()
+        size = len(response.encode('utf-8'))
+        
+        def store(conn):
+            conn.execute("""
+            INSERT OR REPLACE INTO llm_cache (key, model, response, size, created, last_used)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """, (key, model, response, size, now, now))
+            self._evict(conn, now)
+        
+        run_write(store)
+    
+    def _evict(self, conn, now):
+        """Drop expired entries, then the oldest-used ones beyond the size budget"""
+        conn.execute("DELETE FROM llm_cache WHERE created < ?", (now - self.ttl,))
+        conn.execute("""
+        DELETE FROM llm_cache WHERE key IN (
+            SELECT key FROM (
+                SELECT key, SUM(size) OVER (ORDER BY last_used DESC, key) AS running FROM llm_cache
+            ) WHERE running > ?
+        )
+        """, (self.max_bytes,))
+    
+    def clear(self):
+        """Remove every cached response"""
+        run_write(lambda conn: conn.execute("DELETE FROM llm_cache"))
+    
+    @property
+    def hit_rate(self):
+        """Share of lookups answered from the cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return self.hits / lookups if lookups else 0.0
+    
+    def status_text(self):
+        """Hit/miss summary for the status bar"""
+        with self._lock:
+            return f"Cache: {self.hits} hits / {self.misses} misses"
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_response_cache():
+    """Get the process-wide response cache"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache()
+    return _cache
+
+def cached_completion(model, system_prompt, prompt, params, create, use_cache=True):
+    """Return (text, from_cache), calling create() only on a cache miss
+
+    Cache failures are logged and never stop a generation.
+    """
+    if not use_cache:
+        return create(), False
+    
+    cache = get_response_cache()
+    key = cache_key(model, system_prompt, prompt, params)
+    try:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached, True
+    except Exception as e:
+        log_error("Response cache read error", e)
+    
+    text = create()
+    try:
+        if text:
+            cache.put(key, model, text)
+    except Exception as e:
+        log_error("Response cache write error", e)
+    return text, False
@@ -0,0 +1,201 @@
+from error_handler import log_error
+from search_index import create_search_index
+from example_sampler import create_sampler_tables
+from response_cache import create_cache_table
+from dedupe import add_content_hash_column
+from near_duplicates import create_near_duplicate_tables
+from metrics import create_metrics_table
+from example_retriever import create_change_log
+
+SUBMISSIONS_DDL = '''
+CREATE TABLE IF NOT EXISTS submissions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    original_text TEXT NOT NULL,
+    context TEXT,
+    target_audience TEXT,
+    tone TEXT,
+    generated_text TEXT,
+    status TEXT DEFAULT 'pending',
+    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+    notes TEXT
+)
+'''
+
+PAST_RESPONSES_DDL = '''
+CREATE TABLE IF NOT EXISTS past_responses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    published_text TEXT NOT NULL,
+    topic TEXT,
+    tone TEXT,
+    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+    source TEXT,
+    tags TEXT
+)
+'''
+
+# (timestamp, id) serves newest-first listings in either direction, (status, timestamp, id)
+# serves status counts and status-filtered listings from the index alone
+QUERY_INDEX_DDL = [
+    '''
+    CREATE INDEX IF NOT EXISTS idx_submissions_timestamp ON submissions(timestamp, id)
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS idx_submissions_status ON submissions(status, timestamp, id)
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS idx_past_responses_timestamp ON past_responses(timestamp, id)
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS idx_llm_cache_created ON llm_cache(created)
+    '''
+]
+
+def create_base_tables(conn):
+    """Create the submissions and past_responses tables"""
+    conn.execute(SUBMISSIONS_DDL)
+    conn.execute(PAST_RESPONSES_DDL)
+
+def create_query_indexes(conn):
+    """Create the secondary indexes behind the listing, status and cache queries"""
+    for statement in QUERY_INDEX_DDL:
+        conn.execute(statement)
+
+def add_prompt_tokens_column(conn):
+    """Add submissions.prompt_tokens; submissions logged before it stay NULL"""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(submissions)")}
+    if 'prompt_tokens' not in columns:
+        conn.execute("ALTER TABLE submissions ADD COLUMN prompt_tokens INTEGER")
+
+# Applied in order, each exactly once; PRAGMA user_version records the last one applied.
+# Every step is idempotent so databases created before versioning upgrade cleanly.
+# Append new steps; never edit or renumber released ones.
+MIGRATIONS = [
+    (1, "submissions and past_responses tables", create_base_tables),
+    (2, "full-text search index", create_search_index),
+    (3, "example sampler slot tables", create_sampler_tables),
+    (4, "LLM response cache", create_cache_table),
+    (5, "secondary indexes", create_query_indexes),
+    (6, "library content hashes", add_content_hash_column),
+    (7, "near-duplicate LSH index", create_near_duplicate_tables),
+    (8, "submission prompt token counts", add_prompt_tokens_column),
+    (9, "persisted stage timings", create_metrics_table),
+    (10, "example retrieval change log", create_change_log)
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def schema_version(conn):
+    """Schema version recorded in the database file"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn):
+    """Apply pending migrations and return the schema version
+
+    Runs as a write job (see db_writer.run_write), so all steps commit together.
+    """
+    version = schema_version(conn)
+    if version > SCHEMA_VERSION:
+        log_error("Schema migration", Exception(
+            f"Database schema version {version} is newer than this application ({SCHEMA_VERSION})"))
+        return version
+    
+    for number, description, apply in MIGRATIONS:
+        if number > version:
+            apply(conn)
+            conn.execute(f"PRAGMA user_version = {number}")
+            version = number
+    return version
+
+# The application's frequent queries with the index each must use. check_query_plans
+# fails if one of them loses its index or needs a temporary sort.
+HOT_QUERIES = [
+    ("submission by id",
+     "SELECT original_text, context, target_audience, tone, generated_text, notes FROM submissions WHERE id = ?",
+     (1,), "USING INTEGER PRIMARY KEY"),
+    ("history first page",
+     "SELECT id, timestamp, status, target_audience, tone, substr(original_text, 1, 51) FROM submissions "
+     "ORDER BY timestamp DESC, id DESC LIMIT ?",
+     (100,), "idx_submissions_timestamp"),
+    ("history next page",
+     "SELECT id, timestamp, status, target_audience, tone, substr(original_text, 1, 51) FROM submissions "
+     "WHERE (timestamp, id) < (?, ?) ORDER BY timestamp DESC, id DESC LIMIT ?",
+     ('2024-01-01 00:00:00', 1, 100), "idx_submissions_timestamp"),
+    ("history previous page",
+     "SELECT id, timestamp, status, target_audience, tone, substr(original_text, 1, 51) FROM submissions "
+     "WHERE (timestamp, id) > (?, ?) ORDER BY timestamp, id LIMIT ?",
+     ('2024-01-01 00:00:00', 1, 100), "idx_submissions_timestamp"),
+    ("history undated rows",
+     "SELECT id, timestamp, status, target_audience, tone, substr(original_text, 1, 51) FROM submissions "
+     "WHERE timestamp IS NULL AND id < ? ORDER BY timestamp DESC, id DESC LIMIT ?",
+     (1, 100), "idx_submissions_timestamp"),
+    ("library first page",
+     "SELECT id, timestamp, topic, tone, substr(published_text, 1, 51) FROM past_responses "
+     "ORDER BY timestamp DESC, id DESC LIMIT ?",
+     (100,), "idx_past_responses_timestamp"),
+    ("library next page",
+     "SELECT id, timestamp, topic, tone, substr(published_text, 1, 51) FROM past_responses "
+     "WHERE (timestamp, id) < (?, ?) ORDER BY timestamp DESC, id DESC LIMIT ?",
+     ('2024-01-01 00:00:00', 1, 100), "idx_past_responses_timestamp"),
+    ("submissions with status",
+     "SELECT COUNT(*) FROM submissions WHERE status = ?",
+     ('rejected',), "idx_submissions_status"),
+    ("reject sibling drafts",
+     "UPDATE submissions SET status = 'rejected' WHERE id IN (?, ?) AND status = 'pending'",
+     (1, 2), "USING INTEGER PRIMARY KEY"),
+    ("submission search",
+     "SELECT s.id, s.timestamp, s.status FROM submissions_fts JOIN submissions s ON s.id = submissions_fts.rowid "
+     "WHERE submissions_fts MATCH ? ORDER BY bm25(submissions_fts) LIMIT ?",
+     ('"bypass"*', 200), "USING INTEGER PRIMARY KEY"),
+    ("library search",
+     "SELECT p.id, p.timestamp, p.topic FROM past_responses_fts JOIN past_responses p "
+     "ON p.id = past_responses_fts.rowid WHERE past_responses_fts MATCH ? ORDER BY bm25(past_responses_fts) LIMIT ?",
+     ('"bypass"*', 200), "USING INTEGER PRIMARY KEY"),
+    ("new library rows for retrieval",
+     "SELECT id, published_text, topic, tone FROM past_responses WHERE id > ? ORDER BY id",
+     (1,), "USING INTEGER PRIMARY KEY"),
+    ("library duplicate check",
+     "SELECT id FROM past_responses WHERE content_hash = ?",
+     ('0' * 40,), "idx_past_responses_hash"),
+    ("unhashed library rows",
+     "SELECT id, published_text FROM past_responses WHERE content_hash IS NULL ORDER BY id LIMIT ?",
+     (1000,), "idx_past_responses_hash"),
+    ("near-duplicate bucket",
+     "SELECT source, row_id FROM near_duplicate_bands WHERE band = ? AND bucket = ? LIMIT ?",
+     (0, 0, 200), "PRIMARY KEY"),
+    ("near-duplicate bands of new library rows",
+     "SELECT band, bucket, row_id FROM near_duplicate_bands WHERE source = 'library' AND row_id > ?",
+     (1,), "idx_near_duplicate_bands_row"),
+    ("near-duplicate older bucket members",
+     "SELECT source, row_id FROM near_duplicate_bands "
+     "WHERE band = ? AND bucket = ? AND NOT (source = 'library' AND row_id > ?) LIMIT ?",
+     (0, 0, 1, 200), "PRIMARY KEY"),
+    ("near-duplicate sync of accepted submissions",
+     "SELECT id, generated_text FROM submissions s WHERE status = 'accepted' AND NOT EXISTS "
+     "(SELECT 1 FROM near_duplicate_bands b WHERE b.source = 'submission' AND b.row_id = s.id) LIMIT ?",
+     (2000,), "idx_near_duplicate_bands_row"),
+    ("example changes since last refresh",
+     "SELECT seq, pool, row_id FROM example_changes WHERE seq > ? ORDER BY seq",
+     (0,), "USING INTEGER PRIMARY KEY"),
+    ("cache lookup",
+     "SELECT response, created FROM llm_cache WHERE key = ?",
+     ('key',), "sqlite_autoindex_llm_cache_1"),
+    ("cache expiry",
+     "DELETE FROM llm_cache WHERE created < ?",
+     (0,), "idx_llm_cache_created"),
+    ("metrics expiry",
+     "DELETE FROM metrics WHERE recorded < ?",
+     (0,), "idx_metrics_recorded")
+]
+
+def explain(conn, sql, params=()):
+    """Query plan of a statement as one line of plan steps"""
+    return ' | '.join(row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params))
+
+def check_query_plans(conn):
+    """Return (name, plan) for each hot query that misses its index or sorts in a temp B-tree"""
+    failures = []
+    for name, sql, params, expected in HOT_QUERIES:
+        plan = explain(conn, sql, params)
+        if expected not in plan or ('TEMP B-TREE' in plan and 'bm25' not in sql):
+            failures.append((name, plan))
+    return failures
@@ -0,0 +1,202 @@
+import argparse
+import re
+import sqlite3
+from error_handler import log_error
+from db_pool import get_connection
+from db_writer import run_write
+
+# External-content FTS5 tables: the text lives only in the base tables, the
+# index stores tokens. prefix='2 3' keeps short prefix queries off a full scan.
+SEARCH_INDEX_DDL = [
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS submissions_fts USING fts5(
+        original_text, generated_text, target_audience, tone, status,
+        content='submissions', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS submissions_fts_insert AFTER INSERT ON submissions BEGIN
+        INSERT INTO submissions_fts(rowid, original_text, generated_text, target_audience, tone, status)
+        VALUES (new.id, new.original_text, new.generated_text, new.target_audience, new.tone, new.status);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS submissions_fts_delete AFTER DELETE ON submissions BEGIN
+        INSERT INTO submissions_fts(submissions_fts, rowid, original_text, generated_text, target_audience, tone, status)
+        VALUES ('delete', old.id, old.original_text, old.generated_text, old.target_audience, old.tone, old.status);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS submissions_fts_update AFTER UPDATE ON submissions BEGIN
+        INSERT INTO submissions_fts(submissions_fts, rowid, original_text, generated_text, target_audience, tone, status)
+        VALUES ('delete', old.id, old.original_text, old.generated_text, old.target_audience, old.tone, old.status);
+        INSERT INTO submissions_fts(rowid, original_text, generated_text, target_audience, tone, status)
+        VALUES (new.id, new.original_text, new.generated_text, new.target_audience, new.tone, new.status);
+    END
+    ''',
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS past_responses_fts USING fts5(
+        published_text, topic, tone,
+        content='past_responses', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS past_responses_fts_insert AFTER INSERT ON past_responses BEGIN
+        INSERT INTO past_responses_fts(rowid, published_text, topic, tone)
+        VALUES (new.id, new.published_text, new.topic, new.tone);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS past_responses_fts_delete AFTER DELETE ON past_responses BEGIN
+        INSERT INTO past_responses_fts(past_responses_fts, rowid, published_text, topic, tone)
+        VALUES ('delete', old.id, old.published_text, old.topic, old.tone);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS past_responses_fts_update AFTER UPDATE ON past_responses BEGIN
+        INSERT INTO past_responses_fts(past_responses_fts, rowid, published_text, topic, tone)
+        VALUES ('delete', old.id, old.published_text, old.topic, old.tone);
+        INSERT INTO past_responses_fts(rowid, published_text, topic, tone)
+        VALUES (new.id, new.published_text, new.topic, new.tone);
+    END
+    '''
+]
+
+SEARCH_TABLES = ['submissions_fts', 'past_responses_fts']
+
+# Search dropdown options mapped to indexed columns (None searches every column)
+SUBMISSION_SEARCH_COLUMNS = {
+    "All Fields": None,
+    "Content": ['original_text', 'generated_text'],
+    "Audience": ['target_audience'],
+    "Status": ['status'],
+    "Tone": ['tone']
+}
+
+APPROVED_SEARCH_COLUMNS = {
+    "All Fields": None,
+    "Content": ['published_text'],
+    "Topic": ['topic'],
+    "Tone": ['tone']
+}
+
+# Markers placed around matched terms in result previews
+HIGHLIGHT_START = '['
+HIGHLIGHT_END = ']'
+
+DEFAULT_RESULT_LIMIT = 200
+
+def create_search_index(conn):
+    """Create the FTS5 tables and sync triggers, indexing any existing rows"""
+    existing = {row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name IN (?, ?)", SEARCH_TABLES)}
+    
+    for statement in SEARCH_INDEX_DDL:
+        conn.execute(statement)
+    
+    # Databases created before the index existed need a one-off rebuild
+    for table in SEARCH_TABLES:
+        if table not in existing:
+            conn.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+
+def index_new_past_responses(conn, after_id):
+    """Index library rows with id > after_id in one statement (bulk loads that bypass the insert trigger)"""
+    conn.execute("""
+    INSERT INTO past_responses_fts(rowid, published_text, topic, tone)
+    SELECT id, published_text, topic, tone FROM past_responses WHERE id > ?
+    """, (after_id,))
+
+def rebuild_search_index():
+    """Rebuild both search indexes from the base tables and merge their segments"""
+    def rebuild(conn):
+        for statement in SEARCH_INDEX_DDL:
+            conn.execute(statement)
+        for table in SEARCH_TABLES:
+            conn.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+            conn.execute(f"INSERT INTO {table}({table}) VALUES ('optimize')")
+    
+    run_write(rebuild)
+
+def build_match_query(search_text, columns=None):
+    """Turn free text into an FTS5 query: every word must match, as a prefix"""
+    terms = re.findall(r'\w+', search_text or '')
+    if not terms:
+        return None
+    
+    # Quoting each term keeps FTS5 operators and punctuation in user input literal
+    query = ' '.join(f'"{term}"*' for term in terms)
+    
+    if columns:
+        query = '{' + ' '.join(columns) + '} : (' + query + ')'
+    return query
+
+def find_submissions(search_text, search_field="All Fields", limit=DEFAULT_RESULT_LIMIT):
+    """Search submissions, best match first
+
+    Returns rows of (id, timestamp, status, target_audience, tone, original_text,
+    generated_text, snippet) where snippet marks the matched terms.
+    """
+    match = build_match_query(search_text, SUBMISSION_SEARCH_COLUMNS.get(search_field))
+    if match is None:
+        return []
+    
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Weight the statement text above the short metadata columns
+        cursor.execute(f"""
+        SELECT s.id, s.timestamp, s.status, s.target_audience, s.tone, s.original_text, s.generated_text,
+               snippet(submissions_fts, -1, '{HIGHLIGHT_START}', '{HIGHLIGHT_END}', '...', 8)
+        FROM submissions_fts
+        JOIN submissions s ON s.id = submissions_fts.rowid
+        WHERE submissions_fts MATCH ?
+        ORDER BY bm25(submissions_fts, 10.0, 10.0, 2.0, 1.0, 1.0)
+        LIMIT ?
+        """, (match, limit))
+        
+        return cursor.fetchall()
+
+def find_approved_statements(search_text, search_field="All Fields", limit=DEFAULT_RESULT_LIMIT):
+    """Search approved statements, best match first
+
+    Returns rows of (id, timestamp, topic, tone, published_text, snippet) where
+    snippet marks the matched terms.
+    """
+    match = build_match_query(search_text, APPROVED_SEARCH_COLUMNS.get(search_field))
+    if match is None:
+        return []
+    
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(f"""
+        SELECT p.id, p.timestamp, p.topic, p.tone, p.published_text,
+               snippet(past_responses_fts, -1, '{HIGHLIGHT_START}', '{HIGHLIGHT_END}', '...', 8)
+        FROM past_responses_fts
+        JOIN past_responses p ON p.id = past_responses_fts.rowid
+        WHERE past_responses_fts MATCH ?
+        ORDER BY bm25(past_responses_fts, 10.0, 2.0, 1.0)
+        LIMIT ?
+        """, (match, limit))
+        
+        return cursor.fetchall()
+
+def main():
+    """Maintain the search index from the command line"""
+    parser = argparse.ArgumentParser(description="MP Statement Rewriter search index")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('rebuild', help="rebuild the full-text index from the database")
+    args = parser.parse_args()
+    
+    if args.command == 'rebuild':
+        try:
+            rebuild_search_index()
+            print("Search index rebuilt")
+        except sqlite3.Error as e:
+            log_error("Search index rebuild error", e)
+            print(f"Failed to rebuild search index: {str(e)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import threading
+from job_executor import PRIORITY_SPECULATIVE, submit_job
+
+class SpeculativeRefresh:
+    """Requests the next refresh draft in the background so Refresh can show it at once"""
+    
+    def __init__(self):
+        self.requests = 0
+        self.tokens = 0
+        self.used = 0
+        self.wasted = 0
+        self.wasted_tokens = 0
+        self._key = None
+        self._job = None
+        self._lock = threading.Lock()
+    
+    def start(self, key, generate, *args):
+        """Replace any pending speculation with generate(*args), valid only while key is unchanged
+
+        generate runs below all other background work and returns (text, estimated_tokens).
+        """
+        self.discard()
+        job = submit_job(self._run, generate, args, priority=PRIORITY_SPECULATIVE, name="speculative-refresh")
+        with self._lock:
+            self._key = key
+            self._job = job
+    
+    def _run(self, generate, args):
+        """Job body: generate the draft and record its spend"""
+        text, cost = generate(*args)
+        with self._lock:
+            self.requests += 1
+            self.tokens += cost
+        return text, cost
+    
+    def claim(self, key):
+        """Job holding the speculative draft for key, or None if there is no usable one
+
+        A speculation for other inputs, or one that has not started yet, is discarded.
+        """
+        with self._lock:
+            job, matches = self._job, self._key == key
+            self._job = self._key = None
+        if job is None:
+            return None
+        
+        future = job.future
+        usable = future.running() or (future.done() and not future.cancelled() and future.exception() is None)
+        if matches and usable:
+            return job
+        
+        self._drop(job)
+        return None
+    
+    def record_used(self):
+        """Count a claimed draft once it has actually been shown (claimed ones can still fail)"""
+        with self._lock:
+            self.used += 1
+    
+    def discard(self):
+        """Drop the pending speculation, e.g. once the draft is accepted or new inputs are submitted"""
+        with self._lock:
+            job = self._job
+            self._job = self._key = None
+        if job is not None:
+            self._drop(job)
+    
+    def _drop(self, job):
+        """Cancel a speculation and count its spend as wasted once it settles"""
+        job.cancel()
+        job.future.add_done_callback(self._settle)
+    
+    def _settle(self, future):
+        """Done callback for dropped speculations"""
+        if future.cancelled() or future.exception() is not None:
+            return
+        _, cost = future.result()
+        with self._lock:
+            self.wasted += 1
+            self.wasted_tokens += cost
+    
+    def status_text(self):
+        """Speculation summary for the status bar ('' until a draft has been pre-generated)"""
+        with self._lock:
+            if not self.requests:
+                return ''
+            return f"Pre-generated: {self.used} used / {self.wasted} discarded (~{self.wasted_tokens} extra tokens)"
@@ -0,0 +1,267 @@
+import csv
+import os
+import sqlite3
+import time
+from collections import deque
+from db_pool import get_connection
+from db_writer import submit_write
+from job_executor import current_token
+from search_index import index_new_past_responses
+from example_sampler import LIBRARY, add_library_slots
+from dedupe import content_hash
+from near_duplicates import flag_new_statements
+
+# Rows written per writer transaction; override with CHUNK_SIZE in an [IMPORT] section
+DEFAULT_CHUNK_SIZE = 10000
+
+# Seconds between progress reports, however fast or slow rows arrive
+PROGRESS_INTERVAL = 0.25
+
+# Skipped and failed rows reported one by one; beyond this they are only counted
+MAX_ROW_MESSAGES = 200
+
+# Chunks queued on the writer while the next one is parsed
+MAX_CHUNKS_IN_FLIGHT = 2
+
+REQUIRED_COLUMNS = ['text', 'topic']
+
+# Order of the inserted values, with the value used when a row has no such column
+IMPORT_FIELDS = [('text', None), ('topic', None), ('tone', None), ('timestamp', None), ('source', "Imported"),
+                 ('tags', None)]
+
+# Rows whose text is already in the library (after normalisation) are skipped
+INSERT_SQL = """
+INSERT INTO past_responses (published_text, topic, tone, timestamp, source, tags, content_hash)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(content_hash) DO NOTHING
+"""
+
+# Per-row triggers that a chunk replaces with one set-based statement each
+BULK_TRIGGERS = {
+    'past_responses_fts_insert': index_new_past_responses,
+    'past_responses_sampler_insert': add_library_slots
+}
+
+class ImportFormatError(Exception):
+    """The file cannot be imported at all, e.g. required columns are missing"""
+
+def map_columns(headers):
+    """Map import fields to CSV column positions from the header row"""
+    col_map = {}
+    for i, header in enumerate(headers):
+        header_lower = header.lower().strip()
+        
+        if 'text' in header_lower or 'statement' in header_lower or 'content' in header_lower:
+            col_map['text'] = i
+        elif 'topic' in header_lower or 'subject' in header_lower or 'category' in header_lower:
+            col_map['topic'] = i
+        elif 'tone' in header_lower:
+            col_map['tone'] = i
+        elif 'date' in header_lower or 'time' in header_lower:
+            col_map['timestamp'] = i
+        elif 'source' in header_lower:
+            col_map['source'] = i
+        elif 'tag' in header_lower:
+            col_map['tags'] = i
+    
+    missing = [col for col in REQUIRED_COLUMNS if col not in col_map]
+    if missing:
+        raise ImportFormatError(f"Missing required columns: {', '.join(missing)}")
+    return col_map
+
+def _bulk_insert(conn, rows):
+    """executemany the rows, then index them with one statement per trigger; returns the rows inserted"""
+    triggers = conn.execute(
+        f"SELECT name, sql FROM sqlite_master WHERE type='trigger' AND name IN ({','.join('?' * len(BULK_TRIGGERS))})",
+        list(BULK_TRIGGERS)).fetchall()
+    
+    # The writer holds the write lock, so no other connection sees the triggers missing
+    for name, sql in triggers:
+        conn.execute(f"DROP TRIGGER {name}")
+    
+    # AUTOINCREMENT ids only grow, so the new rows are exactly those above the current maximum
+    last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM past_responses").fetchone()[0]
+    inserted = conn.executemany(INSERT_SQL, rows).rowcount
+    
+    for name, sql in triggers:
+        BULK_TRIGGERS[name](conn, last_id)
+        conn.execute(sql)
+    return inserted
+
+def insert_chunk(conn, rows):
+    """Write job: insert (row_number, values) pairs
+
+    Returns (failed, duplicates): (row_number, error) for each row that could
+    not be inserted, and how many rows were already in the library.
+    """
+    conn.execute("SAVEPOINT import_chunk")
+    try:
+        inserted = _bulk_insert(conn, [values for row_number, values in rows])
+        conn.execute("RELEASE import_chunk")
+        return [], len(rows) - inserted
+    except sqlite3.Error:
+        conn.execute("ROLLBACK TO import_chunk")
+        conn.execute("RELEASE import_chunk")
+    
+    # Something in the chunk was rejected: insert row by row so only the bad rows are lost
+    failed = []
+    duplicates = 0
+    for row_number, values in rows:
+        try:
+            if conn.execute(INSERT_SQL, values).rowcount == 0:
+                duplicates += 1
+        except sqlite3.Error as e:
+            failed.append((row_number, str(e)))
+    return failed, duplicates
+
+class ImportProgress:
+    """Running totals of an import, passed to the progress callback"""
+    
+    def __init__(self, total_bytes):
+        self.total_bytes = total_bytes
+        self.bytes_read = 0
+        self.rows_read = 0
+        self.imported = 0
+        self.skipped = 0
+        self.duplicates = 0
+        self.errors = 0
+        self.cancelled = False
+        self.finished = False
+        self.previous_max_id = 0
+        self.started = time.monotonic()
+        self.messages = []
+        self._messages_kept = 0
+    
+    @property
+    def elapsed(self):
+        """Seconds since the import started"""
+        return time.monotonic() - self.started
+    
+    @property
+    def rows_per_second(self):
+        """Rows read per second so far"""
+        elapsed = self.elapsed
+        return self.rows_read / elapsed if elapsed > 0 else 0.0
+    
+    @property
+    def fraction(self):
+        """Approximate share of the file read, from 0 to 1"""
+        if not self.total_bytes:
+            return 1.0
+        return min(1.0, self.bytes_read / self.total_bytes)
+    
+    def note(self, message):
+        """Record a per-row message, up to MAX_ROW_MESSAGES"""
+        if self._messages_kept < MAX_ROW_MESSAGES:
+            self.messages.append(message)
+        elif self._messages_kept == MAX_ROW_MESSAGES:
+            self.messages.append("Further skipped or failed rows are counted but not listed")
+        self._messages_kept += 1
+    
+    def take_messages(self):
+        """Messages recorded since the last call"""
+        messages, self.messages = self.messages, []
+        return messages
+
+def _counted_lines(file, progress):
+    """Yield the file's lines, adding their length to bytes_read (characters, close enough for progress)"""
+    for line in file:
+        progress.bytes_read += len(line)
+        yield line
+
+def import_statements(file_path, chunk_size=DEFAULT_CHUNK_SIZE, on_progress=None, interval=PROGRESS_INTERVAL):
+    """Stream a CSV of past statements into the library and return the final ImportProgress
+
+    Rows are read lazily and written in chunks of chunk_size, each chunk one
+    executemany transaction on the database writer while the next is parsed.
+    on_progress(progress) is called at most every interval seconds, and once at
+    the end. Cancelling the calling job stops after the current chunk; chunks
+    already written are kept.
+    """
+    token = current_token()
+    chunk_size = max(1, int(chunk_size))
+    progress = ImportProgress(os.path.getsize(file_path))
+    in_flight = deque()
+    
+    # Imported rows get ids above this, so callers can tell exactly which rows are new
+    with get_connection() as conn:
+        progress.previous_max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM past_responses").fetchone()[0]
+    
+    def settle(limit):
+        # Wait for the oldest chunks until at most limit are still queued
+        while len(in_flight) > limit:
+            future, size = in_flight.popleft()
+            failed, duplicates = future.result()
+            progress.imported += size - len(failed) - duplicates
+            progress.duplicates += duplicates
+            progress.errors += len(failed)
+            for row_number, message in failed:
+                progress.note(f"Error in row {row_number}: {message}")
+    
+    def report(final=False):
+        if on_progress is not None:
+            progress.finished = final
+            on_progress(progress)
+    
+    with open(file_path, 'r', encoding='utf-8', newline='') as file:
+        reader = csv.reader(_counted_lines(file, progress))
+        col_map = map_columns(next(reader, []))
+        columns = [(col_map.get(field), default) for field, default in IMPORT_FIELDS]
+        text_index = col_map['text']
+        
+        chunk = []
+        last_report = time.monotonic()
+        for row_number, row in enumerate(reader, 1):
+            progress.rows_read = row_number
+            width = len(row)
+            
+            # Skip empty rows
+            if text_index >= width or not row[text_index].strip():
+                progress.skipped += 1
+                progress.note(f"Skipping row {row_number}: Empty text")
+            else:
+                values = [row[i] if i is not None and i < width else default for i, default in columns]
+                values.append(content_hash(values[0]))
+                chunk.append((row_number, values))
+            
+            if len(chunk) >= chunk_size:
+                # Stop between chunks once the import has been cancelled
+                if token.cancelled:
+                    progress.cancelled = True
+                    break
+                in_flight.append((submit_write(insert_chunk, chunk), len(chunk)))
+                chunk = []
+                settle(MAX_CHUNKS_IN_FLIGHT)
+            
+            if row_number % 1000 == 0 and time.monotonic() - last_report >= interval:
+                report()
+                last_report = time.monotonic()
+        
+        if token.cancelled:
+            progress.cancelled = True
+        elif chunk:
+            in_flight.append((submit_write(insert_chunk, chunk), len(chunk)))
+    
+    settle(0)
+    report(final=True)
+    return progress
+
+def near_duplicate_report(progress, limit=MAX_ROW_MESSAGES):
+    """Lines describing imported statements that nearly duplicate earlier ones"""
+    flagged = flag_new_statements(progress.previous_max_id)
+    if not flagged:
+        return ["No imported statement closely matches an earlier one"]
+    
+    ids = [row_id for row_id, score, source, match_id in flagged[:limit]]
+    with get_connection() as conn:
+        previews = dict(conn.execute(
+            f"SELECT id, substr(published_text, 1, 50) FROM past_responses WHERE id IN ({','.join('?' * len(ids))})",
+            ids))
+    
+    lines = [f"Imported statements that closely match earlier ones: {len(flagged)}"]
+    for row_id, score, source, match_id in flagged[:limit]:
+        kind = "library statement" if source == LIBRARY else "accepted submission"
+        lines.append(f"- \"{previews.get(row_id, '')}...\" is {score:.0%} similar to {kind} #{match_id}")
+    if len(flagged) > limit:
+        lines.append(f"- and {len(flagged) - limit} more")
+    return lines
@@ -1,13 +1,102 @@
 """
 This module contains the system prompt templates and tone instructions for the MP Statement Rewriter.
 You can edit the prompt templates in this file to customize the AI's behavior.
+
+The running application reloads this file when it is saved (see prompt_templates.py). Templates
+use {name} placeholders; each must use exactly the placeholders it has here. Literal braces are
+written {{ and }}.
 """
 
 # System prompt for the LLM
-SYSTEM_PROMPT = "You are a skilled political communication specialist who helps transform official government statements into personalized MP communications."
+SYSTEM_PROMPT = "You are an expert political communications specialist who rewrites official government statements into personalized MP communications that sound authentic, engaging, and locally relevant."
 
 # System prompt for refresh/regeneration
-REFRESH_SYSTEM_PROMPT = "You are a skilled political communication specialist who excels at creative reframing and finding fresh approaches to political messaging."
+REFRESH_SYSTEM_PROMPT = "You are an expert political communications specialist who rewrites statements to sound authentic, engaging, and locally relevant."
+
+# Task instructions that are the same for every request. They go in the system message, ahead
+# of everything that varies, so requests share a byte-identical prefix the provider can serve
+# from its prompt cache. Per-request content (tone, examples, the statement) follows in the
+# user message, in that order. These are plain text, not templates.
+GENERATION_INSTRUCTIONS = """# MP STATEMENT REWRITING TASK
+
+## OBJECTIVE:
+Transform the government statement at the end of the user message into a personalized communication from the MP that feels authentic, locally relevant, and engaging to the specified audience. The rewritten statement should sound like it comes directly from the MP, incorporating their voice and style while addressing the specific context and audience needs.
+
+## TRANSFORMATION GUIDELINES:
+
+1. **Authentic Voice**: 
+   - Use first-person perspective ("I", "my", "our constituency")
+   - Maintain the MP's conversational style shown in the examples
+   - Avoid bureaucratic language and generic political phrases
+
+2. **Local Relevance**:
+   - Incorporate specific local context provided
+   - Reference constituency concerns where appropriate
+   - Make national announcements feel relevant to local constituents
+
+3. **Audience Awareness**:
+   - Tailor vocabulary and examples to resonate with the target audience
+   - Address specific concerns this audience might have
+   - Use appropriate level of detail and explanation
+
+4. **Personal Connection**:
+   - Include the MP's personal commitment to the issue
+   - Reference relevant past work on similar issues when appropriate
+   - Show understanding of constituent needs
+
+5. **Clear Communication**:
+   - Maintain clarity on key facts and figures from the original statement
+   - Structure with clear paragraphs and logical flow
+   - Avoid overly complex sentences or jargon
+
+## OUTPUT REQUIREMENTS:
+- Produce a complete, polished statement ready for publication
+- Length should be appropriate to the complexity of the topic (typically 150-300 words)
+- Balance faithfulness to the original information with personalization
+- Do not include any explanatory notes, only provide the rewritten statement"""
+
+REFRESH_INSTRUCTIONS = """# MP STATEMENT REWRITING TASK (SECOND ATTEMPT)
+
+## OBJECTIVE:
+Transform the government statement at the end of the user message into a personalized communication from the MP. Your previous attempt was not approved, so this version needs to take a SIGNIFICANTLY DIFFERENT APPROACH while still maintaining the MP's authentic voice.
+
+## TRANSFORMATION REQUIREMENTS:
+
+1. **TAKE A COMPLETELY DIFFERENT APPROACH** from your previous attempt:
+   - Use a different structure and opening
+   - Emphasize different aspects of the information
+   - Find a fresh angle or framing for the message
+   - Avoid repeating phrases, examples, or analogies from the rejected version
+
+2. **Stronger Local Connection**:
+   - More explicitly incorporate the local context provided
+   - Make stronger connections to constituency-specific issues
+   - Add more geographical or community-specific references
+   - Show how national policies directly impact this specific constituency
+
+3. **More Authentic Voice**:
+   - Use more natural, conversational language
+   - Include more personal commitment ("I am committed to..." "I've been working on...")
+   - Avoid political clichés and generic phrases
+   - Make it sound like a real person speaking, not a press release
+
+4. **Better Audience Targeting**:
+   - Address the specific needs and concerns of this audience more directly
+   - Use language, examples, and references that will resonate with them
+   - Adjust complexity and detail level to match audience expectations
+   - Include specific benefits or impacts relevant to this audience
+
+5. **More Compelling Structure**:
+   - Create a stronger opening that immediately engages
+   - Ensure a logical flow with clear transitions
+   - Include a more memorable conclusion with clear next steps
+   - Break up dense information into more digestible parts
+
+## OUTPUT REQUIREMENTS:
+- Produce a complete, polished statement ready for publication
+- Length should be appropriate to the complexity of the topic (typically 150-300 words)
+- Ensure this version is distinctly different from your previous attempt
+- Do not include any explanatory notes, only provide the rewritten statement"""
 
 # Dictionary of tone instructions for different communication styles
 TONE_INSTRUCTIONS = {
@@ -80,126 +169,71 @@ Convey immediacy and encourage specific responses or engagement.
 # Default tone instruction if none specified
 DEFAULT_TONE_INSTRUCTION = "Use a natural, conversational tone that feels personal and authentic."
 
+# The system message ends with every tone's instructions in a fixed order, so it is the same
+# whatever the tone; the user message only names the tone to use. Together with the persona
+# and instructions it is over 1024 tokens, the shortest prefix OpenAI caches.
+TONE_GUIDE_HEADER = "## TONE GUIDE (follow the one named under REQUIRED TONE):\n"
+TONE_GUIDE_ENTRY = "\n### {tone}:{instructions}"
 
-def construct_prompt(raw_text, context, audience, tone, accepted_responses, rejected_responses=None):
-    """Construct a prompt for the LLM that includes all necessary context"""
-    # Get tone instructions
-    tone_instructions = TONE_INSTRUCTIONS.get(tone, DEFAULT_TONE_INSTRUCTION)
-    
-    # Format accepted examples
-    accepted_examples = ""
-    if accepted_responses:
-        accepted_examples = "## EXAMPLES TO EMULATE (these showcase the MP's voice and style):\n\n"
-        for i, (response, topic, resp_tone) in enumerate(accepted_responses, 1):
-            accepted_examples += f"### Example {i} "
-            if resp_tone and resp_tone != "None":
-                accepted_examples += f"(Tone: {resp_tone})"
-            accepted_examples += f":\n\"{response}\"\n\n"
-    
-    # Format rejected examples
-    rejected_examples = ""
-    if rejected_responses and len(rejected_responses) > 0:
-        rejected_examples = "## EXAMPLES TO AVOID (these were rejected or don't reflect the MP's voice well):\n\n"
-        for i, (response, topic, resp_tone) in enumerate(rejected_responses, 1):
-            rejected_examples += f"### Bad Example {i}:\n\"{response}\"\n\n"
-            rejected_examples += f"Problem: This example doesn't fully capture the MP's voice, uses generic language, or lacks personal connection.\n\n"
-    
-    # Create the complete prompt
-    prompt = f"""# MP STATEMENT REWRITING TASK
+# Tone section of the user message, for a tone in the guide and for any other tone
+REQUIRED_TONE_TEMPLATE = "## REQUIRED TONE: {tone} (see TONE GUIDE)\n"
+CUSTOM_TONE_TEMPLATE = "## REQUIRED TONE: {tone}\n{instructions}\n"
 
-## OBJECTIVE:
-Transform the government statement below into a personalized communication from the MP that feels authentic, locally relevant, and engaging to the specified audience. The rewritten statement should sound like it comes directly from the MP, incorporating their voice and style while addressing the specific context and audience needs.
+# Examples of the MP's voice; the tone label is left out for examples without a tone
+ACCEPTED_HEADER = "## EXAMPLES TO EMULATE (these showcase the MP's voice and style):\n\n"
+ACCEPTED_EXAMPLE_TEMPLATE = "### Example {number} {tone_label}:\n\"{text}\"\n\n"
+ACCEPTED_TONE_LABEL = "(Tone: {tone})"
 
-## RAW GOVERNMENT STATEMENT: {raw_text} 
+# Rejected examples in a generation prompt
+REJECTED_HEADER = "## EXAMPLES TO AVOID (these were rejected or don't reflect the MP's voice well):\n\n"
+REJECTED_EXAMPLE_TEMPLATE = """### Bad Example {number}:
+"{text}"
 
-## LOCAL CONTEXT:
-{context}
+Problem: This example doesn't fully capture the MP's voice, uses generic language, or lacks personal connection.
 
-## TARGET AUDIENCE:
-{audience}
+"""
 
-## REQUIRED TONE: {tone}
-{tone_instructions}
+# Rejected examples in a refresh prompt; the first is the draft being replaced
+REFRESH_REJECTED_HEADER = "## EXAMPLES TO AVOID (especially the first one which was your previous attempt):\n\n"
+PREVIOUS_ATTEMPT_TEMPLATE = """### Your Previous Attempt:
+"{text}"
 
-{accepted_examples}
+Problems with this version:
+- It didn't fully capture the MP's personal voice
+- The local context wasn't sufficiently incorporated
+- It may have used generic political language
+- The tone wasn't quite right for the audience
 
-{rejected_examples}
+"""
+REFRESH_REJECTED_EXAMPLE_TEMPLATE = """### Bad Example {number}:
+"{text}"
 
-## TRANSFORMATION GUIDELINES:
+Problem: This example doesn't effectively represent the MP's voice or connect with constituents.
 
-1. **Authentic Voice**: 
-   - Use first-person perspective ("I", "my", "our constituency")
-   - Maintain the MP's conversational style shown in the examples
-   - Avoid bureaucratic language and generic political phrases
+"""
 
-2. **Local Relevance**:
-   - Incorporate specific local context provided
-   - Reference constituency concerns where appropriate
-   - Make national announcements feel relevant to local constituents
+# User message for a generation
+GENERATION_TEMPLATE = """{tone_section}
+{accepted_examples}
 
-3. **Audience Awareness**:
-   - Tailor vocabulary and examples to resonate with the target audience
-   - Address specific concerns this audience might have
-   - Use appropriate level of detail and explanation
+{rejected_examples}
 
-4. **Personal Connection**:
-   - Include the MP's personal commitment to the issue
-   - Reference relevant past work on similar issues when appropriate
-   - Show understanding of constituent needs
+## RAW GOVERNMENT STATEMENT: {raw_text} 
 
-5. **Clear Communication**:
-   - Maintain clarity on key facts and figures from the original statement
-   - Structure with clear paragraphs and logical flow
-   - Avoid overly complex sentences or jargon
+## LOCAL CONTEXT:
+{context}
 
-## OUTPUT REQUIREMENTS:
-- Produce a complete, polished statement ready for publication
-- Length should be appropriate to the complexity of the topic (typically 150-300 words)
-- Balance faithfulness to the original information with personalization
-- Do not include any explanatory notes, only provide the rewritten statement
+## TARGET AUDIENCE:
+{audience}
 
 ## REWRITTEN STATEMENT:
 """
-    return prompt
-
-
-def construct_refresh_prompt(raw_text, context, audience, tone, accepted_examples, rejected_examples):
-    """Construct a prompt for refreshing with emphasis on diversity"""
-    # Get tone instructions
-    tone_instructions = TONE_INSTRUCTIONS.get(tone, DEFAULT_TONE_INSTRUCTION)
-    
-    # Format accepted examples
-    accepted_content = ""
-    if accepted_examples:
-        accepted_content = "## EXAMPLES TO EMULATE (these showcase the MP's voice and style):\n\n"
-        for i, (response, topic, resp_tone) in enumerate(accepted_examples, 1):
-            accepted_content += f"### Example {i} "
-            if resp_tone and resp_tone != "None":
-                accepted_content += f"(Tone: {resp_tone})"
-            accepted_content += f":\n\"{response}\"\n\n"
-    
-    # Format rejected examples
-    rejected_content = ""
-    if rejected_examples and len(rejected_examples) > 0:
-        rejected_content = "## EXAMPLES TO AVOID (especially the first one which was your previous attempt):\n\n"
-        for i, (response, topic, resp_tone) in enumerate(rejected_examples, 1):
-            label = "Your Previous Attempt" if i == 1 else f"Bad Example {i}"
-            rejected_content += f"### {label}:\n\"{response}\"\n\n"
-            
-            if i == 1:
-                rejected_content += "Problems with this version:\n"
-                rejected_content += "- It didn't fully capture the MP's personal voice\n"
-                rejected_content += "- The local context wasn't sufficiently incorporated\n"
-                rejected_content += "- It may have used generic political language\n"
-                rejected_content += "- The tone wasn't quite right for the audience\n\n"
-            else:
-                rejected_content += "Problem: This example doesn't effectively represent the MP's voice or connect with constituents.\n\n"
-    
-    # Create the complete prompt with emphasis on diversity
-    prompt = f"""# MP STATEMENT REWRITING TASK (SECOND ATTEMPT)
 
-## OBJECTIVE:
-Transform the government statement below into a personalized communication from the MP. Your previous attempt was not approved, so this version needs to take a SIGNIFICANTLY DIFFERENT APPROACH while still maintaining the MP's authentic voice.
+# User message for a refresh, which asks for a markedly different draft
+REFRESH_TEMPLATE = """{tone_section}
+{accepted_examples}
+
+{rejected_examples}
 
 ## RAW GOVERNMENT STATEMENT: {raw_text} 
 
@@ -209,50 +243,4 @@ Transform the government statement below into a personalized communication from
 ## TARGET AUDIENCE:
 {audience}
 
-## REQUIRED TONE: {tone}
-{tone_instructions}
-
-{accepted_content}
-
-{rejected_content}
-
-## TRANSFORMATION REQUIREMENTS:
-
-1. **TAKE A COMPLETELY DIFFERENT APPROACH** from your previous attempt:
-   - Use a different structure and opening
-   - Emphasize different aspects of the information
-   - Find a fresh angle or framing for the message
-   - Avoid repeating phrases, examples, or analogies from the rejected version
-
-2. **Stronger Local Connection**:
-   - More explicitly incorporate the local context provided
-   - Make stronger connections to constituency-specific issues
-   - Add more geographical or community-specific references
-   - Show how national policies directly impact this specific constituency
-
-3. **More Authentic Voice**:
-   - Use more natural, conversational language
-   - Include more personal commitment ("I am committed to..." "I've been working on...")
-   - Avoid political clichés and generic phrases
-   - Make it sound like a real person speaking, not a press release
-
-4. **Better Audience Targeting**:
-   - Address the specific needs and concerns of this audience more directly
-   - Use language, examples, and references that will resonate with them
-   - Adjust complexity and detail level to match audience expectations
-   - Include specific benefits or impacts relevant to this audience
-
-5. **More Compelling Structure**:
-   - Create a stronger opening that immediately engages
-   - Ensure a logical flow with clear transitions
-   - Include a more memorable conclusion with clear next steps
-   - Break up dense information into more digestible parts
-
-## OUTPUT REQUIREMENTS:
-- Produce a complete, polished statement ready for publication
-- Length should be appropriate to the complexity of the topic (typically 150-300 words)
-- Ensure this version is distinctly different from your previous attempt
-- Do not include any explanatory notes, only provide the rewritten statement
-
 ## REWRITTEN STATEMENT:"""
-    return prompt
\ No newline at end of file
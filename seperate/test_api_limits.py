@@ -0,0 +1,195 @@
+import asyncio
+import importlib.util
+import time
+import unittest
+from unittest import mock
+import api_limits
+import fake_llm_server
+from api_limits import ApiLimiter, CircuitBreaker, CircuitOpenError, TokenBucket, backoff_delay, estimate_tokens
+from fake_llm_server import FakeLLMServer
+
+HAS_OPENAI = importlib.util.find_spec('openai') is not None and importlib.util.find_spec('httpx') is not None
+
+PROMPT = "Please rewrite this statement about local road repairs."
+
+def rate_limited(headers):
+    """FAKE_ERRORS holding only a 429 with the given headers"""
+    return [(429, "Rate limit reached (fake server)", headers)]
+
+SERVER_ERROR = [(500, "Internal server error (fake server)", {})]
+
+@unittest.skipUnless(HAS_OPENAI, "the openai and httpx packages are not installed")
+class FakeServerTestCase(unittest.TestCase):
+    """Runs each test against its own local fake OpenAI server"""
+
+    server_settings = {}
+
+    def setUp(self):
+        import openai
+        self.server = FakeLLMServer(latency=0.0, jitter=0.0, tokens_per_second=0, completion_tokens=20,
+                                    **self.server_settings).start()
+        self.addCleanup(self.server.stop)
+        self.client = openai.OpenAI(api_key="sk-test", base_url=self.server.url, max_retries=0)
+        self.addCleanup(self.client.close)
+
+    def request(self, max_tokens=50, stream=False):
+        """A request callable as the application builds them"""
+        extra = {"stream": True, "stream_options": {"include_usage": True}} if stream else {}
+        return lambda: self.client.chat.completions.create(
+            model="fake-model", messages=[{"role": "user", "content": PROMPT}], max_tokens=max_tokens, **extra)
+
+    def limiter(self, **kwargs):
+        """An unlimited limiter; tests swap in the buckets and breaker they exercise"""
+        return ApiLimiter(requests_per_minute=0, tokens_per_minute=0, **kwargs)
+
+class RetryTest(FakeServerTestCase):
+    """Retries follow the provider's Retry-After, within BACKOFF_CAP"""
+
+    server_settings = {'error_rate': 1.0}
+
+    def test_retry_honours_retry_after_ms(self):
+        import openai
+        limiter = self.limiter(max_attempts=3)
+        started = time.monotonic()
+        with mock.patch.object(fake_llm_server, 'FAKE_ERRORS', rate_limited({'retry-after-ms': '300'})):
+            with self.assertRaises(openai.RateLimitError):
+                limiter.call(self.request())
+        self.assertEqual(self.server.stats()['requests'], 3)
+        self.assertGreaterEqual(time.monotonic() - started, 0.6)
+        self.assertEqual(limiter.retries, 2)
+
+    def test_retry_after_is_capped(self):
+        import openai
+        self.assertEqual(backoff_delay(0, 3600.0), api_limits.BACKOFF_CAP)
+
+        # The server asks for an hour; the limiter waits no longer than the (shortened) cap
+        limiter = self.limiter(max_attempts=2)
+        started = time.monotonic()
+        with mock.patch.object(fake_llm_server, 'FAKE_ERRORS', rate_limited({'retry-after': '3600'})), \
+                mock.patch.object(api_limits, 'BACKOFF_CAP', 0.2):
+            with self.assertRaises(openai.RateLimitError) as raised:
+                limiter.call(self.request())
+        self.assertEqual(api_limits.retry_after(raised.exception), 3600.0)
+        self.assertLess(time.monotonic() - started, 5.0)
+        self.assertEqual(self.server.stats()['requests'], 2)
+
+class RateLimitTest(FakeServerTestCase):
+    """Requests and tokens per minute are enforced, and reservations settled against usage"""
+
+    def test_requests_per_minute(self):
+        limiter = self.limiter()
+        limiter.requests = TokenBucket(600, capacity=1)
+        started = time.monotonic()
+        for _ in range(3):
+            limiter.call(self.request())
+        # One request of burst, then one every 0.1 s
+        self.assertGreaterEqual(time.monotonic() - started, 0.18)
+
+    def test_tokens_per_minute(self):
+        self.server.completion_tokens = 900
+        limiter = self.limiter()
+        limiter.tokens = TokenBucket(60000, capacity=1000)
+        estimated = estimate_tokens(PROMPT, 900)
+        limiter.call(self.request(900), estimated)
+
+        # The first call really used about its estimate, so the second waits for the bucket to refill
+        started = time.monotonic()
+        limiter.call(self.request(900), estimated)
+        self.assertGreaterEqual(time.monotonic() - started, 0.5)
+
+    def test_streamed_call_settled_against_usage(self):
+        from async_client import configure_async_backend, shutdown_async_backend, stream_text, submit_coroutine
+        limiter = api_limits.configure_api_limits(0, 0)
+        self.addCleanup(api_limits.configure_api_limits, 0, 0)
+
+        # Refills far slower than the test runs, so the level shows what was charged
+        limiter.tokens = TokenBucket(6, capacity=5000)
+        configure_async_backend("sk-test", self.server.url)
+        self.addCleanup(shutdown_async_backend)
+
+        deltas = []
+        text = submit_coroutine(stream_text("fake-model", "System.", PROMPT, {"max_tokens": 1000},
+                                            deltas.append)).result(timeout=30)
+        self.assertTrue(text)
+        self.assertEqual(len(deltas), 20)
+
+        # Without settling, the full 1000-token completion budget would still be reserved
+        charged = 5000 - limiter.tokens.level
+        self.assertLess(charged, 200)
+        self.assertGreater(charged, 20)
+
+class CircuitBreakerTest(FakeServerTestCase):
+    """closed -> open after repeated failures -> half-open after the timeout -> closed or open again"""
+
+    server_settings = {'error_rate': 1.0}
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(fake_llm_server, 'FAKE_ERRORS', SERVER_ERROR)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.limiter_under_test = self.limiter(max_attempts=1)
+        self.limiter_under_test.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.3)
+
+    def open_circuit(self):
+        """Fail enough calls to open the circuit"""
+        import openai
+        for _ in range(2):
+            with self.assertRaises(openai.InternalServerError):
+                self.limiter_under_test.call(self.request())
+        self.assertEqual(self.limiter_under_test.breaker.state, 'open')
+
+    def test_opens_then_closes_after_successful_trial(self):
+        limiter = self.limiter_under_test
+        self.assertEqual(limiter.breaker.state, 'closed')
+        self.open_circuit()
+
+        # While open, calls fail fast without reaching the server
+        with self.assertRaises(CircuitOpenError):
+            limiter.call(self.request())
+        self.assertEqual(self.server.stats()['requests'], 2)
+
+        time.sleep(0.35)
+        self.assertEqual(limiter.breaker.state, 'half-open')
+        self.server.error_rate = 0.0
+        limiter.call(self.request())
+        self.assertEqual(limiter.breaker.state, 'closed')
+
+    def test_failed_trial_reopens(self):
+        import openai
+        limiter = self.limiter_under_test
+        self.open_circuit()
+        time.sleep(0.35)
+        with self.assertRaises(openai.InternalServerError):
+            limiter.call(self.request())
+        self.assertEqual(limiter.breaker.state, 'open')
+
+    def test_cancelled_trial_releases_the_circuit(self):
+        import openai
+        limiter = self.limiter_under_test
+        self.open_circuit()
+        time.sleep(0.35)
+        self.server.error_rate = 0.0
+        self.server.latency = 2.0
+
+        async def cancel_trial():
+            client = openai.AsyncOpenAI(api_key="sk-test", base_url=self.server.url, max_retries=0)
+            try:
+                task = asyncio.ensure_future(limiter.call_async(lambda: client.chat.completions.create(
+                    model="fake-model", messages=[{"role": "user", "content": PROMPT}], max_tokens=50)))
+                await asyncio.sleep(0.2)
+                task.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+            finally:
+                await client.close()
+
+        asyncio.run(cancel_trial())
+
+        # The cancelled trial neither answered nor failed, so another call may take its place
+        self.server.latency = 0.0
+        limiter.call(self.request())
+        self.assertEqual(limiter.breaker.state, 'closed')
+
+if __name__ == '__main__':
+    unittest.main()
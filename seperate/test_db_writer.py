@@ -0,0 +1,52 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+from db_writer import DatabaseWriter
+
+class WriteBatchFailureTest(unittest.TestCase):
+    """A batch that cannot start its transaction must fail every waiting job"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'writer.db')
+        # Keep the expected errors out of error_log.jsonl in the working directory
+        patcher = mock.patch('db_writer.log_error')
+        self.log_error = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.writer = DatabaseWriter(self.db_path)
+        # Fail fast instead of waiting out the standard busy timeout
+        self.writer.execute(lambda conn: conn.execute("PRAGMA busy_timeout = 50"))
+        self.writer.execute(lambda conn: conn.execute("CREATE TABLE items (value TEXT)"))
+
+    def tearDown(self):
+        self.writer.close()
+        self.tmpdir.cleanup()
+
+    def test_begin_failure_reaches_every_waiter(self):
+        # Another process holding the write lock makes BEGIN IMMEDIATE fail with SQLITE_BUSY
+        holder = sqlite3.connect(self.db_path, isolation_level=None)
+        holder.execute("BEGIN IMMEDIATE")
+        try:
+            futures = [self.writer.submit(lambda conn, n=n: conn.execute("INSERT INTO items VALUES (?)", (n,)))
+                       for n in range(5)]
+            for future in futures:
+                with self.assertRaises(sqlite3.OperationalError):
+                    future.result(timeout=5)
+        finally:
+            holder.execute("ROLLBACK")
+            holder.close()
+
+        contexts = [call.args[0] for call in self.log_error.call_args_list]
+        self.assertIn("Database writer commit error", contexts)
+        self.assertTrue(all(isinstance(call.args[1], sqlite3.OperationalError)
+                            for call in self.log_error.call_args_list))
+
+        # The writer keeps going once the lock is released
+        self.writer.execute(lambda conn: conn.execute("INSERT INTO items VALUES ('after')"))
+        count = self.writer.execute(lambda conn: conn.execute("SELECT COUNT(*) FROM items").fetchone()[0])
+        self.assertEqual(count, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import threading
+import unittest
+from job_executor import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, PRIORITY_SPECULATIVE, JobExecutor
+
+class ReservedWorkerTest(unittest.TestCase):
+    """Interactive jobs start at once even when background work could fill every worker"""
+
+    def setUp(self):
+        self.executor = JobExecutor(max_workers=4, reserved_workers=1)
+        self.release = threading.Event()
+        self.addCleanup(self.executor.shutdown)
+        self.addCleanup(self.release.set)
+
+    def blocked(self, started):
+        """Job body that reports it started, then waits for the test to release it"""
+        started.set()
+        self.release.wait(10)
+
+    def test_interactive_job_gets_the_reserved_worker(self):
+        started = [threading.Event() for _ in range(4)]
+        background = [self.executor.submit(self.blocked, event, priority=priority)
+                      for event, priority in zip(started, [PRIORITY_BACKGROUND] * 3 + [PRIORITY_SPECULATIVE])]
+        for event in started[:3]:
+            self.assertTrue(event.wait(5))
+
+        # Three background jobs fill the unreserved workers; the fourth waits its turn
+        self.assertFalse(started[3].wait(0.2))
+        self.assertEqual(self.executor.pending(), 1)
+
+        interactive = self.executor.submit(lambda: "generated", priority=PRIORITY_INTERACTIVE)
+        self.assertEqual(interactive.result(timeout=2), "generated")
+
+        # A finishing background job hands its worker to the one that waited
+        self.release.set()
+        self.assertTrue(started[3].wait(5))
+        for job in background:
+            job.result(timeout=5)
+
+    def test_cancelled_queued_jobs_do_not_stall_the_queue(self):
+        started = [threading.Event() for _ in range(3)]
+        for event in started:
+            self.executor.submit(self.blocked, event)
+        for event in started:
+            self.assertTrue(event.wait(5))
+
+        cancelled = self.executor.submit(lambda: None)
+        waiting = self.executor.submit(lambda: "ran")
+        cancelled.cancel()
+        self.release.set()
+        self.assertEqual(waiting.result(timeout=5), "ran")
+
+    def test_unreserved_executor_uses_every_worker(self):
+        executor = JobExecutor(max_workers=2)
+        self.addCleanup(executor.shutdown)
+        started = [threading.Event() for _ in range(2)]
+        for event in started:
+            executor.submit(self.blocked, event)
+        for event in started:
+            self.assertTrue(event.wait(5))
+
+if __name__ == '__main__':
+    unittest.main()
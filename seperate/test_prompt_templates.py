@@ -0,0 +1,36 @@
+import importlib.util
+import os
+import unittest
+from prompt_templates import check
+
+MONOLITH_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'mp_statement_writer.py')
+
+def load_monolith():
+    """mp_statement_writer.py as a module, loaded without starting the application"""
+    spec = importlib.util.spec_from_file_location('mp_statement_writer', MONOLITH_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+class GoldenPromptTest(unittest.TestCase):
+    """Both applications render exactly the prompts in prompt_golden.json"""
+
+    def test_template_engine(self):
+        self.assertEqual(check(), [])
+
+    def test_app_entry_point(self):
+        import mp_rewriter_app
+        self.assertEqual(check(render=mp_rewriter_app.construct_prompt,
+                               render_refresh=mp_rewriter_app.construct_refresh_prompt,
+                               system=mp_rewriter_app.system_message), [])
+
+    def test_monolith_entry_point(self):
+        module = load_monolith()
+
+        # The prompt methods only need the class, not a running window
+        app = object.__new__(module.MPStatementRewriter)
+        self.assertEqual(check(render=app.construct_prompt, render_refresh=app.construct_refresh_prompt,
+                               system=module.system_message), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import os
+import tempfile
+import unittest
+from benchmarks import create_plans_database
+from schema import HOT_QUERIES, SCHEMA_VERSION, check_query_plans, explain, schema_version
+
+# Enough rows for the planner's statistics to favour the indexes the application relies on
+PLAN_ROWS = 3000
+
+class QueryPlanTest(unittest.TestCase):
+    """Every hot query keeps using its index on a migrated, analysed database"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.conn = create_plans_database(os.path.join(cls.tmpdir.name, 'plans.db'), PLAN_ROWS)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.conn.close()
+        cls.tmpdir.cleanup()
+
+    def test_migrated_to_latest_version(self):
+        self.assertEqual(schema_version(self.conn), SCHEMA_VERSION)
+
+    def test_hot_query_plans(self):
+        failures = dict(check_query_plans(self.conn))
+        for name, sql, params, expected in HOT_QUERIES:
+            with self.subTest(query=name):
+                self.assertNotIn(name, failures, f"expected {expected!r} in the plan: {explain(self.conn, sql, params)}")
+        self.assertEqual(check_query_plans(self.conn), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import queue
+import time
+import tkinter as tk
+from error_handler import log_error
+
+# How often the Tk main loop moves streamed text into the output widget
+DRAIN_INTERVAL_MS = 50
+
+_FINISHED = object()
+
+def chunk_text(chunk):
+    """Text delta carried by a streamed chat completion chunk, or ''"""
+    choices = getattr(chunk, 'choices', None)
+    if not choices:
+        return ''
+    delta = getattr(choices[0], 'delta', None)
+    return getattr(delta, 'content', None) or ''
+
+class TokenStream:
+    """Hands token deltas from a worker thread to the Tk main loop"""
+    
+    def __init__(self):
+        self._queue = queue.Queue()
+        self.started = time.perf_counter()
+        self.time_to_first_token = None
+        self.total_time = None
+        self.text = None
+        self.error = None
+    
+    def put(self, delta):
+        """Queue a text delta (worker thread)"""
+        if self.time_to_first_token is None:
+            self.time_to_first_token = time.perf_counter() - self.started
+        self._queue.put(delta)
+    
+    def finish(self, text):
+        """Mark the stream complete with its final text (worker thread)"""
+        self.text = text
+        self.total_time = time.perf_counter() - self.started
+        self._queue.put(_FINISHED)
+    
+    def fail(self, error_message):
+        """Mark the stream failed (worker thread)"""
+        self.error = error_message
+        self.total_time = time.perf_counter() - self.started
+        self._queue.put(_FINISHED)
+    
+    def drain(self):
+        """Return (text queued since the last call, whether the stream has ended)"""
+        parts = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return ''.join(parts), False
+            if item is _FINISHED:
+                return ''.join(parts), True
+            parts.append(item)
+
+def pump_stream(root, widget, stream, on_done, interval=DRAIN_INTERVAL_MS):
+    """Append a stream's deltas to a text widget every tick, then call on_done(stream)"""
+    def tick():
+        try:
+            text, finished = stream.drain()
+            if text:
+                widget.insert(tk.END, text)
+                widget.see(tk.END)
+        except Exception as e:
+            log_error("Stream display error", e)
+            finished = True
+        
+        if finished:
+            on_done(stream)
+        else:
+            root.after(interval, tick)
+    
+    root.after(0, tick)
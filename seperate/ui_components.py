@@ -3,6 +3,13 @@ from tkinter import ttk, scrolledtext
 import os
 from error_handler import log_error
 from utils import get_tone_options
+from metrics import histogram_text, summary_row
+
+# Most drafts that can be generated side by side in one request
+MAX_VARIANTS = 5
+
+# How often an open diagnostics window updates itself
+DIAGNOSTICS_REFRESH_MS = 2000
 
 def setup_styles():
     """Set up ttk styles for better UI appearance"""
@@ -62,12 +69,14 @@ def create_menu(root, callbacks):
         # Tools menu
         tools_menu = tk.Menu(menubar, tearoff=0)
         tools_menu.add_command(label="Import Past Statements", command=callbacks['import_past_statements'])
+        tools_menu.add_command(label="Find Near-Duplicates", command=callbacks['find_near_duplicates'])
         tools_menu.add_command(label="Settings", command=callbacks['open_settings'])
         menubar.add_cascade(label="Tools", menu=tools_menu)
         
         # Help menu
         help_menu = tk.Menu(menubar, tearoff=0)
         help_menu.add_command(label="User Guide", command=callbacks['show_user_guide'])
+        help_menu.add_command(label="Diagnostics", command=callbacks['show_diagnostics'])
         help_menu.add_command(label="About", command=callbacks['show_about'])
         menubar.add_cascade(label="Help", menu=help_menu)
         
@@ -131,6 +140,18 @@ def create_input_panel(parent, app_vars, callbacks):
         clear_button = ttk.Button(button_frame, text="Clear Form", command=callbacks['clear_all_fields'], style='Secondary.TButton')
         clear_button.pack(side=tk.LEFT, padx=5)
         
+        # Number of drafts to generate and compare
+        if 'variant_count' in app_vars:
+            ttk.Label(button_frame, text="Drafts:").pack(side=tk.LEFT, padx=(10, 2))
+            variant_spinbox = ttk.Spinbox(button_frame, from_=1, to=MAX_VARIANTS, width=3,
+                                          textvariable=app_vars['variant_count'], state="readonly")
+            variant_spinbox.pack(side=tk.LEFT, padx=(0, 10))
+        
+        # Request the next refresh draft in the background after each generation
+        if 'speculative_refresh' in app_vars:
+            ttk.Checkbutton(button_frame, text="Pre-generate refresh",
+                            variable=app_vars['speculative_refresh']).pack(side=tk.LEFT, padx=(0, 10))
+        
         submit_button = ttk.Button(button_frame, text="Generate Rewritten Statement", command=callbacks['submit'], style='Primary.TButton')
         submit_button.pack(side=tk.LEFT)
         
@@ -220,7 +241,105 @@ def create_output_panel(parent, app_vars, callbacks):
         log_error("Output panel configuration error", e)
         return None
 
-def create_status_bar(root, status_var):
+def create_variants_window(root, candidates, on_choose):
+    """Show alternative drafts side by side; on_choose(index) is called with the picked draft"""
+    try:
+        window = tk.Toplevel(root)
+        window.title("Compare Drafts")
+        window.geometry(f"{min(1400, 380 * len(candidates))}x600")
+        
+        frame = ttk.Frame(window, padding=10)
+        frame.pack(fill=tk.BOTH, expand=True)
+        
+        ttk.Label(frame, text="Choose the draft to continue with", style='Header.TLabel').grid(
+            row=0, column=0, columnspan=len(candidates), sticky=tk.W, pady=(0, 10))
+        
+        for column, (submission_id, text) in enumerate(candidates):
+            ttk.Label(frame, text=f"Draft {column + 1} ({len(text.split())} words)", style='Subheader.TLabel').grid(
+                row=1, column=column, sticky=tk.W, padx=5)
+            
+            draft_text = scrolledtext.ScrolledText(frame, wrap=tk.WORD, width=40)
+            draft_text.insert(tk.END, text)
+            draft_text.config(state=tk.DISABLED)
+            draft_text.grid(row=2, column=column, sticky=(tk.W, tk.E, tk.N, tk.S), padx=5)
+            
+            ttk.Button(frame, text="Use This Draft", style='Primary.TButton',
+                       command=lambda index=column: [on_choose(index), window.destroy()]).grid(
+                row=3, column=column, pady=10)
+            
+            frame.grid_columnconfigure(column, weight=1)
+        frame.grid_rowconfigure(2, weight=1)
+        
+        return window
+    except Exception as e:
+        log_error("Variants window creation error", e)
+        return None
+
+def create_diagnostics_window(root, metrics, get_lines):
+    """Show recent stage latencies and token counts, with cache and database lines from get_lines()"""
+    try:
+        window = tk.Toplevel(root)
+        window.title("Diagnostics")
+        window.geometry("900x600")
+        
+        frame = ttk.Frame(window, padding=10)
+        frame.pack(fill=tk.BOTH, expand=True)
+        
+        ttk.Label(frame, text="Recent Latencies (ms) and Token Counts", style='Header.TLabel').pack(anchor=tk.W)
+        ttk.Label(frame, text=f"Percentiles over the last {metrics.window} samples of each stage",
+                  style='Subheader.TLabel').pack(anchor=tk.W, pady=(0, 5))
+        
+        columns = ('metric', 'samples', 'p50', 'p95', 'p99', 'mean', 'max')
+        tree = ttk.Treeview(frame, columns=columns, show='headings', height=14)
+        for column in columns:
+            tree.heading(column, text=column if column[0] == 'p' else column.title())
+            tree.column(column, width=220 if column == 'metric' else 80,
+                        anchor=tk.W if column == 'metric' else tk.E)
+        tree.pack(fill=tk.BOTH, expand=True)
+        
+        # Latency distribution of the selected stage
+        histogram_var = tk.StringVar(value="Select a stage to see its latency histogram")
+        ttk.Label(frame, textvariable=histogram_var, wraplength=860).pack(anchor=tk.W, pady=5)
+        
+        lines_var = tk.StringVar()
+        ttk.Label(frame, textvariable=lines_var, justify=tk.LEFT).pack(anchor=tk.W, pady=(5, 10))
+        
+        def show_histogram(event=None):
+            selection = tree.selection()
+            if selection:
+                name = tree.item(selection[0], 'values')[0]
+                histogram_var.set(f"{name}: {histogram_text(name, metrics.samples(name)) or 'no histogram'}")
+        
+        def refresh():
+            selected = tree.item(tree.selection()[0], 'values')[0] if tree.selection() else None
+            tree.delete(*tree.get_children())
+            for name, stats in metrics.summary().items():
+                item = tree.insert('', tk.END, values=summary_row(name, stats))
+                if name == selected:
+                    tree.selection_set(item)
+            lines_var.set("\n".join(line for line in get_lines() if line))
+            show_histogram()
+        
+        def auto_refresh():
+            if window.winfo_exists():
+                refresh()
+                window.after(DIAGNOSTICS_REFRESH_MS, auto_refresh)
+        
+        tree.bind('<<TreeviewSelect>>', show_histogram)
+        
+        button_frame = ttk.Frame(frame)
+        button_frame.pack(fill=tk.X)
+        ttk.Button(button_frame, text="Reset", command=lambda: [metrics.reset(), refresh()],
+                   style='Secondary.TButton').pack(side=tk.LEFT)
+        ttk.Button(button_frame, text="Close", command=window.destroy).pack(side=tk.RIGHT)
+        
+        auto_refresh()
+        return window
+    except Exception as e:
+        log_error("Diagnostics window creation error", e)
+        return None
+
+def create_status_bar(root, status_var, cache_var=None):
     """Create the status bar at the bottom of the application"""
     try:
         status_frame = ttk.Frame(root)
@@ -233,6 +352,11 @@ def create_status_bar(root, status_var):
         version_label = ttk.Label(status_frame, text="v1.2.0", relief=tk.SUNKEN, anchor=tk.E)
         version_label.pack(side=tk.RIGHT, padx=5)
         
+        # Response cache hit/miss counters
+        if cache_var is not None:
+            cache_label = ttk.Label(status_frame, textvariable=cache_var, relief=tk.SUNKEN, anchor=tk.E)
+            cache_label.pack(side=tk.RIGHT)
+        
         return status_frame
     except Exception as e:
         log_error("Status bar creation error", e)